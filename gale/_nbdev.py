@@ -28,6 +28,13 @@ index = {"setup_logger": "00_utils.logger.ipynb",
          "LOSS_REGISTRY": "00b_utils.structures.ipynb",
          "LOSS_REGISTRY.__doc__": "00b_utils.structures.ipynb",
          "DatasetCatalog": "00b_utils.structures.ipynb",
+         "available_cpus": "00c_utils.cpu.ipynb",
+         "numa_nodes": "00c_utils.cpu.ipynb",
+         "ThreadPlan": "00c_utils.cpu.ipynb",
+         "build_thread_plan": "00c_utils.cpu.ipynb",
+         "apply_thread_plan": "00c_utils.cpu.ipynb",
+         "thread_plan_worker_init_fn": "00c_utils.cpu.ipynb",
+         "thread_plan_from_config": "00c_utils.cpu.ipynb",
          "norm_types": "01_torch_utils.ipynb",
          "bn_types": "01_torch_utils.ipynb",
          "init_default": "01_torch_utils.ipynb",
@@ -40,6 +47,11 @@ index = {"setup_logger": "00_utils.logger.ipynb",
          "maybe_convert_to_onehot": "01_torch_utils.ipynb",
          "worker_init_fn": "01_torch_utils.ipynb",
          "build_discriminative_lrs": "01_torch_utils.ipynb",
+         "conv_types": "01_torch_utils.ipynb",
+         "dropout_types": "01_torch_utils.ipynb",
+         "fuse_conv_bn": "01_torch_utils.ipynb",
+         "fuse_bn_linear": "01_torch_utils.ipynb",
+         "fuse_inference_layers": "01_torch_utils.ipynb",
          "LabelSmoothingCrossEntropy": "01a_losses.ipynb",
          "BinarySigmoidFocalLoss": "01a_losses.ipynb",
          "FocalLoss": "01a_losses.ipynb",
@@ -78,12 +90,15 @@ index = {"setup_logger": "00_utils.logger.ipynb",
          "GeneralizedImageClassifier": "04b_classification.model.meta_arch.common.ipynb",
          "VisionTransformer": "04b_classification.model.meta_arch.vit.ipynb",
          "VisionTransformerDataClass": "04b_classification.model.meta_arch.vit.ipynb",
+         "convert_mode": "05_classification.core.ipynb",
          "pil_loader": "05_classification.core.ipynb",
          "cv2_loader": "05_classification.core.ipynb",
+         "match_channels": "05_classification.core.ipynb",
          "denormalize": "05_classification.core.ipynb",
          "show_image_batch": "05_classification.core.ipynb",
          "DatasetDict": "05_classification.core.ipynb",
          "ClassificationMapper": "05_classification.core.ipynb",
+         "channels_last_collate": "05_classification.core.ipynb",
          "ClassificationDataset": "05_classification.core.ipynb",
          "FolderParser": "05_classification.core.ipynb",
          "PandasParser": "05_classification.core.ipynb",
@@ -98,29 +113,108 @@ index = {"setup_logger": "00_utils.logger.ipynb",
          "register_dataset_from_folders": "05b_classification.data.ipynb",
          "register_dataset_from_df": "05b_classification.data.ipynb",
          "build_classification_loader_from_config": "05b_classification.data.ipynb",
+         "HTTPParser": "05c_classification.remote.ipynb",
+         "RemoteClassificationDataset": "05c_classification.remote.ipynb",
+         "ReadAheadSampler": "05c_classification.remote.ipynb",
+         "register_dataset_from_urls": "05c_classification.remote.ipynb",
+         "CachedParser": "05d_classification.cache.ipynb",
+         "register_cached_dataset": "05d_classification.cache.ipynb",
+         "read_image_header": "05e_classification.manifest.ipynb",
+         "build_image_manifest": "05e_classification.manifest.ipynb",
+         "save_manifest": "05e_classification.manifest.ipynb",
+         "load_manifest": "05e_classification.manifest.ipynb",
+         "filter_parser": "05e_classification.manifest.ipynb",
+         "BatchRandomHorizontalFlip": "05f_classification.memory.ipynb",
+         "BatchRandomCrop": "05f_classification.memory.ipynb",
+         "InMemoryClassificationDataset": "05f_classification.memory.ipynb",
+         "ThreadDataLoader": "05g_classification.loaders.ipynb",
+         "TaggedConcatDataset": "05g_classification.loaders.ipynb",
+         "MultiDatasetLoader": "05g_classification.loaders.ipynb",
+         "benchmark_loader": "05g_classification.loaders.ipynb",
+         "compare_loader_modes": "05g_classification.loaders.ipynb",
+         "ResumableRandomSampler": "05h_classification.samplers.ipynb",
+         "BlockShuffleSampler": "05h_classification.samplers.ipynb",
+         "benchmark_sampler_io": "05h_classification.samplers.ipynb",
+         "expand_shards": "05i_classification.streaming.ipynb",
+         "write_shards": "05i_classification.streaming.ipynb",
+         "StreamingClassificationDataset": "05i_classification.streaming.ipynb",
+         "register_streaming_dataset": "05i_classification.streaming.ipynb",
+         "find_resumable_sampler": "05j_classification.resume.ipynb",
+         "get_rng_state": "05j_classification.resume.ipynb",
+         "set_rng_state": "05j_classification.resume.ipynb",
+         "data_pipeline_state": "05j_classification.resume.ipynb",
+         "restore_data_pipeline": "05j_classification.resume.ipynb",
+         "load_data_pipeline_state": "05j_classification.resume.ipynb",
+         "start_train_epoch": "05j_classification.resume.ipynb",
+         "compile_image": "05k_classification.compiler.ipynb",
+         "benchmark_decode": "05k_classification.compiler.ipynb",
+         "compile_dataset": "05k_classification.compiler.ipynb",
+         "register_compiled_dataset": "05k_classification.compiler.ipynb",
+         "main": "06b_classification.scoring.ipynb",
+         "DatasetIndex": "05l_classification.index.ipynb",
+         "register_dataset_from_index": "05l_classification.index.ipynb",
+         "DatasetStats": "05m_classification.stats.ipynb",
+         "dataset_fingerprint": "05m_classification.stats.ipynb",
+         "compute_dataset_stats": "05m_classification.stats.ipynb",
          "Mixup": "06_classification.task.ipynb",
          "predict_context": "06_classification.task.ipynb",
          "ClassificationTask": "06_classification.task.ipynb",
+         "ClassificationTask.eval_mapper": "06_classification.task.ipynb",
+         "ClassificationTask.setup_feature_cache": "06_classification.task.ipynb",
+         "ClassificationTask.configure_callbacks": "06_classification.task.ipynb",
+         "ClassificationTask.predict_dataset": "06_classification.task.ipynb",
+         "ClassificationTask.predict_paths": "06_classification.task.ipynb",
          "get_grid": "06_classification.task.ipynb",
          "ClassificationTask.show_results": "06_classification.task.ipynb",
          "show_batch": "06_classification.task.ipynb",
+         "PathsDataset": "06a_classification.inference.ipynb",
+         "eval_dataset": "06a_classification.inference.ipynb",
+         "build_inference_loader": "06a_classification.inference.ipynb",
+         "iter_predictions": "06a_classification.inference.ipynb",
+         "predict_loader": "06a_classification.inference.ipynb",
+         "load_model_from_checkpoint": "06b_classification.scoring.ipynb",
+         "score_manifest": "06b_classification.scoring.ipynb",
+         "NormalizedModel": "06c_classification.export.ipynb",
+         "export_model": "06c_classification.export.ipynb",
+         "verify_export": "06c_classification.export.ipynb",
+         "benchmark_export": "06c_classification.export.ipynb",
+         "quantize_model": "06d_classification.quantization.ipynb",
+         "evaluate_quantization": "06d_classification.quantization.ipynb",
+         "save_quantized_model": "06d_classification.quantization.ipynb",
+         "load_quantized_model": "06d_classification.quantization.ipynb",
+         "compile_cache_key": "06e_classification.compiled.ipynb",
+         "CompiledModel": "06e_classification.compiled.ipynb",
+         "compile_model": "06e_classification.compiled.ipynb",
+         "benchmark_compile": "06e_classification.compiled.ipynb",
+         "FeatureSplit": "06f_classification.features.ipynb",
+         "split_frozen_model": "06f_classification.features.ipynb",
+         "FeatureStore": "06f_classification.features.ipynb",
+         "build_feature_store": "06f_classification.features.ipynb",
+         "register_feature_store": "06f_classification.features.ipynb",
          "folder2df": "07_collections.pandas.ipynb",
          "split_dataframe_into_stratified_folds": "07_collections.pandas.ipynb",
          "get_dataframe_fold": "07_collections.pandas.ipynb",
          "get_dataset_labeling": "07_collections.pandas.ipynb",
          "dataframe_labels_2_int": "07_collections.pandas.ipynb",
          "split_dataframe_train_test": "07_collections.pandas.ipynb",
+         "hash_split": "07_collections.pandas.ipynb",
+         "split_manifest_train_test": "07_collections.pandas.ipynb",
          "format_time": "07a_collections.callbacks.notebook.ipynb",
          "html_progress_bar": "07a_collections.callbacks.notebook.ipynb",
          "text_to_html_table": "07a_collections.callbacks.notebook.ipynb",
          "NotebookProgressBar": "07a_collections.callbacks.notebook.ipynb",
          "NotebookTrainingTracker": "07a_collections.callbacks.notebook.ipynb",
          "NotebookProgressCallback": "07a_collections.callbacks.notebook.ipynb",
-         "EMACallback": "07b_collections.callbacks.ema.ipynb"}
+         "EMACallback": "07b_collections.callbacks.ema.ipynb",
+         "CacheStatsCallback": "07c_collections.callbacks.cache.ipynb",
+         "METADATA_FILE": "08_runtime.ipynb",
+         "ExportedModel": "08_runtime.ipynb",
+         "benchmark_latency": "08_runtime.ipynb"}
 
 modules = ["utils/logger.py",
            "utils/display.py",
            "utils/structures.py",
+           "utils/cpu.py",
            "torch_utils.py",
            "losses.py",
            "optimizer.py",
@@ -133,10 +227,29 @@ modules = ["utils/logger.py",
            "classification/core.py",
            "classification/augment.py",
            "classification/data.py",
+           "classification/remote.py",
+           "classification/cache.py",
+           "classification/manifest.py",
+           "classification/memory.py",
+           "classification/loaders.py",
+           "classification/samplers.py",
+           "classification/streaming.py",
+           "classification/resume.py",
+           "classification/compiler.py",
+           "classification/index.py",
+           "classification/stats.py",
            "classification/task.py",
+           "classification/inference.py",
+           "classification/scoring.py",
+           "classification/export.py",
+           "classification/quantization.py",
+           "classification/compiled.py",
+           "classification/features.py",
            "collections/pandas.py",
            "collections/callbacks/notebook.py",
-           "collections/callbacks/ema.py"]
+           "collections/callbacks/ema.py",
+           "collections/callbacks/cache.py",
+           "runtime.py"]
 
 doc_url = "https://benihime91.github.io/gale/"
 
@@ -1,6 +1,23 @@
 from .core import *
 from .augment import *
+from .cache import *
+from .compiled import *
+from .compiler import *
 from .data import *
+from .export import *
+from .features import *
+from .index import *
+from .inference import *
+from .loaders import *
+from .manifest import *
+from .memory import *
+from .quantization import *
+from .remote import *
+from .resume import *
+from .samplers import *
+from .scoring import *
+from .stats import *
+from .streaming import *
 from .task import ClassificationTask
 
 __all__ = [k for k in globals().keys() if not k.startswith("_")]
\ No newline at end of file
@@ -0,0 +1,338 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05d_classification.cache.ipynb (unless otherwise specified).
+
+__all__ = ['CachedParser', 'register_cached_dataset']
+
+# Cell
+import hashlib
+import logging
+import multiprocessing
+import os
+from typing import *
+
+import torch
+from fastcore.all import Path, store_attr
+from timm.data.parsers.parser import Parser
+
+from ..utils.structures import DatasetCatalog
+from .core import ClassificationDataset, DatasetDict
+
+_logger = logging.getLogger(__name__)
+
+# positions of the counters and the ring buffer pointers in the shared `state` tensor
+_RAM_HITS, _DISK_HITS, _MISSES, _EVICTIONS, _HEAD, _Q_FRONT, _Q_SIZE = range(7)
+
+# Cell
+def _shm_available() -> Optional[int]:
+    # free bytes of the shared memory filesystem, `None` if there is none (e.g. on macOS)
+    try:
+        st = os.statvfs("/dev/shm")
+    except (AttributeError, OSError):
+        return None
+    return st.f_bavail * st.f_frsize
+
+# Cell
+def _ram_tier_bytes(ram_bytes: Optional[int] = None) -> int:
+    """
+    Returns the size of the RAM tier: `ram_bytes` or by default 1 GiB, capped at half of the
+    free shared memory, which is small in containers (64 MB in docker by default).
+    """
+    available = _shm_available()
+    limit = available // 2 if available is not None else None
+    if ram_bytes is None:
+        return 2**30 if limit is None else min(2**30, limit)
+    if limit is not None and ram_bytes > limit:
+        _logger.warning(
+            "RAM tier of {} MB does not fit in /dev/shm, using {} MB".format(
+                ram_bytes // 2**20, limit // 2**20
+            )
+        )
+        return limit
+    return ram_bytes
+
+# Cell
+class CachedParser(Parser):
+    """
+    Wraps a `parser` and caches the encoded bytes of the Images it returns. Lookups go through
+    the RAM tier, then the disk tier and only on a miss the Image is read from `parser`.
+    Items are returned as `DatasetDict`s whose `file_name` holds the encoded bytes of the
+    Image, so they can be decoded by `ClassificationMapper`.
+
+    The RAM tier is a ring buffer of `ram_bytes`, new Images are written at the clock hand and
+    the oldest Images in front of the hand are evicted. The disk tier is bounded by `disk_bytes`
+    and evicts the least recently used files. Images are written through to the disk tier, so
+    a Image evicted from RAM is served from the disk tier on the next access.
+
+    Cache keys are derived from the paths (or urls) of the Images, use a new `cache_dir` if the
+    source Images are modified in place.
+
+    Note: The RAM tier must be created in the main process, i.e before the `DataLoader` workers
+    are started, for it to be shared between the workers. It is allocated in shared memory
+    (`/dev/shm`), so it is capped at half of the free shared memory.
+    """
+
+    def __init__(
+        self,
+        parser: Parser,
+        ram_bytes: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        disk_bytes: int = 20 * 2**30,
+    ):
+        """
+        Arguments:
+        1. `parser`: the `Parser` to cache. Must have a `samples` attribute which is a list of
+        `(path, target)` as all the parsers in gale.
+        2. `ram_bytes`: size of the RAM tier in bytes, set to 0 to disable the RAM tier. By
+        default 1 GiB or half of the free shared memory if less is available.
+        3. `cache_dir`: directory of the disk tier, if `None` the disk tier is disabled.
+        4. `disk_bytes`: maximum size of the disk tier in bytes.
+        """
+        super().__init__()
+        assert hasattr(parser, "samples"), "parser must have `samples`"
+        ram_bytes = _ram_tier_bytes(ram_bytes)
+        store_attr("parser, ram_bytes, cache_dir, disk_bytes")
+
+        n = len(parser)
+        self._arena = torch.empty(ram_bytes, dtype=torch.uint8).share_memory_()
+        self._offsets = torch.full((n,), -1, dtype=torch.int64).share_memory_()
+        self._lengths = torch.zeros(n, dtype=torch.int64).share_memory_()
+        # indices of the Images in the RAM tier in the order they were inserted
+        self._queue = torch.zeros(n, dtype=torch.int64).share_memory_()
+        self._state = torch.zeros(7, dtype=torch.int64).share_memory_()
+        self._lock = multiprocessing.get_context().Lock()
+
+        if cache_dir is not None:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            self._trim_disk()
+        self._disk_written = 0
+
+    def __len__(self):
+        return len(self.parser)
+
+    def _filename(self, index, basename=False, absolute=False):
+        return self.parser.filename(index)
+
+    def __getitem__(self, index):
+        target = self.parser.samples[index][1]
+        return DatasetDict(file_name=self.get_bytes(index), target=target)
+
+    def get_bytes(self, index: int) -> bytes:
+        "Returns the encoded bytes of the Image at `index`"
+        data = self._ram_get(index)
+        if data is not None:
+            self._count(_RAM_HITS)
+            return data
+
+        data = self._disk_get(index)
+        if data is not None:
+            self._count(_DISK_HITS)
+        else:
+            self._count(_MISSES)
+            data = self._source_get(index)
+            self._disk_put(index, data)
+
+        self._ram_put(index, data)
+        return data
+
+    def prefetch(self, indices: Iterable[int]):
+        "Forwards the indices missing in the cache to `parser.prefetch` if available"
+        if hasattr(self.parser, "prefetch"):
+            missing = [i for i in indices if self._offsets[i] < 0]
+            self.parser.prefetch(missing)
+
+    def _source_get(self, index: int) -> bytes:
+        if hasattr(self.parser, "get_bytes"):
+            return self.parser.get_bytes(index)
+        with open(self.parser.samples[index][0], "rb") as f:
+            return f.read()
+
+    def _count(self, counter: int):
+        with self._lock:
+            self._state[counter] += 1
+
+    # RAM tier
+    @property
+    def _arena_view(self):
+        # numpy view of the shared arena, created once per process
+        if getattr(self, "_view", None) is None:
+            self._view = self._arena.numpy()
+        return self._view
+
+    def _ram_get(self, index: int) -> Optional[bytes]:
+        if self.ram_bytes == 0:
+            return None
+        with self._lock:
+            offset = int(self._offsets[index])
+            if offset < 0:
+                return None
+            length = int(self._lengths[index])
+            return self._arena_view[offset : offset + length].tobytes()
+
+    def _evict_front(self):
+        front = int(self._state[_Q_FRONT])
+        index = int(self._queue[front])
+        self._offsets[index] = -1
+        self._state[_Q_FRONT] = (front + 1) % len(self._queue)
+        self._state[_Q_SIZE] -= 1
+        self._state[_EVICTIONS] += 1
+
+    def _front_offset(self) -> int:
+        if self._state[_Q_SIZE] == 0:
+            return -1
+        return int(self._offsets[self._queue[self._state[_Q_FRONT]]])
+
+    def _ram_put(self, index: int, data: bytes):
+        n = len(data)
+        if n == 0 or n > self.ram_bytes:
+            return
+        with self._lock:
+            if self._offsets[index] >= 0:
+                # another worker has already cached this Image
+                return
+            head = int(self._state[_HEAD])
+            if head + n > self.ram_bytes:
+                # the hand wraps around, evict the Images between the hand and the end
+                while self._front_offset() >= head:
+                    self._evict_front()
+                head = 0
+            while head <= self._front_offset() < head + n:
+                self._evict_front()
+
+            self._arena_view[head : head + n] = memoryview(data)
+            self._offsets[index] = head
+            self._lengths[index] = n
+            back = (int(self._state[_Q_FRONT]) + int(self._state[_Q_SIZE])) % len(
+                self._queue
+            )
+            self._queue[back] = index
+            self._state[_Q_SIZE] += 1
+            self._state[_HEAD] = head + n
+
+    # Disk tier
+    def _disk_path(self, index: int) -> Path:
+        key = hashlib.sha1(str(self.parser.samples[index][0]).encode()).hexdigest()
+        return Path(self.cache_dir) / key[:2] / key
+
+    def _disk_get(self, index: int) -> Optional[bytes]:
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(index)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # mark the file as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # trimmed by another worker after the read
+            pass
+        return data
+
+    def _disk_put(self, index: int, data: bytes):
+        if self.cache_dir is None:
+            return
+        path = self._disk_path(index)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        self._disk_written += len(data)
+        if self._disk_written > self.disk_bytes // 20:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        "Deletes the least recently used files till the disk tier fits in `disk_bytes`"
+        self._disk_written = 0
+        files = []
+        for entry in Path(self.cache_dir).glob("*/*"):
+            if entry.suffix == ".tmp":
+                # being written by another process, see `_disk_put`
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, entry))
+
+        total = sum(f[1] for f in files)
+        if total <= self.disk_bytes:
+            return
+
+        # free up some extra space so that we do not trim on every write
+        target = int(self.disk_bytes * 0.9)
+        for _, size, entry in sorted(files, key=lambda f: f[0]):
+            if total <= target:
+                break
+            try:
+                entry.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_view", None)
+        return state
+
+    def stats(self) -> Dict[str, float]:
+        "Returns the hit-rates and counters of the cache, aggregated over all the workers"
+        ram_hits, disk_hits, misses, evictions = self._state[:4].tolist()
+        total = max(ram_hits + disk_hits + misses, 1)
+        return {
+            "ram_hit_rate": ram_hits / total,
+            "disk_hit_rate": disk_hits / total,
+            "hit_rate": (ram_hits + disk_hits) / total,
+            "requests": ram_hits + disk_hits + misses,
+            "ram_evictions": evictions,
+            "ram_used_bytes": int(self._lengths[self._offsets >= 0].sum()),
+        }
+
+    def reset_stats(self):
+        "Resets the hit & miss counters"
+        with self._lock:
+            self._state[:4] = 0
+
+    def log_stats(self):
+        "Logs the hit-rates of the cache"
+        s = self.stats()
+        _logger.info(
+            "Cache hit-rate: {:.2%} (ram: {:.2%}, disk: {:.2%}), requests: {}, ram evictions: {}".format(
+                s["hit_rate"],
+                s["ram_hit_rate"],
+                s["disk_hit_rate"],
+                s["requests"],
+                s["ram_evictions"],
+            )
+        )
+
+# Cell
+def register_cached_dataset(
+    name: str,
+    dataset_name: str,
+    ram_bytes: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    disk_bytes: int = 20 * 2**30,
+):
+    """
+    Register a cached version of the dataset registered as `dataset_name` in DatasetCatalog.
+    The parser of the dataset is wrapped in a `CachedParser`, the mapper is left unchanged.
+    `name` is a `str` that identifies the new dataset, e.g. "coco_2014_train_cached".
+
+    The `CachedParser` is created once, all the datasets returned by `DatasetCatalog.get(name)`
+    share its RAM tier.
+    """
+    parser = None
+
+    def _build():
+        nonlocal parser
+        dataset = DatasetCatalog.get(dataset_name)
+        assert isinstance(dataset, ClassificationDataset)
+        if parser is None:
+            parser = CachedParser(dataset.parser, ram_bytes, cache_dir, disk_bytes)
+        return dataset.__class__(mapper=dataset.mapper, parser=parser)
+
+    DatasetCatalog.register(name, _build)
+    _logger.info("Dataset: {} registerd to DatasetCatalog".format(name))
\ No newline at end of file
@@ -0,0 +1,229 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/06e_classification.compiled.ipynb (unless otherwise specified).
+
+__all__ = ['compile_cache_key', 'CompiledModel', 'compile_model', 'benchmark_compile']
+
+# Cell
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import *
+
+import torch
+from fastcore.all import Path, ifnone
+from omegaconf import DictConfig, OmegaConf
+from torch import nn
+
+from ..runtime import benchmark_latency
+
+_logger = logging.getLogger(__name__)
+
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gale", "compiled")
+
+# Cell
+def compile_cache_key(cfg: DictConfig, backend: str, mode: Optional[str] = None) -> str:
+    """
+    Returns the key of the compiled artifacts of the model built from `cfg`: a hash of the
+    config of the model, the input shape, memory format & precision, the backend and the
+    version of torch.
+    """
+    key = dict(
+        model=OmegaConf.to_container(cfg.model, resolve=True),
+        input=[cfg.input.channels, cfg.input.height, cfg.input.width],
+        memory_format=cfg.input.get("memory_format", "contiguous"),
+        precision=cfg.get("training", {}).get("precision", "fp32"),
+        backend=backend,
+        mode=mode,
+        torch=torch.__version__,
+    )
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+# Cell
+@contextlib.contextmanager
+def _inductor_config(cache_dir: Optional[Path], freeze: bool = False):
+    # inductor reads its cache directory from the environment whenever it compiles
+    if cache_dir is None and not freeze:
+        yield
+        return
+    previous = os.environ.get("TORCHINDUCTOR_CACHE_DIR")
+    if cache_dir is not None:
+        os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(cache_dir)
+    try:
+        if freeze:
+            import torch._inductor.config as inductor_config
+
+            with inductor_config.patch(freezing=True):
+                yield
+        else:
+            yield
+    finally:
+        if previous is None:
+            os.environ.pop("TORCHINDUCTOR_CACHE_DIR", None)
+        else:
+            os.environ["TORCHINDUCTOR_CACHE_DIR"] = previous
+
+# Cell
+def _share_weights(script_module: torch.jit.ScriptModule, model: nn.Module):
+    # binds the parameters & buffers of `model` to a TorchScript module loaded from disk
+    tensors = dict(model.named_parameters())
+    tensors.update(dict(model.named_buffers()))
+    for name, tensor in tensors.items():
+        *path, attr = name.split(".")
+        module = script_module
+        for p in path:
+            module = getattr(module, p)
+        setattr(module, attr, tensor)
+
+# Cell
+class CompiledModel:
+    """
+    Runs `model` compiled with `backend`:
+    1. A `torch.compile` backend (e.g. `inductor`) with `mode`, used for training & inference.
+    The kernels generated by inductor are cached in `cache_dir`. With `freeze` the weights are
+    folded into the inference graphs, which is faster on CPU but only valid if the weights are
+    not updated afterwards, i.e. not while training.
+    2. `torchscript`: the model is traced in eval mode, the graph is saved in `cache_dir` and
+    only used in eval mode as tracing fixes the behaviour of dropout & batchnorm.
+
+    The compiled model shares the parameters of the eager `model`, which the optimizer &
+    the checkpoints keep using. If the compilation fails, e.g. on unsupported ops, the
+    model falls back to eager mode. `compile_time` is the duration of the first compiled call.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        backend: str = "inductor",
+        mode: Optional[str] = None,
+        cache_dir: Optional[Union[str, Path]] = None,
+        freeze: bool = False,
+    ):
+        self.model, self.backend, self.mode, self.freeze = model, backend, mode, freeze
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.compile_time, self.fallback = None, False
+        self._compiled = None
+        if backend != "torchscript":
+            if not hasattr(torch, "compile"):
+                _logger.warning("torch.compile requires torch>=2.0, using eager mode")
+                self.fallback = True
+            else:
+                self._compiled = torch.compile(model, backend=backend, mode=mode)
+
+    def _trace(self, x: torch.Tensor) -> torch.jit.ScriptModule:
+        path = self.cache_dir / "model.pt" if self.cache_dir is not None else None
+        if path is not None and path.exists():
+            module = torch.jit.load(str(path), map_location=x.device)
+            _share_weights(module, self.model)
+            with torch.no_grad():
+                if torch.allclose(module(x), self.model(x), atol=1e-4):
+                    _logger.info("Loaded the TorchScript graph from {}".format(path))
+                    return module
+            _logger.warning("The cached TorchScript graph is stale, tracing the model")
+
+        module = torch.jit.trace(self.model, x, check_trace=False)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            module.save(str(path))
+        return module
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        if self.fallback or (self.backend == "torchscript" and self.model.training):
+            return self.model(x)
+
+        tick = time.perf_counter()
+        try:
+            with _inductor_config(
+                self.cache_dir, self.freeze and not self.model.training
+            ):
+                if self._compiled is None:
+                    self._compiled = self._trace(x)
+                out = self._compiled(x)
+        except Exception as e:
+            _logger.warning(
+                "Compilation with {} failed, falling back to eager mode: {}".format(
+                    self.backend, e
+                )
+            )
+            self.fallback = True
+            return self.model(x)
+
+        if self.compile_time is None:
+            self.compile_time = time.perf_counter() - tick
+            _logger.info(
+                "Compiled the model with {} in {:.1f}s".format(
+                    self.backend, self.compile_time
+                )
+            )
+        return out
+
+    def __repr__(self):
+        return f"CompiledModel(backend={self.backend}, mode={self.mode}, fallback={self.fallback})"
+
+# Cell
+def compile_model(model: nn.Module, cfg: DictConfig) -> CompiledModel:
+    """
+    Compiles the `model` built from `cfg` with the options in `cfg.compile`, the artifacts are
+    cached in `cfg.compile.cache_dir` under the key of the model, see `compile_cache_key`.
+    """
+    conf = cfg.compile
+    backend = conf.get("backend", "inductor")
+    mode = conf.get("mode", None)
+    freeze = conf.get("freeze", False)
+    cache_dir = ifnone(conf.get("cache_dir", None), _CACHE_DIR)
+    key = compile_cache_key(cfg, backend, mode)
+    if freeze:
+        key = f"{key}-frozen"
+    cache_dir = Path(cache_dir) / key
+    if cache_dir.exists():
+        _logger.info("Using the compile cache at {}".format(cache_dir))
+    return CompiledModel(
+        model, backend=backend, mode=mode, cache_dir=cache_dir, freeze=freeze
+    )
+
+# Cell
+def benchmark_compile(
+    model: nn.Module,
+    input_shape: Sequence[int],
+    backend: str = "inductor",
+    mode: Optional[str] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+    freeze: bool = True,
+    batch_sizes: Sequence[int] = (1, 8),
+    num_iters: int = 20,
+) -> Dict:
+    """
+    Compiles `model` (in eval mode) and reports the compile time and the steady-state
+    latency of the eager & compiled models on inputs of shape `input_shape` (`C, H, W`), see
+    `gale.runtime.benchmark_latency`. Run it twice with the same `cache_dir` to measure a
+    warm restart.
+    """
+    model = model.eval()
+    compiled = CompiledModel(model, backend, mode, cache_dir, freeze)
+    with torch.no_grad():
+        compiled(torch.rand(batch_sizes[0], *input_shape))
+
+    def _runner(fn):
+        def _forward(x):
+            with torch.no_grad():
+                return fn(torch.from_numpy(x))
+
+        return _forward
+
+    eager = benchmark_latency(_runner(model), input_shape, batch_sizes, num_iters)
+    fast = benchmark_latency(_runner(compiled), input_shape, batch_sizes, num_iters)
+    report = dict(
+        compile_time=compiled.compile_time,
+        fallback=compiled.fallback,
+        eager=eager,
+        compiled=fast,
+        speedup={bs: eager[bs]["p50_ms"] / fast[bs]["p50_ms"] for bs in batch_sizes},
+    )
+    _logger.info(
+        "Compile time {:.1f}s, speedup {}".format(
+            ifnone(report["compile_time"], 0.0),
+            {bs: round(s, 2) for bs, s in report["speedup"].items()},
+        )
+    )
+    return report
\ No newline at end of file
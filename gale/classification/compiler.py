@@ -0,0 +1,272 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05k_classification.compiler.ipynb (unless otherwise specified).
+
+__all__ = ['compile_image', 'benchmark_decode', 'compile_dataset', 'register_compiled_dataset', 'main']
+
+# Cell
+import argparse
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+
+import numpy as np
+import pandas as pd
+from fastcore.all import IN_NOTEBOOK, Path, delegates, ifnone
+from PIL import Image
+from timm.data.parsers.parser import Parser
+
+from ..utils.structures import DatasetCatalog
+from .core import (
+    ClassificationDataset,
+    ClassificationMapper,
+    CSVParser,
+    FolderParser,
+    PandasParser,
+    pil_loader,
+)
+from .manifest import load_manifest, save_manifest
+
+_logger = logging.getLogger(__name__)
+
+_FORMATS = {"jpeg": "jpg", "webp": "webp"}
+
+# name of the manifest written by `compile_dataset` in the output directory
+_MANIFEST_FILE = "manifest.csv"
+
+# columns of the records returned by `compile_image`
+_RECORD_COLUMNS = [
+    "file_name",
+    "source",
+    "width",
+    "height",
+    "source_bytes",
+    "num_bytes",
+    "valid",
+    "error",
+]
+
+# Cell
+def compile_image(
+    src: str,
+    dst: str,
+    max_size: int = 260,
+    format: str = "jpeg",
+    quality: int = 90,
+) -> Dict:
+    """
+    Downscales the Image at `src` so that its longer side is at most `max_size`, keeping the
+    aspect ratio, and saves it to `dst` in `format` (`jpeg` or `webp`) with `quality`. Images
+    which are already smaller are only re-encoded.
+
+    Returns a record with the `num_bytes` of the source & compiled Images and the size of the
+    compiled Image, failures are flagged with `valid=False` and the error message in `error`.
+    """
+    record = dict(
+        file_name=str(dst),
+        source=str(src),
+        width=-1,
+        height=-1,
+        source_bytes=-1,
+        num_bytes=-1,
+        valid=False,
+        error=None,
+    )
+    try:
+        record["source_bytes"] = os.path.getsize(src)
+        with Image.open(src) as im:
+            # lets the JPEG decoder skip the DCT scales which are not needed
+            im.draft(im.mode, (max_size, max_size))
+            im = im.convert("L" if im.mode in ("L", "I;16", "I") else "RGB")
+            im.thumbnail((max_size, max_size), Image.LANCZOS)
+            im.save(dst, format=format.upper(), quality=quality)
+        record["width"], record["height"] = im.size
+        record["num_bytes"] = os.path.getsize(dst)
+        record["valid"] = True
+    except Exception as e:
+        record["error"] = f"{e.__class__.__name__}: {e}"
+    return record
+
+# Cell
+def _compile_chunk(jobs: List[Tuple[str, str]], **kwargs) -> List[Dict]:
+    return [compile_image(src, dst, **kwargs) for src, dst in jobs]
+
+# Cell
+def benchmark_decode(
+    paths: Sequence[str], num_samples: int = 200, seed: int = 0
+) -> float:
+    "Returns the number of Images in `paths` decoded per second, measured on `num_samples` Images"
+    rng = np.random.default_rng(seed)
+    paths = [paths[i] for i in rng.permutation(len(paths))[:num_samples]]
+    tick = time.perf_counter()
+    for path in paths:
+        pil_loader(path).load()
+    return len(paths) / (time.perf_counter() - tick)
+
+# Cell
+def compile_dataset(
+    parser: Union[str, Parser],
+    output_dir: str,
+    max_size: int = 260,
+    format: str = "jpeg",
+    quality: int = 90,
+    num_workers: Optional[int] = None,
+    chunksize: int = 64,
+    name: Optional[str] = None,
+    benchmark_samples: int = 200,
+) -> pd.DataFrame:
+    """
+    Compiles the Images of `parser` into `output_dir`, see `compile_image`. `parser` is a
+    `Parser` whose `samples` are `(path, target)` or the name of a dataset registered in
+    DatasetCatalog. The Images are compiled in parallel across `num_workers` processes.
+
+    A manifest with the `file_name`, `target` & the sizes of the compiled Images is saved
+    in `output_dir`. If `name` is given, the compiled dataset is registered in DatasetCatalog
+    with the mapper of the source dataset (see `register_compiled_dataset`).
+
+    Logs the size reduction and the decode speedup measured on `benchmark_samples` Images,
+    which are also stored in the `attrs` of the returned manifest. Raises a `ValueError` if
+    `parser` has no samples or if none of its Images could be compiled.
+    """
+    assert format in _FORMATS, f"format must be one of {list(_FORMATS)}"
+    mapper = None
+    if isinstance(parser, str):
+        dataset = DatasetCatalog.get(parser)
+        assert isinstance(
+            dataset, ClassificationDataset
+        ), "Only datasets with a parser can be compiled"
+        parser, mapper = dataset.parser, dataset.mapper
+    if not len(parser.samples):
+        raise ValueError("The dataset has no Images to compile")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    ext = _FORMATS[format]
+    width = max(6, len(str(len(parser.samples))))
+    jobs = [
+        (str(path), str(output_dir / f"{str(i).zfill(width)}.{ext}"))
+        for i, (path, _) in enumerate(parser.samples)
+    ]
+    kwargs = dict(max_size=max_size, format=format, quality=quality)
+
+    num_workers = ifnone(num_workers, os.cpu_count())
+    chunks = [jobs[i : i + chunksize] for i in range(0, len(jobs), chunksize)]
+    records = []
+    if num_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(num_workers) as pool:
+            for chunk in pool.map(functools.partial(_compile_chunk, **kwargs), chunks):
+                records.extend(chunk)
+    else:
+        for chunk in chunks:
+            records.extend(_compile_chunk(chunk, **kwargs))
+
+    manifest = pd.DataFrame.from_records(records, columns=_RECORD_COLUMNS)
+    manifest.insert(1, "target", [t for _, t in parser.samples])
+
+    num_invalid = int((~manifest["valid"]).sum())
+    if num_invalid == len(manifest):
+        raise ValueError(
+            "None of the {} Images could be compiled, e.g. {}".format(
+                len(manifest), manifest["error"].iloc[0]
+            )
+        )
+    if num_invalid:
+        _logger.warning("{} Images could not be compiled".format(num_invalid))
+    manifest = manifest[manifest["valid"]].reset_index(drop=True)
+    save_manifest(manifest, output_dir / _MANIFEST_FILE)
+
+    report = dict(
+        source_bytes=int(manifest["source_bytes"].sum()),
+        num_bytes=int(manifest["num_bytes"].sum()),
+    )
+    report["size_reduction"] = report["source_bytes"] / max(report["num_bytes"], 1)
+    if benchmark_samples > 0 and len(manifest):
+        source_speed = benchmark_decode(manifest["source"].tolist(), benchmark_samples)
+        speed = benchmark_decode(manifest["file_name"].tolist(), benchmark_samples)
+        report.update(
+            source_images_per_sec=source_speed,
+            images_per_sec=speed,
+            decode_speedup=speed / source_speed,
+        )
+    manifest.attrs.update(report)
+
+    _logger.info(
+        "Compiled {} Images to {}: {:.1f} MB -> {:.1f} MB ({:.1f}x smaller)".format(
+            len(manifest),
+            output_dir,
+            report["source_bytes"] / 2**20,
+            report["num_bytes"] / 2**20,
+            report["size_reduction"],
+        )
+    )
+    if "decode_speedup" in report:
+        _logger.info(
+            "Decoding: {:.1f} -> {:.1f} Images/s ({:.1f}x faster)".format(
+                report["source_images_per_sec"],
+                report["images_per_sec"],
+                report["decode_speedup"],
+            )
+        )
+
+    if name is not None:
+        register_compiled_dataset(name, output_dir, mapper=mapper)
+    return manifest
+
+# Cell
+@delegates(ClassificationMapper)
+def register_compiled_dataset(
+    name: str,
+    output_dir: str,
+    mapper: Optional[Union[ClassificationMapper, Callable]] = None,
+    **kwargs,
+):
+    """
+    Register a dataset compiled with `compile_dataset` in `output_dir` to DatasetCatalog.
+    `name` is a `str` that identifies a dataset, e.g. "coco_2014_train".
+    """
+    manifest = load_manifest(Path(output_dir) / _MANIFEST_FILE)
+    parser = PandasParser(manifest, "file_name", "target")
+    mapper = ifnone(mapper, ClassificationMapper(**kwargs))
+    DatasetCatalog.register(
+        name, lambda: ClassificationDataset(mapper=mapper, parser=parser)
+    )
+    _logger.info("Dataset: {} registerd to DatasetCatalog".format(name))
+
+# Cell
+def main(args: Optional[Sequence[str]] = None):
+    "Command line interface of `compile_dataset`"
+    ap = argparse.ArgumentParser(
+        description="Downscales & re-encodes the Images of a dataset, see `compile_dataset`"
+    )
+    source = ap.add_mutually_exclusive_group(required=True)
+    source.add_argument("--folder", help="root of an Image folder, see `FolderParser`")
+    source.add_argument("--csv", help="csv file with the paths & targets of the Images")
+    ap.add_argument("--path-column", default="file_name")
+    ap.add_argument("--label-column", default="target")
+    ap.add_argument("--output-dir", required=True)
+    ap.add_argument("--max-size", type=int, default=260)
+    ap.add_argument("--format", choices=list(_FORMATS), default="jpeg")
+    ap.add_argument("--quality", type=int, default=90)
+    ap.add_argument("--num-workers", type=int, default=None)
+    ap.add_argument("--benchmark-samples", type=int, default=200)
+    args = ap.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.folder is not None:
+        parser = FolderParser(root=args.folder, class_map="")
+    else:
+        parser = CSVParser(args.csv, args.path_column, args.label_column)
+    compile_dataset(
+        parser,
+        args.output_dir,
+        max_size=args.max_size,
+        format=args.format,
+        quality=args.quality,
+        num_workers=args.num_workers,
+        benchmark_samples=args.benchmark_samples,
+    )
+
+# Cell
+if __name__ == "__main__" and not IN_NOTEBOOK:
+    main()
\ No newline at end of file
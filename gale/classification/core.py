@@ -1,9 +1,11 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05_classification.core.ipynb (unless otherwise specified).
 
-__all__ = ['pil_loader', 'cv2_loader', 'denormalize', 'show_image_batch', 'DatasetDict', 'ClassificationMapper',
-           'ClassificationDataset', 'FolderParser', 'PandasParser', 'CSVParser']
+__all__ = ['convert_mode', 'pil_loader', 'cv2_loader', 'match_channels', 'denormalize', 'show_image_batch',
+           'DatasetDict', 'ClassificationMapper', 'channels_last_collate', 'ClassificationDataset', 'FolderParser',
+           'PandasParser', 'CSVParser']
 
 # Cell
+import io
 import logging
 import os
 from collections import namedtuple
@@ -20,26 +22,49 @@ from PIL import Image
 from timm.data.constants import *
 from timm.data.parsers.parser import Parser
 from timm.data.parsers.parser_image_folder import ParserImageFolder
+from torch.utils.data.dataloader import default_collate
 
 from ..utils.display import show_image, show_images
 
 _logging = logging.getLogger(__name__)
 
 # Cell
-def pil_loader(path: str) -> Image.Image:
+def convert_mode(im: Image.Image, channels: int = 3) -> Image.Image:
     """
-    Loads in a Image using PIL
+    Converts the PIL Image `im` to grayscale if `channels` is 1 or else to RGB. The
+    Image is returned as it is if it is already in the required mode.
     """
-    im = Image.open(path).convert("RGB")
+    mode = "L" if channels == 1 else "RGB"
+    if im.mode != mode:
+        im = im.convert(mode)
     return im
 
 # Cell
-def cv2_loader(path: str) -> np.ndarray:
+def pil_loader(path: Union[str, bytes], channels: int = 3) -> Image.Image:
     """
-    Loads in a Image using cv2
+    Loads in a Image using PIL. `path` can also be the encoded bytes of the Image.
+    If `channels` is 1 the Image is loaded as grayscale else as RGB.
     """
-    im = cv2.imread(path)
-    im = cv2.cvtColor(im, cv2.COLOR_BGR2RGB)
+    if isinstance(path, bytes):
+        path = io.BytesIO(path)
+    im = Image.open(path)
+    im = convert_mode(im, channels)
+    return im
+
+# Cell
+def cv2_loader(path: Union[str, bytes], channels: int = 3) -> np.ndarray:
+    """
+    Loads in a Image using cv2. `path` can also be the encoded bytes of the Image.
+    If `channels` is 1 the Image is decoded as grayscale `(H, W)` array, this skips the
+    color conversion, else as a RGB `(H, W, 3)` array.
+    """
+    flag = cv2.IMREAD_GRAYSCALE if channels == 1 else cv2.IMREAD_COLOR
+    if isinstance(path, bytes):
+        im = cv2.imdecode(np.frombuffer(path, dtype=np.uint8), flag)
+    else:
+        im = cv2.imread(path, flag)
+    if channels != 1:
+        im = cv2.cvtColor(im, cv2.COLOR_BGR2RGB)
     return im
 
 # Cell
@@ -54,15 +79,37 @@ def convert_image(image: np.ndarray):
 
 # Cell
 @typedispatch
-def load_and_apply_image_transforms(path: str, transforms: A.Compose):
-    image = cv2_loader(path)
+def load_and_apply_image_transforms(
+    path: str, transforms: A.Compose, channels: int = 3
+):
+    image = cv2_loader(path, channels)
     aug_image = transforms(image=image)
     return aug_image["image"]
 
 # Cell
 @typedispatch
-def load_and_apply_image_transforms(path: str, transforms: T.Compose):
-    image = pil_loader(path)
+def load_and_apply_image_transforms(
+    path: str, transforms: T.Compose, channels: int = 3
+):
+    image = pil_loader(path, channels)
+    aug_image = transforms(image)
+    return aug_image
+
+# Cell
+@typedispatch
+def load_and_apply_image_transforms(
+    path: bytes, transforms: A.Compose, channels: int = 3
+):
+    image = cv2_loader(path, channels)
+    aug_image = transforms(image=image)
+    return aug_image["image"]
+
+# Cell
+@typedispatch
+def load_and_apply_image_transforms(
+    path: bytes, transforms: T.Compose, channels: int = 3
+):
+    image = pil_loader(path, channels)
     aug_image = transforms(image)
     return aug_image
 
@@ -77,6 +124,27 @@ def apply_transforms(im: Image.Image, transform: A.Compose):
     image = np.array(im)
     return transform(image=image)["image"]
 
+# Cell
+# ITU-R 601-2 luma transform, same as used by PIL for RGB -> L conversion
+_LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114])
+
+
+def match_channels(stats: Sequence[float], channels: int = 3) -> List[float]:
+    """
+    Matches the per-channel normalization `stats` (mean or std) with the number of `channels`.
+    RGB stats are converted to grayscale stats using the same luma transform as PIL, so that
+    the normalization of grayscale Images stays consistent with the RGB stats.
+    """
+    stats = [float(s) for s in stats]
+    if len(stats) == channels:
+        return stats
+    if channels == 1 and len(stats) == 3:
+        # for std this assumes the channels are highly correlated, which holds for natural Images
+        return [float(np.dot(_LUMA_WEIGHTS, stats))]
+    if len(stats) == 1:
+        return stats * channels
+    raise ValueError(f"Can not match stats with {len(stats)} values to {channels} channels")
+
 # Cell
 def denormalize(x: torch.Tensor, mean: torch.FloatTensor, std: torch.FloatTensor):
     "Denormalize `x` with `mean` and `std`."
@@ -115,12 +183,32 @@ def show_image_batch(
 class DatasetDict(namedtuple("dataset_dict", ["file_name", "target"])):
     """
     A simple structure that contains the path to the Images and
-    Interger target of the Images.
+    Interger target of the Images. `file_name` can also hold the encoded
+    bytes of the Image, e.g. when the Image is fetched from a remote store.
     """
 
     def __new__(cls, file_name: str, target: int):
         return super().__new__(cls, file_name, target)
 
+# Cell
+_MEMORY_FORMATS = ("contiguous", "channels_last")
+
+
+def _to_tensor_channels_last(image) -> torch.Tensor:
+    """
+    Same as `T.ToTensor` but returns a `(C, H, W)` view of the `(H, W, C)` Image instead of
+    a contiguous copy, i.e. the Image keeps the strides of the `channels_last` memory format.
+    """
+    if not isinstance(image, np.ndarray):
+        image = np.array(image)
+    if image.ndim == 2:
+        image = image[:, :, None]
+    image = torch.from_numpy(np.ascontiguousarray(image)).permute(2, 0, 1)
+    # the element-wise ops preserve the strides of the Image
+    if image.dtype == torch.uint8:
+        return image.float().div_(255)
+    return image
+
 # Cell
 class ClassificationMapper(DisplayedTransform):
     decodes = noop
@@ -145,6 +233,8 @@ class ClassificationMapper(DisplayedTransform):
         mean: Sequence[float] = IMAGENET_DEFAULT_MEAN,
         std: Sequence[float] = IMAGENET_DEFAULT_STD,
         xtras: Optional[Callable] = noop,
+        channels: int = 3,
+        memory_format: str = "contiguous",
     ):
         """
         Arguments:
@@ -152,23 +242,44 @@ class ClassificationMapper(DisplayedTransform):
         2. `mean`, `std`: list or tuple with #channels element, representing the per-channel mean and
         std to be used to normalize the input image. Note: These should be normalized values.
         4. `xtras`: A callable funtion applied after images are normalized and converted to tensors.
+        5. `channels`: number of channels of the Images. If 1, Images are decoded as grayscale and
+        RGB `mean`, `std` are converted to grayscale (see `match_channels`).
+        6. `memory_format`: `contiguous` or `channels_last`. With `channels_last` the Images are
+        returned as `(C, H, W)` views of `(H, W, C)` tensors, which `channels_last_collate` collates
+        into a `channels_last` batch.
         """
+        assert memory_format in _MEMORY_FORMATS, f"memory_format must be in {_MEMORY_FORMATS}"
         super().__init__()
         store_attr()
+        self.set_stats(mean, std)
 
+    def set_stats(self, mean: Sequence[float], std: Sequence[float]):
+        "Sets the `mean` & `std` used to normalize the Images"
+        self.mean = match_channels(mean, self.channels)
+        self.std = match_channels(std, self.channels)
+
+        to_tensor = T.ToTensor()
+        if self.memory_format == "channels_last":
+            to_tensor = _to_tensor_channels_last
         # fmt: off
         self.normalize = T.Compose([
-            T.ToTensor(),
+            to_tensor,
             T.Normalize(torch.tensor(self.mean), torch.tensor(self.std)),
         ])
         # fmt: on
 
+    def set_memory_format(self, memory_format: str):
+        "Sets the memory format of the Images, `contiguous` or `channels_last`"
+        assert memory_format in _MEMORY_FORMATS, f"memory_format must be in {_MEMORY_FORMATS}"
+        self.memory_format = memory_format
+        self.set_stats(self.mean, self.std)
+
     def encodes(self, dataset_dict: DatasetDict):
         """
         For normal use-cases
         """
         # fmt: off
-        image = load_and_apply_image_transforms(dataset_dict.file_name, self.augmentations)
+        image = load_and_apply_image_transforms(dataset_dict.file_name, self.augmentations, channels=self.channels)
         # fmt: on
         image = self.normalize(image)
         image = self.xtras(image)
@@ -184,6 +295,8 @@ class ClassificationMapper(DisplayedTransform):
         For torhcvision instances
         """
         image, target = torchvision_instance
+        if isinstance(image, Image.Image):
+            image = convert_mode(image, self.channels)
         image = apply_transforms(image, self.augmentations)
         image = self.normalize(image)
         image = self.xtras(image)
@@ -193,6 +306,16 @@ class ClassificationMapper(DisplayedTransform):
         target = torch.tensor(target, dtype=torch.long)
         return image, target
 
+# Cell
+def channels_last_collate(batch: Sequence[Tuple[torch.Tensor, Any]]) -> Tuple[torch.Tensor, Any]:
+    """
+    Collates `(image, target)` samples into a batch of Images in the `channels_last` memory
+    format: the Images are stacked and the batch is converted with `Tensor.contiguous`.
+    """
+    images, targets = zip(*batch)
+    images = torch.stack(images).contiguous(memory_format=torch.channels_last)
+    return images, default_collate(targets)
+
 # Cell
 class ClassificationDataset(torch.utils.data.Dataset):
     """
@@ -249,6 +372,7 @@ class PandasParser(Parser):
 
     def __init__(self, df: pd.DataFrame, path_column: str, label_column: str):
         self.df = df
+        self.path_column, self.label_column = path_column, label_column
         imgs = self.df[path_column]
         labels = self.df[label_column]
         self.samples = [(i, t) for i, t in zip(imgs, labels)]
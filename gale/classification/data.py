@@ -4,18 +4,32 @@ __all__ = ['register_torchvision_dataset', 'register_dataset_from_folders', 'reg
            'build_classification_loader_from_config']
 
 # Cell
+import copy
+import functools
+import inspect
 import logging
 import pydoc
 from typing import *
 
 import pandas as pd
 from fastcore.all import delegates, ifnone
-from hydra.utils import instantiate
-from omegaconf import DictConfig, OmegaConf
-from torch.utils.data import DataLoader, Dataset
+from hydra.utils import get_class, instantiate
+from omegaconf import DictConfig, ListConfig, OmegaConf
+from torch.utils.data import (
+    BatchSampler,
+    DataLoader,
+    Dataset,
+    IterableDataset,
+    RandomSampler,
+    SequentialSampler,
+)
 
 from .core import *
+from .loaders import MultiDatasetLoader, TaggedConcatDataset, ThreadDataLoader
+from .memory import InMemoryClassificationDataset
+from .samplers import ResumableRandomSampler
 from ..torch_utils import worker_init_fn
+from ..utils.cpu import ThreadPlan, thread_plan_worker_init_fn
 from ..utils.structures import DatasetCatalog
 
 _logger = logging.getLogger(__name__)
@@ -26,6 +40,7 @@ def register_torchvision_dataset(
     name: str,
     dataset: Dataset,
     mapper: Optional[Union[ClassificationMapper, Callable]] = None,
+    in_memory: bool = False,
     **kwargs
 ):
     """
@@ -36,8 +51,21 @@ def register_torchvision_dataset(
     the default `ClassificationMapper` will be used to map the dataset in
     gale `ClassificationDataset` format.
 
+    If `in_memory` is `True` the whole dataset is loaded in memory as a uint8 tensor
+    (see `InMemoryClassificationDataset`) and batches are fetched & augmented at once.
+    In this case `augmentations` must be a callable which works on uint8 batches of
+    shape `(N, C, H, W)` and `mapper` is ignored.
+
     `name` is a `str` that identifies a dataset, e.g. "coco_2014_train".
     """
+    if in_memory:
+        kwargs.pop("xtras", None)
+        DatasetCatalog.register(
+            name, lambda: InMemoryClassificationDataset.from_dataset(dataset, **kwargs)
+        )
+        _logger.info("Dataset: {} registerd to DatasetCatalog".format(name))
+        return
+
     mapper = ifnone(mapper, ClassificationMapper(**kwargs))
 
     DatasetCatalog.register(
@@ -89,33 +117,139 @@ def register_dataset_from_df(
     _logger.info("Dataset: {} registerd to DatasetCatalog".format(name))
 
 # Cell
-def build_classification_loader_from_config(name: str, config: DictConfig):
+def _with_memory_format(dataset: Dataset, memory_format: str) -> Dataset:
+    # a copy of the dataset & its mapper, the datasets registered in DatasetCatalog can be
+    # shared with other loaders
+    if hasattr(dataset, "set_memory_format"):
+        dataset = copy.copy(dataset)
+        dataset.set_memory_format(memory_format)
+    elif hasattr(getattr(dataset, "mapper", None), "set_memory_format"):
+        dataset = copy.copy(dataset)
+        dataset.mapper = copy.copy(dataset.mapper)
+        dataset.mapper.set_memory_format(memory_format)
+    return dataset
+
+# Cell
+def build_classification_loader_from_config(
+    name: Union[str, List[str]],
+    config: DictConfig,
+    thread_plan: Optional[ThreadPlan] = None,
+):
     """
     Build DataLoader from gale config using a dataset registerd in
-    DatasetCatalog identified by `name`.
+    DatasetCatalog identified by `name`. If `name` is a list of names, a single
+    `MultiDatasetLoader` serving all the datasets from one pool of workers is returned.
 
     Arguments:
-    1. name (str): represents the name of the registerd dataset.
+    1. name (str or List[str]): represents the name of the registerd dataset.
     2. config (DictConfig): gale config for a dataloader.
+    3. thread_plan (ThreadPlan, optional): threads & cores of the workers, see `build_thread_plan`.
+
+    If `memory_format` is `channels_last` in `config`, the datasets are copied with mappers which
+    return Images in the `channels_last` memory format, which are collated with
+    `channels_last_collate` if no `collate_fn` is given.
     """
     _logger.debug("Creating Loader for {} dataset".format(name))
 
-    dataset = DatasetCatalog.get(name)
+    if isinstance(name, (list, ListConfig)):
+        dataset = TaggedConcatDataset([DatasetCatalog.get(n) for n in name])
+    else:
+        dataset = DatasetCatalog.get(name)
 
     _logger.debug("Found {} instances in the dataset".format(len(dataset)))
 
     conf = OmegaConf.to_container(config, resolve=True)
+    # only used by the tasks to decide if `name` is passed in as a list
+    conf.pop("shared_workers", None)
+    memory_format = conf.pop("memory_format", "contiguous")
+
+    # load the batches in worker processes (default) or in a pool of threads
+    mode = conf.pop("mode", "process")
+    num_threads = conf.pop("num_threads", 8)
+    # bounds of the number of threads if it is adapted at runtime
+    min_threads = conf.pop("min_threads", None)
+    max_threads = conf.pop("max_threads", None)
+    assert mode in ("process", "thread"), f"Unknown dataloader mode: {mode}"
+    if mode == "thread":
+        conf["num_workers"] = 0
 
     if conf["num_workers"] > 0:
-        conf["worker_init_fn"] = worker_init_fn
-
-    if conf["sampler"] is not None:
-        conf["sampler"] = instantiate(conf["sampler"])
+        if thread_plan is not None:
+            conf["worker_init_fn"] = functools.partial(
+                thread_plan_worker_init_fn, plan=thread_plan
+            )
+        else:
+            conf["worker_init_fn"] = worker_init_fn
+
+    # shuffle with a sampler which can be resumed in the middle of an epoch
+    resumable = conf.pop("resumable", False)
+    if resumable and conf["sampler"] is None and conf.get("shuffle", False):
+        if not isinstance(dataset, (IterableDataset, TaggedConcatDataset)):
+            conf["sampler"] = ResumableRandomSampler(dataset)
+            conf["shuffle"] = False
+
+    if isinstance(conf["sampler"], Mapping):
+        # samplers like `RandomSampler` or `BlockShuffleSampler` need the dataset
+        target = get_class(conf["sampler"]["_target_"])
+        if "data_source" in inspect.signature(target).parameters:
+            conf["sampler"] = instantiate(conf["sampler"], data_source=dataset)
+        else:
+            conf["sampler"] = instantiate(conf["sampler"])
+        # the sampler decides the order, `shuffle` is mutually exclusive with it
+        conf["shuffle"] = False
         _logger.info("Using sampler {}".format(conf["sampler"].__class__.__name__))
 
     if conf["collate_fn"] is not None:
         conf["collate_fn"] = pydoc.locate(conf["collate_fn"])
         _logger.info("Using collate_fn {}".format(conf["collate_fn"]))
 
-    loader = DataLoader(dataset, **conf)
+    if memory_format == "channels_last":
+        if isinstance(dataset, TaggedConcatDataset):
+            dataset.datasets = [_with_memory_format(d, memory_format) for d in dataset.datasets]
+        else:
+            dataset = _with_memory_format(dataset, memory_format)
+        if conf["collate_fn"] is None and not getattr(dataset, "batched", False):
+            conf["collate_fn"] = channels_last_collate
+
+    if isinstance(dataset, IterableDataset):
+        # the dataset shards & shuffles the samples itself
+        assert conf["sampler"] is None, "sampler is not supported for iterable datasets"
+        conf["shuffle"] = False
+    elif isinstance(dataset, TaggedConcatDataset):
+        # every batch is loaded & collated from a single dataset
+        sampler = conf.pop("sampler")
+        assert sampler is None, "sampler is not supported for multiple datasets"
+        conf.pop("shuffle", None)
+        dataset.collate_fn = ifnone(conf.pop("collate_fn"), dataset.collate_fn)
+        batch_size = conf.pop("batch_size")
+        drop_last = conf.pop("drop_last", False)
+        conf["sampler"] = dataset.batch_sampler(batch_size, drop_last)
+        conf["batch_size"] = None
+    elif getattr(dataset, "batched", False):
+        # the dataset fetches whole batches, so pass it batches of indices
+        sampler = conf.pop("sampler")
+        if sampler is None:
+            shuffle = conf.pop("shuffle", False)
+            sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+        conf.pop("shuffle", None)
+        batch_size = conf.pop("batch_size")
+        drop_last = conf.pop("drop_last", False)
+        conf["sampler"] = BatchSampler(sampler, batch_size, drop_last)
+        conf["batch_size"] = None
+        _logger.info("Fetching batches of {} Images at once".format(batch_size))
+
+    if mode == "thread":
+        _logger.info("Loading batches in {} threads".format(num_threads))
+        loader = ThreadDataLoader(
+            dataset,
+            num_threads=num_threads,
+            min_threads=min_threads,
+            max_threads=max_threads,
+            **conf,
+        )
+    else:
+        loader = DataLoader(dataset, **conf)
+
+    if isinstance(dataset, TaggedConcatDataset):
+        loader = MultiDatasetLoader(loader)
     return loader
\ No newline at end of file
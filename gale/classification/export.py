@@ -0,0 +1,192 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/06c_classification.export.ipynb (unless otherwise specified).
+
+__all__ = ['NormalizedModel', 'export_model', 'verify_export', 'benchmark_export']
+
+# Cell
+import inspect
+import json
+import logging
+from typing import *
+
+import numpy as np
+import torch
+from fastcore.all import Path, ifnone
+from torch import nn
+
+from ..runtime import METADATA_FILE, ExportedModel, benchmark_latency
+from .scoring import load_model_from_checkpoint
+
+_logger = logging.getLogger(__name__)
+
+_FORMATS = ("torchscript", "onnx")
+
+# Cell
+class NormalizedModel(nn.Module):
+    """
+    Normalizes the inputs with `mean` & `std` and runs them through `model`. The
+    normalization is stored as a scale & a shift, i.e `x * (1 / std) - mean / std`.
+    """
+
+    def __init__(self, model: nn.Module, mean: Sequence[float], std: Sequence[float]):
+        super().__init__()
+        self.model = model
+        mean = torch.as_tensor(mean, dtype=torch.float32).view(1, -1, 1, 1)
+        std = torch.as_tensor(std, dtype=torch.float32).view(1, -1, 1, 1)
+        self.register_buffer("scale", 1.0 / std)
+        self.register_buffer("shift", -mean / std)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.model(x * self.scale + self.shift)
+
+# Cell
+def _resolve(
+    model: Any, mean: Optional[Sequence[float]], std: Optional[Sequence[float]]
+) -> Tuple[nn.Module, List[float], List[float], Tuple[int, ...]]:
+    # returns the eager model, its normalization & its input shape (C, H, W)
+    if isinstance(model, nn.Module) and not hasattr(model, "_model"):
+        # a `GeneralizedImageClassifier` or a `VisionTransformer`
+        assert (
+            mean is not None and std is not None
+        ), "mean & std are required for a model"
+    elif isinstance(model, (str, Path)):
+        model, mapper = load_model_from_checkpoint(model)
+        mean, std = ifnone(mean, mapper.mean), ifnone(std, mapper.std)
+    elif hasattr(model, "_model"):
+        # a `ClassificationTask`
+        mean = ifnone(mean, np.array(model.mean).tolist())
+        std = ifnone(std, np.array(model.std).tolist())
+        model = model._model
+    else:
+        raise TypeError("model must be a model, a `ClassificationTask` or a checkpoint")
+    assert hasattr(model, "input_shape"), "model must have an `input_shape`"
+    shape = model.input_shape
+    mean, std = np.array(mean, dtype=np.float64), np.array(std, dtype=np.float64)
+    return (
+        model.eval(),
+        mean.tolist(),
+        std.tolist(),
+        (shape.channels, shape.height, shape.width),
+    )
+
+# Cell
+def export_model(
+    model: Any,
+    output_dir: Union[str, Path],
+    formats: Sequence[str] = _FORMATS,
+    mean: Optional[Sequence[float]] = None,
+    std: Optional[Sequence[float]] = None,
+    opset_version: int = 13,
+) -> Dict[str, Path]:
+    """
+    Exports `model` (a `GeneralizedImageClassifier` or a `VisionTransformer` with the
+    normalization `mean` & `std`, a `ClassificationTask` or the path of a checkpoint) to `output_dir` in
+    `formats`: `torchscript` (`model.pt`) and/or `onnx` (`model.onnx`), along with a
+    `metadata.json` holding the input shape & the normalization. The exported graphs take
+    float32 Images of shape `(N, C, H, W)` in [0, 1] for any `N` and return the logits.
+
+    Returns the paths of the exported graphs.
+    """
+    assert all(f in _FORMATS for f in formats), f"formats must be in {_FORMATS}"
+    model, mean, std, input_shape = _resolve(model, mean, std)
+    wrapped = NormalizedModel(model, mean, std).eval()
+    example = torch.rand(2, *input_shape)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    if "torchscript" in formats:
+        paths["torchscript"] = output_dir / "model.pt"
+        with torch.no_grad():
+            traced = torch.jit.trace(wrapped, example)
+        traced.save(str(paths["torchscript"]))
+
+    if "onnx" in formats:
+        paths["onnx"] = output_dir / "model.onnx"
+        kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # the TorchScript based exporter supports `dynamic_axes`
+            kwargs["dynamo"] = False
+        torch.onnx.export(
+            wrapped,
+            example,
+            str(paths["onnx"]),
+            input_names=["images"],
+            output_names=["logits"],
+            dynamic_axes={"images": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=opset_version,
+            **kwargs,
+        )
+
+    with open(output_dir / METADATA_FILE, "w") as f:
+        json.dump(dict(input_shape=list(input_shape), mean=mean, std=std), f, indent=2)
+
+    for fmt, path in paths.items():
+        _logger.info("Exported {} graph to {}".format(fmt, path))
+    return paths
+
+# Cell
+def verify_export(
+    model: Any,
+    paths: Dict[str, Union[str, Path]],
+    mean: Optional[Sequence[float]] = None,
+    std: Optional[Sequence[float]] = None,
+    batch_sizes: Sequence[int] = (1, 3),
+    atol: float = 1e-4,
+) -> Dict[str, float]:
+    """
+    Checks that the exported graphs at `paths` (as returned by `export_model`) return the same
+    logits as the eager `model` on random batches of `batch_sizes` Images, raises an
+    `AssertionError` if the difference is larger than `atol`. Returns the maximum absolute
+    difference of each graph.
+    """
+    model, mean, std, input_shape = _resolve(model, mean, std)
+    eager = NormalizedModel(model, mean, std).eval()
+    diffs = {}
+    for fmt, path in paths.items():
+        runtime, diff = ExportedModel(path), 0.0
+        for batch_size in batch_sizes:
+            x = torch.rand(batch_size, *input_shape)
+            with torch.no_grad():
+                expected = eager(x).numpy()
+            diff = max(diff, float(np.abs(runtime(x.numpy()) - expected).max()))
+        diffs[fmt] = diff
+        assert diff <= atol, f"{fmt} graph differs from the eager model by {diff}"
+        _logger.info(
+            "{} graph matches the eager model, max diff {:.2e}".format(fmt, diff)
+        )
+    return diffs
+
+# Cell
+def benchmark_export(
+    model: Any,
+    paths: Dict[str, Union[str, Path]],
+    mean: Optional[Sequence[float]] = None,
+    std: Optional[Sequence[float]] = None,
+    batch_sizes: Sequence[int] = (1, 8, 32),
+    num_iters: int = 20,
+    num_threads: Optional[int] = None,
+) -> Dict[str, Dict[int, Dict[str, float]]]:
+    """
+    Measures the CPU latency of the eager `model` and of the exported graphs at `paths` for
+    every batch size, see `gale.runtime.benchmark_latency`.
+    """
+    model, mean, std, input_shape = _resolve(model, mean, std)
+    eager = NormalizedModel(model, mean, std).eval()
+
+    def _eager(x):
+        with torch.no_grad():
+            return eager(torch.from_numpy(x))
+
+    runners = {"eager": _eager}
+    runners.update({fmt: ExportedModel(p, num_threads) for fmt, p in paths.items()})
+
+    results = {}
+    for name, fn in runners.items():
+        results[name] = benchmark_latency(fn, input_shape, batch_sizes, num_iters)
+        for batch_size, r in results[name].items():
+            _logger.info(
+                "{} batch {}: p50 {:.2f} ms, p90 {:.2f} ms, {:.1f} Images/s".format(
+                    name, batch_size, r["p50_ms"], r["p90_ms"], r["images/s"]
+                )
+            )
+    return results
\ No newline at end of file
@@ -0,0 +1,274 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/06f_classification.features.ipynb (unless otherwise specified).
+
+__all__ = ['FeatureSplit', 'split_frozen_model', 'FeatureStore', 'build_feature_store', 'register_feature_store']
+
+# Cell
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from typing import *
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from fastcore.all import Path, ifnone
+from torch import nn
+from torch.utils.data import Dataset
+
+from ..utils.structures import DatasetCatalog
+from .core import ClassificationMapper
+from .inference import _inference_mode, build_inference_loader, eval_dataset
+from .model.heads import FastaiHead, FullyConnectedHead
+from .model.meta_arch.common import GeneralizedImageClassifier
+from .model.meta_arch.vision_transformer import VisionTransformer
+
+_logger = logging.getLogger(__name__)
+
+_METADATA = "metadata.json"
+
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gale", "features")
+
+# `extractor` computes the features of the Images, `head` the logits from the features
+FeatureSplit = namedtuple("FeatureSplit", field_names=["extractor", "head"])
+
+# Cell
+class _FullyConnectedClassifier(nn.Module):
+    # the layers of a `FullyConnectedHead` after the global pooling
+    def __init__(self, head: FullyConnectedHead):
+        super().__init__()
+        self.head = head
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self.head.drop_rate:
+            x = F.dropout(x, p=float(self.head.drop_rate), training=self.head.training)
+        return self.head.fc(x)
+
+# Cell
+class _VisionTransformerFeatures(nn.Module):
+    # the class token fed to the classifier of a timm vision transformer
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.model.forward_features(x)
+
+# Cell
+def _is_frozen(module: nn.Module) -> bool:
+    return not any(p.requires_grad for p in module.parameters())
+
+# Cell
+def split_frozen_model(model: nn.Module, pooled: bool = True) -> Optional[FeatureSplit]:
+    """
+    Splits `model` into a frozen feature extractor and the trainable head, which share the
+    parameters of `model`. Supported models are:
+    1. A `GeneralizedImageClassifier` with a frozen backbone. With `pooled` and a `FastaiHead`
+    or a `FullyConnectedHead`, the global pooling of the head is part of the extractor and the
+    features are of shape `(N, C)`, else the features are the feature maps of the backbone.
+    2. A `VisionTransformer` in which only the classifier is trainable (`finetune=True`), the
+    features are the class tokens.
+
+    Returns `None` for other models.
+    """
+    if isinstance(model, GeneralizedImageClassifier):
+        if not _is_frozen(model.backbone):
+            return None
+        backbone, head = model.backbone, model.head
+        if pooled and isinstance(head, FastaiHead):
+            return FeatureSplit(
+                nn.Sequential(backbone, head.layers[0]), head.layers[1:]
+            )
+        if pooled and isinstance(head, FullyConnectedHead):
+            return FeatureSplit(
+                nn.Sequential(backbone, head.global_pool),
+                _FullyConnectedClassifier(head),
+            )
+        return FeatureSplit(backbone, head)
+
+    if isinstance(model, VisionTransformer):
+        vit = model.model
+        trainable = {
+            n.split(".")[0] for n, p in vit.named_parameters() if p.requires_grad
+        }
+        # distilled transformers average the outputs of two classifiers
+        if trainable - {"head"} or getattr(vit, "head_dist", None) is not None:
+            return None
+        return FeatureSplit(_VisionTransformerFeatures(vit), vit.head)
+    return None
+
+# Cell
+class FeatureStore(Dataset):
+    """
+    The features of a dataset computed by a frozen backbone, stored in `path` as a
+    memory-mapped `features.npy` of shape `(N, *shape)`, the targets in `targets.npy` and a
+    `metadata.json`. Stores are written by `build_feature_store`.
+
+    Like `InMemoryClassificationDataset`, a batch is fetched with a list of indices as a
+    single read of the memory-mapped file, the indices are sorted to read the file in order.
+    The features are returned as float32.
+    """
+
+    # lets the loaders know that this dataset fetches whole batches at once
+    batched = True
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / _METADATA) as f:
+            self.metadata = json.load(f)
+        self._features, self._targets = None, None
+
+    @staticmethod
+    def exists(path: Union[str, Path]) -> bool:
+        "Returns `True` if `path` holds a store, see `build_feature_store`"
+        return (Path(path) / _METADATA).exists()
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(self.metadata["shape"])
+
+    def _open(self):
+        # opened lazily, so the store is sent to the DataLoader workers as its path
+        if self._features is None:
+            self._features = np.load(self.path / "features.npy", mmap_mode="r")
+            self._targets = np.load(self.path / "targets.npy")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_features"], state["_targets"] = None, None
+        return state
+
+    def __len__(self):
+        return self.metadata["num_samples"]
+
+    def __getitems__(self, indices: Sequence[int]) -> Tuple[torch.Tensor, torch.Tensor]:
+        "Returns the batch of features & targets at `indices`"
+        self._open()
+        indices = np.sort(np.asarray(indices, dtype=np.int64))
+        features = torch.from_numpy(np.ascontiguousarray(self._features[indices]))
+        return features.float(), torch.from_numpy(self._targets[indices])
+
+    def __getitem__(self, index):
+        if isinstance(index, (list, tuple, torch.Tensor, np.ndarray)):
+            return self.__getitems__(index)
+        features, targets = self.__getitems__([index])
+        return features[0], targets[0]
+
+    def __repr__(self):
+        return f"FeatureStore(path={self.path}, num_samples={len(self)}, shape={self.shape})"
+
+# Cell
+def _store_key(
+    extractor: nn.Module, dataset: Dataset, mapper: ClassificationMapper, dtype: str
+) -> str:
+    # the weights of the extractor, the samples of the dataset & the transforms
+    h = hashlib.sha1()
+    for name, tensor in extractor.state_dict().items():
+        h.update(name.encode())
+        h.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    parser = getattr(dataset, "parser", None)
+    samples = getattr(parser, "samples", None)
+    h.update(repr(samples if samples is not None else len(dataset)).encode())
+    transforms = (repr(mapper.augmentations), mapper.mean, mapper.std, mapper.channels)
+    h.update(repr(transforms).encode())
+    h.update(dtype.encode())
+    return h.hexdigest()
+
+# Cell
+def build_feature_store(
+    extractor: nn.Module,
+    dataset: Union[str, Dataset],
+    mapper: ClassificationMapper,
+    cache_dir: Optional[Union[str, Path]] = None,
+    dtype: str = "float16",
+    batch_size: int = 64,
+    num_workers: int = 0,
+) -> FeatureStore:
+    """
+    Runs the frozen `extractor` (see `split_frozen_model`) once in eval mode over `dataset`
+    (the name of a dataset registered in DatasetCatalog or a dataset) mapped with the
+    deterministic `mapper` and writes the features as `dtype` to a `FeatureStore` in
+    `cache_dir`, by default `~/.cache/gale/features`.
+
+    Stores are keyed by the weights of the extractor, the samples of the dataset and the
+    transforms, an existing store with the same key is reused. Use a new `cache_dir` if the
+    source Images are modified in place. The store is written to a temporary directory which
+    is renamed once complete, so an interrupted build leaves no store behind.
+    """
+    if isinstance(dataset, str):
+        dataset = DatasetCatalog.get(dataset)
+    dataset = eval_dataset(dataset, mapper)
+    assert len(dataset) > 0, "The dataset is empty"
+    path = Path(ifnone(cache_dir, _CACHE_DIR)) / _store_key(
+        extractor, dataset, mapper, dtype
+    )
+    if FeatureStore.exists(path):
+        _logger.info("Using the cached features in {}".format(path))
+        return FeatureStore(path)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+    loader = build_inference_loader(dataset, batch_size, num_workers)
+    device = next(extractor.parameters()).device
+    features, targets, start = None, np.empty(len(dataset), dtype=np.int64), 0
+
+    tick = time.perf_counter()
+    # the mode of every module is restored, the extractor can be a new container (see
+    # `split_frozen_model`) whose own mode differs from the mode of its modules
+    modes = [(m, m.training) for m in extractor.modules()]
+    extractor.eval()
+    try:
+        with _inference_mode():
+            for images, labels in loader:
+                out = extractor(images.to(device, non_blocking=True)).float().cpu()
+                if features is None:
+                    features = np.lib.format.open_memmap(
+                        tmp / "features.npy",
+                        mode="w+",
+                        dtype=dtype,
+                        shape=(len(dataset), *out.shape[1:]),
+                    )
+                features[start : start + len(out)] = out.numpy()
+                targets[start : start + len(out)] = torch.as_tensor(labels).numpy()
+                start += len(out)
+
+        features.flush()
+        np.save(tmp / "targets.npy", targets)
+        metadata = dict(
+            num_samples=len(dataset), shape=list(features.shape[1:]), dtype=dtype
+        )
+        with open(tmp / _METADATA, "w") as f:
+            json.dump(metadata, f, indent=2)
+        # another process may have written the same store in the meantime
+        if not FeatureStore.exists(path):
+            if path.exists():
+                # a store left incomplete by an older version of gale
+                shutil.rmtree(path)
+            os.replace(tmp, path)
+    finally:
+        for module, training in modes:
+            module.training = training
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    _logger.info(
+        "Cached the features of {} Images of shape {} in {:.1f}s ({:.1f} MB)".format(
+            len(dataset),
+            tuple(features.shape[1:]),
+            time.perf_counter() - tick,
+            features.nbytes / 2**20,
+        )
+    )
+    return FeatureStore(path)
+
+# Cell
+def register_feature_store(name: str, path: Union[str, Path]):
+    """
+    Register the `FeatureStore` at `path` in DatasetCatalog as `name`, so that the loaders
+    can be built with `build_classification_loader_from_config`.
+    """
+    DatasetCatalog.register(name, lambda: FeatureStore(path))
+    _logger.info("Dataset: {} registerd to DatasetCatalog".format(name))
\ No newline at end of file
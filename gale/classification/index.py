@@ -0,0 +1,274 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05l_classification.index.ipynb (unless otherwise specified).
+
+__all__ = ['DatasetIndex', 'register_dataset_from_index']
+
+# Cell
+import json
+import logging
+import os
+from typing import *
+
+import pandas as pd
+from fastcore.all import Path, delegates, ifnone
+from torchvision.datasets.folder import IMG_EXTENSIONS
+
+from ..utils.structures import DatasetCatalog
+from .core import ClassificationDataset, ClassificationMapper, PandasParser
+from .manifest import build_image_manifest
+
+_logger = logging.getLogger(__name__)
+
+_STATE_FILE = "index.json"
+_MANIFEST_FILE = "manifest.csv"
+_COLUMNS = ["file_name", "label", "split", "op", "version"]
+
+# Cell
+class DatasetIndex:
+    """
+    An append-only index of `(file_name, label)` samples stored in the directory `root`.
+
+    - `add` & `remove` write a new segment with the added samples or the tombstones of the
+    removed samples and bump the `version` of the index.
+    - `labels` maps the labels to integer targets. New labels get the next free target, so the
+    targets of the existing samples never change.
+    - New samples are assigned to the `train` or `valid` split per label, such that each label
+    keeps a fraction of `valid_pct` samples in `valid`. Existing samples never change split.
+    - `snapshot` replays the segments on top of the latest compacted snapshot, see `compact`.
+    - `update_manifest` reads the Image headers of the new samples only.
+    """
+
+    def __init__(self, root: Union[str, Path], valid_pct: float = 0.2):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._snapshots = {}
+        if (self.root / _STATE_FILE).exists():
+            with open(self.root / _STATE_FILE) as f:
+                self.state = json.load(f)
+        else:
+            self.state = dict(
+                version=0,
+                segments=[],
+                labels={},
+                split_counts={},
+                valid_pct=valid_pct,
+                snapshot=None,
+            )
+            self._save_state()
+
+    @property
+    def version(self) -> int:
+        return self.state["version"]
+
+    @property
+    def labels(self) -> Dict[str, int]:
+        "Mapping from the labels to the integer targets"
+        return self.state["labels"]
+
+    def _save_state(self):
+        # written to a temporary file first, so that a crash never leaves a partial state
+        tmp = self.root / (_STATE_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.root / _STATE_FILE)
+
+    def _assign_split(self, label: str) -> str:
+        train, valid = self.state["split_counts"].get(label, [0, 0])
+        if valid < round(self.state["valid_pct"] * (train + valid + 1)):
+            valid += 1
+            split = "valid"
+        else:
+            train += 1
+            split = "train"
+        self.state["split_counts"][label] = [train, valid]
+        return split
+
+    def _write_segment(self, segment: pd.DataFrame):
+        version = self.version + 1
+        name = f"segment-{version:06d}.csv"
+        segment["version"] = version
+        segment[_COLUMNS].to_csv(self.root / name, index=False)
+        self.state["segments"].append(name)
+        self.state["version"] = version
+        self._save_state()
+
+    def add(self, file_names: Sequence[str], labels: Sequence[Any]) -> int:
+        """
+        Adds the samples `file_names` with `labels` to the index. Samples which are already in
+        the index are skipped. Returns the number of added samples.
+        """
+        live = set(self.snapshot()["file_name"])
+        rows = []
+        for file_name, label in zip(file_names, labels):
+            file_name, label = str(file_name), str(label)
+            if file_name in live:
+                continue
+            live.add(file_name)
+            if label not in self.labels:
+                self.labels[label] = len(self.labels)
+            rows.append((file_name, label, self._assign_split(label), "add"))
+        if rows:
+            self._write_segment(pd.DataFrame(rows, columns=_COLUMNS[:-1]))
+            _logger.info(
+                "Added {} samples to {}, version {}".format(
+                    len(rows), self.root, self.version
+                )
+            )
+        return len(rows)
+
+    def add_folder(
+        self, directory: Union[str, Path], extensions: Sequence[str] = IMG_EXTENSIONS
+    ) -> int:
+        """
+        Adds the new Images of `directory`, where the Images are arranged in a folder per label
+        (see `FolderParser`). Returns the number of added samples.
+        """
+        file_names, labels = [], []
+        for label in sorted(os.listdir(directory)):
+            label_dir = os.path.join(directory, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for image in sorted(os.listdir(label_dir)):
+                if image.lower().endswith(tuple(extensions)):
+                    file_names.append(os.path.join(label_dir, image))
+                    labels.append(label)
+        return self.add(file_names, labels)
+
+    def remove(self, file_names: Sequence[str]) -> int:
+        """
+        Tombstones the samples `file_names`, the samples which are not in the index are
+        skipped. Returns the number of removed samples.
+        """
+        snapshot = self.snapshot().set_index("file_name")
+        file_names = [str(f) for f in file_names if str(f) in snapshot.index]
+        if file_names:
+            rows = snapshot.loc[file_names, ["label", "split"]].reset_index()
+            rows["op"] = "remove"
+            for label, split in zip(rows["label"], rows["split"]):
+                self.state["split_counts"][label][split == "valid"] -= 1
+            self._write_segment(rows)
+            _logger.info(
+                "Removed {} samples from {}, version {}".format(
+                    len(rows), self.root, self.version
+                )
+            )
+        return len(file_names)
+
+    def _read_segment(self, name: str) -> pd.DataFrame:
+        return pd.read_csv(self.root / name, dtype={"label": str})
+
+    def snapshot(self, version: Optional[int] = None) -> pd.DataFrame:
+        """
+        Returns the live samples of the index at `version` (the latest version if `None`) with
+        the columns `file_name`, `label`, `target`, `split` and `version`, the version in
+        which the sample was added.
+        """
+        version = ifnone(version, self.version)
+        if version in self._snapshots:
+            return self._snapshots[version]
+
+        base, base_version = None, 0
+        compacted = self.state["snapshot"]
+        if compacted is not None and compacted["version"] <= version:
+            base = pd.read_csv(self.root / compacted["file"], dtype={"label": str})
+            base_version = compacted["version"]
+
+        segments = [
+            self._read_segment(name)
+            for name in self.state["segments"][base_version:version]
+        ]
+        log = pd.concat(
+            [base] + segments if base is not None else segments or [_empty()],
+            ignore_index=True,
+        )
+        removed = log["op"] == "remove"
+        # a sample is live if it was added after its last removal
+        last_removed = log[removed].groupby("file_name")["version"].max()
+        added = log[~removed]
+        dead = added["version"] <= added["file_name"].map(last_removed).fillna(-1)
+        snapshot = added[~dead].drop_duplicates("file_name", keep="last")
+
+        snapshot = snapshot.reset_index(drop=True)
+        snapshot.insert(2, "target", snapshot["label"].map(self.labels).astype(int))
+        self._snapshots[version] = snapshot
+        return snapshot
+
+    def compact(self):
+        """
+        Writes the snapshot of the latest version, which is used as the starting point of
+        `snapshot`, so that the segments before it are not replayed anymore.
+        """
+        snapshot = self.snapshot()
+        name = f"snapshot-{self.version:06d}.csv"
+        snapshot.assign(op="add")[_COLUMNS].to_csv(self.root / name, index=False)
+        self.state["snapshot"] = dict(version=self.version, file=name)
+        self._save_state()
+        _logger.info("Compacted {} at version {}".format(self.root, self.version))
+
+    def update_manifest(self, **kwargs) -> pd.DataFrame:
+        """
+        Reads the Image headers (see `build_image_manifest`) of the samples added since the
+        last update & drops the removed samples from the manifest stored with the index.
+        `kwargs` are passed to `build_image_manifest`.
+        """
+        path = self.root / _MANIFEST_FILE
+        manifest = pd.read_csv(path) if path.exists() else None
+        live = self.snapshot()["file_name"]
+
+        known = set(manifest["file_name"]) if manifest is not None else set()
+        new = [f for f in live if f not in known]
+        if manifest is None or new:
+            # the first update starts from the empty manifest, with its columns
+            delta = build_image_manifest(new, **kwargs)
+            manifest = (
+                delta
+                if manifest is None
+                else pd.concat([manifest, delta], ignore_index=True)
+            )
+        manifest = manifest[manifest["file_name"].isin(set(live))]
+        manifest.to_csv(path, index=False)
+        _logger.info("Read the headers of {} new Images".format(len(new)))
+        return manifest.reset_index(drop=True)
+
+    def parser(self, split: Optional[str] = None, version: Optional[int] = None):
+        "Returns a `PandasParser` of the samples of `split` (all if `None`) at `version`"
+        snapshot = self.snapshot(version)
+        if split is not None:
+            snapshot = snapshot[snapshot["split"] == split].reset_index(drop=True)
+        return PandasParser(snapshot, "file_name", "target")
+
+    def __len__(self):
+        return len(self.snapshot())
+
+    def __repr__(self):
+        return "DatasetIndex(root={}, version={}, samples={}, labels={})".format(
+            self.root, self.version, len(self), len(self.labels)
+        )
+
+# Cell
+def _empty() -> pd.DataFrame:
+    return pd.DataFrame(columns=_COLUMNS)
+
+# Cell
+@delegates(ClassificationMapper)
+def register_dataset_from_index(
+    name: str,
+    root: Union[str, Path],
+    split: Optional[str] = None,
+    version: Optional[int] = None,
+    mapper: Optional[Union[ClassificationMapper, Callable]] = None,
+    **kwargs,
+):
+    """
+    Register the samples of `split` of the `DatasetIndex` in `root` to DatasetCatalog. If
+    `version` is `None`, the latest version of the index at the time the dataset is built is
+    used, so the registration picks up the new samples without re-registering.
+    `name` is a `str` that identifies a dataset, e.g. "coco_2014_train".
+    """
+    mapper = ifnone(mapper, ClassificationMapper(**kwargs))
+    DatasetCatalog.register(
+        name,
+        lambda: ClassificationDataset(
+            mapper=mapper, parser=DatasetIndex(root).parser(split, version)
+        ),
+    )
+    _logger.info("Dataset: {} registerd to DatasetCatalog".format(name))
\ No newline at end of file
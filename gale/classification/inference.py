@@ -0,0 +1,188 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/06a_classification.inference.ipynb (unless otherwise specified).
+
+__all__ = ['PathsDataset', 'eval_dataset', 'build_inference_loader', 'iter_predictions', 'predict_loader']
+
+# Cell
+import contextlib
+import copy
+import logging
+from typing import *
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from fastcore.all import ifnone
+from torch import nn
+from torch.utils.data import BatchSampler, DataLoader, Dataset, SequentialSampler
+
+from ..torch_utils import worker_init_fn
+from ..utils.structures import DatasetCatalog
+from .core import ClassificationDataset, ClassificationMapper, DatasetDict
+from .loaders import ThreadDataLoader
+
+_logger = logging.getLogger(__name__)
+
+_OUTPUTS = ("logits", "probs", "topk", "embeddings")
+
+# Cell
+class PathsDataset(Dataset):
+    "A dataset of the Images at `paths` mapped with `mapper`, the targets are set to -1"
+
+    def __init__(self, paths: Sequence[str], mapper: ClassificationMapper):
+        self.paths, self.mapper = [str(p) for p in paths], mapper
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        return self.mapper.encodes(DatasetDict(file_name=self.paths[index], target=-1))
+
+# Cell
+def eval_dataset(
+    dataset: Union[str, Sequence[str], Dataset], mapper: ClassificationMapper
+) -> Dataset:
+    """
+    Returns a dataset which maps the Images of `dataset` (file paths, the name of a dataset
+    registered in DatasetCatalog or a dataset) with the deterministic `mapper`. Datasets
+    which apply their own `augmentations` to the batches, like `InMemoryClassificationDataset`,
+    are copied without the augmentations, other datasets are returned as they are.
+    """
+    if isinstance(dataset, str):
+        dataset = DatasetCatalog.get(dataset)
+    elif not isinstance(dataset, Dataset):
+        return PathsDataset(dataset, mapper)
+    if isinstance(dataset, ClassificationDataset):
+        # replace the (possibly random) augmentations of the dataset
+        return ClassificationDataset(mapper=mapper, parser=dataset.parser)
+    if getattr(dataset, "augmentations", None) is not None:
+        dataset = copy.copy(dataset)
+        dataset.augmentations = None
+    return dataset
+
+# Cell
+def build_inference_loader(
+    dataset: Dataset,
+    batch_size: int = 64,
+    num_workers: int = 0,
+    mode: str = "process",
+    num_threads: int = 8,
+    pin_memory: bool = False,
+) -> DataLoader:
+    """
+    Builds a `DataLoader` which decodes the Images of `dataset` in `num_workers` worker
+    processes, or in `num_threads` threads if `mode` is `thread`, and keeps the order.
+    Datasets which fetch whole batches (`batched = True`) are passed batches of indices.
+    """
+    assert mode in ("process", "thread"), f"Unknown dataloader mode: {mode}"
+    if getattr(dataset, "batched", False):
+        sampler = BatchSampler(SequentialSampler(dataset), batch_size, drop_last=False)
+        kwargs = dict(sampler=sampler, batch_size=None)
+    else:
+        kwargs = dict(batch_size=batch_size)
+
+    if mode == "thread":
+        return ThreadDataLoader(
+            dataset, num_threads=num_threads, pin_memory=pin_memory, **kwargs
+        )
+    return DataLoader(
+        dataset,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        worker_init_fn=worker_init_fn if num_workers > 0 else None,
+        **kwargs,
+    )
+
+# Cell
+def _inference_mode():
+    # `torch.inference_mode` is only available in torch>=1.9
+    if hasattr(torch, "inference_mode"):
+        return torch.inference_mode()
+    return torch.no_grad()
+
+# Cell
+@contextlib.contextmanager
+def _capture_embeddings(model: nn.Module):
+    # captures the inputs of the last linear layer, i.e the features fed to the classifier
+    linears = [m for m in model.modules() if isinstance(m, nn.Linear)]
+    assert linears, "The model has no linear layer to take the embeddings from"
+    captured = []
+    handle = linears[-1].register_forward_hook(
+        lambda module, inputs, output: captured.append(inputs[0])
+    )
+    try:
+        yield captured
+    finally:
+        handle.remove()
+
+# Cell
+def iter_predictions(
+    model: nn.Module,
+    loader: Iterable,
+    output: str = "logits",
+    topk: int = 5,
+    device: Optional[Union[str, torch.device]] = None,
+) -> Iterator[Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Runs `model` in eval mode under `torch.inference_mode` on the batches of `loader` and
+    yields the `output` of every batch as NumPy arrays:
+    1. `logits`: the outputs of the model.
+    2. `probs`: the softmax of the logits.
+    3. `topk`: a tuple with the `topk` highest probabilities and their class indices.
+    4. `embeddings`: the features fed to the last linear layer of the model.
+    """
+    assert output in _OUTPUTS, f"output must be one of {_OUTPUTS}"
+    device = torch.device(ifnone(device, next(model.parameters()).device))
+    is_training = model.training
+    model.eval()
+    hook = (
+        _capture_embeddings(model)
+        if output == "embeddings"
+        else contextlib.nullcontext()
+    )
+    try:
+        with _inference_mode(), hook as captured:
+            for batch in loader:
+                if isinstance(batch, (tuple, list)):
+                    batch = batch[0]
+                logits = model(batch.to(device, non_blocking=True))
+                if output == "logits":
+                    yield logits.float().cpu().numpy()
+                elif output == "probs":
+                    yield F.softmax(logits.float(), dim=1).cpu().numpy()
+                elif output == "topk":
+                    probs = F.softmax(logits.float(), dim=1)
+                    values, indices = probs.topk(min(topk, probs.shape[1]), dim=1)
+                    yield values.cpu().numpy(), indices.cpu().numpy()
+                else:
+                    embeddings = captured.pop().flatten(1)
+                    captured.clear()
+                    yield embeddings.float().cpu().numpy()
+    finally:
+        model.train(is_training)
+
+# Cell
+def predict_loader(
+    model: nn.Module,
+    loader: Iterable,
+    output: str = "logits",
+    topk: int = 5,
+    device: Optional[Union[str, torch.device]] = None,
+) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Same as `iter_predictions` but returns the outputs of all the batches. The outputs are
+    written into arrays allocated once from the length of the dataset of `loader`, so only
+    the outputs (not the inputs) are kept in memory.
+    """
+    num_samples = len(loader.dataset)
+    results, start = None, 0
+    for preds in iter_predictions(model, loader, output, topk, device):
+        preds = preds if isinstance(preds, tuple) else (preds,)
+        if results is None:
+            results = [np.empty((num_samples, *p.shape[1:]), p.dtype) for p in preds]
+        for result, p in zip(results, preds):
+            result[start : start + len(p)] = p
+        start += len(preds[0])
+
+    if results is None:
+        return np.empty((0,), dtype=np.float32)
+    return tuple(results) if output == "topk" else results[0]
\ No newline at end of file
@@ -0,0 +1,361 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05g_classification.loaders.ipynb (unless otherwise specified).
+
+__all__ = ['ThreadDataLoader', 'TaggedConcatDataset', 'MultiDatasetLoader', 'benchmark_loader', 'compare_loader_modes']
+
+# Cell
+import bisect
+import collections
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+
+import numpy as np
+import torch
+from fastcore.all import ifnone
+from omegaconf import DictConfig, OmegaConf
+from torch.utils.data import DataLoader, Dataset, Sampler
+from torch.utils.data.dataloader import default_collate
+from torch.utils.data._utils.pin_memory import pin_memory
+
+_logger = logging.getLogger(__name__)
+
+# Cell
+class _Gate:
+    "A semaphore whose limit can be changed while it is in use"
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._running = 0
+        self._cond = threading.Condition()
+
+    def set_limit(self, limit: int):
+        with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+    def __enter__(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._running < self.limit)
+            self._running += 1
+
+    def __exit__(self, *args):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify()
+
+# Cell
+class ThreadDataLoader(DataLoader):
+    """
+    A `DataLoader` which loads the batches in a pool of `num_threads` threads. Every thread
+    loads & collates a whole batch, at most `prefetch_factor * num_threads` batches are in
+    flight. Batches are returned in the order of the sampler.
+
+    If `min_threads` or `max_threads` are given the number of threads is adapted at runtime
+    within these bounds: every `adapt_every` batches, a thread is added if the training step
+    waited on average more than `wait_threshold` seconds for a batch, and a thread is removed
+    if most of the batches in flight were already loaded, i.e the threads are ahead of the
+    training step. Every scaling decision is logged and recorded in `scaling_history`.
+
+    All the other arguments are the same as `DataLoader`, `num_workers` must be 0.
+    If `num_threads` is 0 the batches are loaded in the main thread.
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        num_threads: int = 8,
+        prefetch_factor: int = 2,
+        min_threads: Optional[int] = None,
+        max_threads: Optional[int] = None,
+        adapt_every: int = 20,
+        wait_threshold: float = 0.005,
+        **kwargs,
+    ):
+        assert kwargs.get("num_workers", 0) == 0, "num_workers must be 0"
+        kwargs.pop("worker_init_fn", None)
+        super().__init__(dataset, **kwargs)
+        self.num_threads = num_threads
+        # `prefetch_factor` of the DataLoader is only used with worker processes
+        self.prefetch_factor = max(1, prefetch_factor)
+        self.min_threads = max(1, ifnone(min_threads, num_threads))
+        self.max_threads = max(num_threads, ifnone(max_threads, num_threads))
+        self.adapt_every = adapt_every
+        self.wait_threshold = wait_threshold
+        self.scaling_history = []
+
+    @property
+    def adaptive(self) -> bool:
+        return self.min_threads < self.max_threads
+
+    def _fetch(self, indices):
+        if self._auto_collation:
+            if hasattr(self.dataset, "__getitems__"):
+                data = self.dataset.__getitems__(indices)
+            else:
+                data = [self.dataset[i] for i in indices]
+        else:
+            data = self.dataset[indices]
+        data = self.collate_fn(data)
+        if self.pin_memory and torch.cuda.is_available():
+            data = pin_memory(data)
+        return data
+
+    def __iter__(self):
+        if self.num_threads == 0:
+            return super().__iter__()
+        return self._thread_iter()
+
+    def _adapt(self, gate: _Gate, step: int, waits: List[float], ready: List[int]):
+        "Grows or shrinks the number of threads based on the recent waits & ready batches"
+        mean_wait, mean_ready = np.mean(waits), np.mean(ready)
+        threads = gate.limit
+        if mean_wait > self.wait_threshold and threads < self.max_threads:
+            threads += 1
+            reason = f"waited {mean_wait * 1000:.1f}ms per batch"
+        elif (
+            mean_wait < self.wait_threshold / 10
+            and mean_ready >= 0.75 * self.prefetch_factor * threads
+            and threads > self.min_threads
+        ):
+            threads -= 1
+            reason = f"{mean_ready:.1f} batches ready on average"
+        else:
+            return
+
+        _logger.info(
+            "Scaling loader threads {} -> {} at batch {}: {}".format(
+                gate.limit, threads, step, reason
+            )
+        )
+        self.scaling_history.append(
+            dict(step=step, old=gate.limit, new=threads, reason=reason)
+        )
+        gate.set_limit(threads)
+
+    def _thread_iter(self):
+        indices = iter(self._index_sampler)
+        gate = _Gate(self.num_threads)
+
+        def _run(index):
+            with gate:
+                return self._fetch(index)
+
+        def _fill(futures):
+            # keep `prefetch_factor` batches in flight for every active thread
+            n = self.prefetch_factor * gate.limit - len(futures)
+            for i in itertools.islice(indices, max(n, 0)):
+                futures.append(pool.submit(_run, i))
+
+        waits, ready = [], []
+        with ThreadPoolExecutor(self.max_threads) as pool:
+            futures = collections.deque()
+            _fill(futures)
+            try:
+                step = 0
+                while futures:
+                    ready.append(sum(f.done() for f in futures))
+                    tick = time.perf_counter()
+                    batch = futures.popleft().result()
+                    waits.append(time.perf_counter() - tick)
+
+                    step += 1
+                    if self.adaptive and step % self.adapt_every == 0:
+                        self._adapt(gate, step, waits, ready)
+                        waits, ready = [], []
+                    _fill(futures)
+                    yield batch
+            finally:
+                # the iterator may be abandoned mid-epoch, e.g. by `limit_train_batches`
+                for future in futures:
+                    future.cancel()
+                gate.set_limit(self.max_threads)
+
+# Cell
+class _PerDatasetBatchSampler(Sampler):
+    """
+    Yields batches of indices of a `TaggedConcatDataset` in order, a batch never contains
+    indices of two datasets. Starts at the dataset `start`.
+    """
+
+    def __init__(self, lengths: Sequence[int], batch_size: int, drop_last: bool):
+        self.lengths, self.batch_size, self.drop_last = lengths, batch_size, drop_last
+        self.offsets = np.cumsum([0] + list(lengths[:-1])).tolist()
+        self.start = 0
+
+    def num_batches(self, dataset_idx: int) -> int:
+        n = self.lengths[dataset_idx]
+        if self.drop_last:
+            return n // self.batch_size
+        return (n + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        for k in range(self.start, len(self.lengths)):
+            offset = self.offsets[k]
+            for b in range(self.num_batches(k)):
+                lo = offset + b * self.batch_size
+                yield list(
+                    range(lo, min(lo + self.batch_size, offset + self.lengths[k]))
+                )
+
+    def __len__(self):
+        return sum(self.num_batches(k) for k in range(self.start, len(self.lengths)))
+
+# Cell
+class TaggedConcatDataset(Dataset):
+    """
+    Concatenates `datasets`, this dataset is indexed with a batch of indices which all belong to
+    the same dataset and returns `(dataset_idx, batch)`, where the `batch` is collated with
+    `collate_fn`. Use with `batch_sampler` & `batch_size=None`, see `MultiDatasetLoader`.
+    """
+
+    def __init__(
+        self, datasets: Sequence[Dataset], collate_fn: Optional[Callable] = None
+    ):
+        self.datasets = list(datasets)
+        self.collate_fn = ifnone(collate_fn, default_collate)
+        self.lengths = [len(d) for d in self.datasets]
+        self.offsets = np.cumsum([0] + self.lengths[:-1]).tolist()
+
+    def __len__(self):
+        return sum(self.lengths)
+
+    def batch_sampler(self, batch_size: int, drop_last: bool = False):
+        return _PerDatasetBatchSampler(self.lengths, batch_size, drop_last)
+
+    def __getitem__(self, indices: Sequence[int]):
+        dataset_idx = bisect.bisect_right(self.offsets, indices[0]) - 1
+        dataset = self.datasets[dataset_idx]
+        indices = [i - self.offsets[dataset_idx] for i in indices]
+        if getattr(dataset, "batched", False):
+            batch = dataset[indices]
+        else:
+            batch = self.collate_fn([dataset[i] for i in indices])
+        return dataset_idx, batch
+
+# Cell
+class _DatasetLoaderView:
+    "The batches of a single dataset of a `MultiDatasetLoader`"
+
+    def __init__(self, parent: "MultiDatasetLoader", dataset_idx: int):
+        self.parent, self.dataset_idx = parent, dataset_idx
+        self.dataset = parent.dataset.datasets[dataset_idx]
+
+    def __len__(self):
+        return self.parent.sampler.num_batches(self.dataset_idx)
+
+    def __iter__(self):
+        return self.parent._iter_dataset(self.dataset_idx)
+
+# Cell
+class MultiDatasetLoader:
+    """
+    Serves all the datasets of a `TaggedConcatDataset` from the single pool of workers (or
+    threads) of `loader`. Iterating over this loader returns `(dataset_idx, batch)` with the
+    datasets in order.
+
+    `dataloaders` holds a loader for each dataset, these can be returned by
+    `val_dataloader` / `test_dataloader` of Lightning which iterates over them one after
+    the other. All of them consume the same iterator of `loader`, so the batches of the next
+    dataset are being loaded while the current dataset is evaluated.
+    """
+
+    def __init__(self, loader: DataLoader):
+        assert isinstance(loader.dataset, TaggedConcatDataset)
+        self.loader, self.dataset, self.sampler = loader, loader.dataset, loader.sampler
+        self.dataloaders = [
+            _DatasetLoaderView(self, i) for i in range(len(self.dataset.datasets))
+        ]
+        self._it, self._lookahead = None, None
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        self.sampler.start = 0
+        return iter(self.loader)
+
+    def _iter_dataset(self, dataset_idx: int):
+        # reuse the running iterator only if it is positioned at the start of the dataset,
+        # else start a new one from the dataset, e.g. when a dataset was not fully consumed
+        at_start = self._lookahead is not None and self._lookahead[0] == dataset_idx
+        if not at_start:
+            self.sampler.start = dataset_idx
+            self._it, self._lookahead = iter(self.loader), None
+
+        while True:
+            if self._lookahead is not None:
+                item, self._lookahead = self._lookahead, None
+            else:
+                item = next(self._it, None)
+            if item is None:
+                self._it = None
+                return
+            if item[0] != dataset_idx:
+                self._lookahead = item
+                return
+            yield item[1]
+
+# Cell
+def benchmark_loader(
+    loader: Iterable, num_batches: Optional[int] = None, warmup: int = 2
+) -> Dict[str, float]:
+    """
+    Iterates over `num_batches` batches of `loader` (the whole `loader` if `None`) after
+    `warmup` batches and returns the throughput in `batches/s` & `images/s`, and the time
+    taken by the `warmup` batches, including starting the workers, in seconds (`startup`).
+    """
+    start = time.perf_counter()
+    it = iter(loader)
+    for _ in itertools.islice(it, max(warmup, 1)):
+        pass
+    startup = time.perf_counter() - start
+
+    num_batches_seen, num_images = 0, 0
+    tick = time.perf_counter()
+    for images, _ in itertools.islice(it, num_batches):
+        num_batches_seen += 1
+        num_images += len(images)
+    elapsed = time.perf_counter() - tick
+    del it
+
+    assert num_batches_seen > 0, "loader has too few batches for the benchmark"
+    return {
+        "batches/s": num_batches_seen / elapsed,
+        "images/s": num_images / elapsed,
+        "startup": startup,
+    }
+
+# Cell
+def compare_loader_modes(
+    name: str,
+    config: DictConfig,
+    num_workers: Sequence[int] = (4,),
+    num_threads: Sequence[int] = (4, 8),
+    num_batches: Optional[int] = 50,
+):
+    """
+    Benchmarks the loaders of the dataset registered as `name` in DatasetCatalog built from
+    the dataloader `config` with each of `num_workers` worker processes & each of `num_threads`
+    threads, see `benchmark_loader`. The results are logged and returned as a list of dicts.
+    """
+    from .data import build_classification_loader_from_config
+
+    results = []
+    runs = [("process", n) for n in num_workers] + [("thread", n) for n in num_threads]
+    for mode, n in runs:
+        conf = OmegaConf.to_container(config, resolve=True)
+        conf["mode"] = mode
+        conf["num_workers" if mode == "process" else "num_threads"] = n
+        loader = build_classification_loader_from_config(name, OmegaConf.create(conf))
+        stats = benchmark_loader(loader, num_batches=num_batches)
+        stats.update(mode=mode, workers=n)
+        _logger.info(
+            "{} x {}: {:.1f} images/s, {:.2f} batches/s, startup {:.2f}s".format(
+                mode, n, stats["images/s"], stats["batches/s"], stats["startup"]
+            )
+        )
+        results.append(stats)
+    return results
\ No newline at end of file
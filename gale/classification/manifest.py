@@ -0,0 +1,181 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05e_classification.manifest.ipynb (unless otherwise specified).
+
+__all__ = ['read_image_header', 'build_image_manifest', 'save_manifest', 'load_manifest', 'filter_parser']
+
+# Cell
+import copy
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+
+import pandas as pd
+from fastcore.all import Path, ifnone
+from PIL import Image
+from timm.data.parsers.parser import Parser
+
+from .core import PandasParser
+
+_logger = logging.getLogger(__name__)
+
+_CHECKS = ("header", "verify", "decode")
+
+# Cell
+def read_image_header(path: str, check: str = "header") -> Dict:
+    """
+    Reads the header of the Image at `path` and returns its `format`, `width`, `height`,
+    `channels` and `num_bytes`. `check` controls how thoroughly the Image is validated:
+    1. `header`: only the header is parsed, this is the fastest.
+    2. `verify`: `PIL.Image.verify` is run, which checks the file for corruption without
+    decoding the Image.
+    3. `decode`: the whole Image is decoded, this also catches truncated Images.
+
+    Undecodable Images are flagged with `valid=False` and the error message in `error`.
+    """
+    assert check in _CHECKS, f"check must be one of {_CHECKS}"
+    record = dict(
+        file_name=str(path),
+        format=None,
+        width=-1,
+        height=-1,
+        channels=-1,
+        num_bytes=-1,
+        valid=False,
+        error=None,
+    )
+    try:
+        record["num_bytes"] = os.path.getsize(path)
+        with Image.open(path) as im:
+            record["format"] = im.format
+            record["width"], record["height"] = im.size
+            record["channels"] = len(im.getbands())
+            if check == "verify":
+                im.verify()
+            elif check == "decode":
+                im.load()
+        record["valid"] = True
+    except Exception as e:
+        record["error"] = f"{e.__class__.__name__}: {e}"
+    return record
+
+# Cell
+def _read_headers(paths: List[str], check: str) -> List[Dict]:
+    return [read_image_header(p, check) for p in paths]
+
+# Cell
+def build_image_manifest(
+    parser: Union[Parser, Sequence[str]],
+    num_workers: Optional[int] = None,
+    check: str = "header",
+    chunksize: int = 256,
+) -> pd.DataFrame:
+    """
+    Reads the headers of all the Images in `parser` (a `PandasParser`, `FolderParser` or a list
+    of paths) in parallel across `num_workers` processes, see `read_image_header`.
+
+    Returns a `DataFrame` with a row per Image in the same order as `parser`, with the columns
+    `file_name`, `target`, `format`, `width`, `height`, `channels`, `num_bytes`, `valid`, `error`.
+    """
+    if isinstance(parser, Parser):
+        paths = [str(p) for p, _ in parser.samples]
+        targets = [t for _, t in parser.samples]
+    else:
+        paths = [str(p) for p in parser]
+        targets = None
+
+    num_workers = ifnone(num_workers, os.cpu_count())
+    chunks = [paths[i : i + chunksize] for i in range(0, len(paths), chunksize)]
+
+    records = []
+    if num_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(num_workers) as pool:
+            for chunk in pool.map(_read_headers, chunks, [check] * len(chunks)):
+                records.extend(chunk)
+    else:
+        for chunk in chunks:
+            records.extend(_read_headers(chunk, check))
+
+    manifest = pd.DataFrame.from_records(
+        records,
+        columns=[
+            "file_name",
+            "format",
+            "width",
+            "height",
+            "channels",
+            "num_bytes",
+            "valid",
+            "error",
+        ],
+    )
+    if targets is not None:
+        manifest.insert(1, "target", targets)
+
+    num_invalid = int((~manifest["valid"]).sum())
+    _logger.info(
+        "Read headers of {} Images, found {} undecodable Images.".format(
+            len(manifest), num_invalid
+        )
+    )
+    return manifest
+
+# Cell
+def save_manifest(manifest: pd.DataFrame, path: Union[str, Path]):
+    """
+    Saves the `manifest` to `path`. The file format is inferred from the extension of `path`,
+    `.parquet` (columnar, needs `pyarrow` or `fastparquet`) or `.csv`.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        manifest.to_parquet(path, index=False)
+    elif path.suffix == ".csv":
+        manifest.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unsupported manifest format: {path.suffix}")
+    _logger.info("Manifest saved to {}".format(path))
+
+# Cell
+def load_manifest(path: Union[str, Path]) -> pd.DataFrame:
+    "Loads a manifest saved with `save_manifest`"
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    elif path.suffix == ".csv":
+        return pd.read_csv(path)
+    else:
+        raise ValueError(f"Unsupported manifest format: {path.suffix}")
+
+# Cell
+def filter_parser(
+    parser: Parser,
+    manifest: pd.DataFrame,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> Parser:
+    """
+    Returns a copy of `parser` without the Images which are flagged invalid in `manifest`.
+    Optionally also drops the Images whose shorter side is smaller than `min_size` or whose
+    longer side is larger than `max_size`. A `PandasParser` is rebuilt from the filtered rows
+    of its dataframe.
+    """
+    keep = manifest["valid"].astype(bool)
+    short_side = manifest[["width", "height"]].min(axis=1)
+    long_side = manifest[["width", "height"]].max(axis=1)
+    if min_size is not None:
+        keep &= short_side >= min_size
+    if max_size is not None:
+        keep &= long_side <= max_size
+
+    keep = dict(zip(manifest["file_name"].astype(str), keep))
+    mask = [keep.get(str(s[0]), False) for s in parser.samples]
+
+    _logger.info(
+        "Dropped {} of {} Images.".format(mask.count(False), len(parser.samples))
+    )
+    if isinstance(parser, PandasParser):
+        df = parser.df[mask].reset_index(drop=True)
+        return PandasParser(df, parser.path_column, parser.label_column)
+
+    parser = copy.copy(parser)
+    parser.samples = [s for s, k in zip(parser.samples, mask) if k]
+    return parser
\ No newline at end of file
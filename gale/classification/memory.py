@@ -0,0 +1,201 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05f_classification.memory.ipynb (unless otherwise specified).
+
+__all__ = ['BatchRandomHorizontalFlip', 'BatchRandomCrop', 'InMemoryClassificationDataset']
+
+# Cell
+import logging
+from typing import *
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from fastcore.all import store_attr
+from PIL import Image
+from timm.data.constants import IMAGENET_DEFAULT_MEAN, IMAGENET_DEFAULT_STD
+from torch.utils.data import Dataset
+
+from .core import match_channels
+
+_logger = logging.getLogger(__name__)
+
+# Cell
+class BatchRandomHorizontalFlip:
+    "Flips each Image in a `(N, C, H, W)` batch horizontally with probability `p`"
+
+    def __init__(self, p: float = 0.5):
+        self.p = p
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        flip = torch.rand(images.shape[0]) < self.p
+        if flip.any():
+            images = images.clone()
+            images[flip] = images[flip].flip(-1)
+        return images
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(p={self.p})"
+
+# Cell
+class BatchRandomCrop:
+    """
+    Crops a random `size` patch from each Image in a `(N, C, H, W)` batch, after zero padding
+    the Images by `padding` pixels on each side, e.g. the standard CIFAR augmentation is
+    `BatchRandomCrop(32, padding=4)`. The crop offset is sampled for each Image independently.
+    """
+
+    def __init__(self, size: Union[int, Tuple[int, int]], padding: int = 0):
+        self.size = (size, size) if isinstance(size, int) else tuple(size)
+        self.padding = padding
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        if self.padding > 0:
+            images = F.pad(images, [self.padding] * 4)
+        n, _, h, w = images.shape
+        th, tw = self.size
+        assert h >= th and w >= tw, "crop size is larger than the padded Images"
+
+        ys = torch.randint(0, h - th + 1, (n, 1, 1))
+        xs = torch.randint(0, w - tw + 1, (n, 1, 1))
+        # gather the crops of all the Images with a single advanced index
+        rows = (ys + torch.arange(th).view(1, th, 1)).expand(n, th, tw)
+        cols = (xs + torch.arange(tw).view(1, 1, tw)).expand(n, th, tw)
+        batch = torch.arange(n).view(n, 1, 1).expand(n, th, tw)
+        return images.permute(0, 2, 3, 1)[batch, rows, cols].permute(0, 3, 1, 2)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(size={self.size}, padding={self.padding})"
+
+# Cell
+def _to_uint8_nchw(data) -> torch.Tensor:
+    data = torch.as_tensor(np.asarray(data))
+    assert data.dtype == torch.uint8, f"Expected uint8 Images, got {data.dtype}"
+    if data.ndim == 3:
+        # grayscale Images stored as (N, H, W)
+        return data.unsqueeze(1)
+    # Images stored as (N, H, W, C)
+    return data.permute(0, 3, 1, 2)
+
+# Cell
+def _match_image_channels(images: torch.Tensor, channels: int) -> torch.Tensor:
+    if images.shape[1] == channels:
+        return images
+    if channels == 1 and images.shape[1] == 3:
+        # same luma transform as used by PIL for RGB -> L conversion
+        weights = torch.tensor([0.299, 0.587, 0.114]).view(1, 3, 1, 1)
+        return (images.float() * weights).sum(1, keepdim=True).round().to(torch.uint8)
+    if images.shape[1] == 1:
+        return images.expand(-1, channels, -1, -1)
+    raise ValueError(f"Can not convert {images.shape[1]} channels to {channels}")
+
+# Cell
+class InMemoryClassificationDataset(Dataset):
+    """
+    Holds all the Images of a dataset as a contiguous uint8 tensor of shape `(N, C, H, W)` and
+    the targets as a long tensor of shape `(N,)`.
+
+    A batch is fetched with a list of indices (`__getitems__`, or `__getitem__` with a list of
+    indices) as a single tensor index, followed by the `augmentations` applied to the whole
+    uint8 batch and normalization. Use this dataset with a `BatchSampler` and `batch_size=None`,
+    `build_classification_loader_from_config` does this automatically.
+
+    All the Images must have the same size.
+    """
+
+    # lets the loaders know that this dataset fetches whole batches at once
+    batched = True
+
+    def __init__(
+        self,
+        images: torch.Tensor,
+        targets: torch.Tensor,
+        augmentations: Optional[Callable] = None,
+        mean: Sequence[float] = IMAGENET_DEFAULT_MEAN,
+        std: Sequence[float] = IMAGENET_DEFAULT_STD,
+        channels: Optional[int] = None,
+    ):
+        """
+        Arguments:
+        1. `images`: uint8 tensor of shape `(N, C, H, W)`.
+        2. `targets`: integer targets of shape `(N,)`.
+        3. `augmentations`: a callable applied to a uint8 batch of shape `(B, C, H, W)`, e.g.
+        `T.Compose([BatchRandomCrop(32, padding=4), BatchRandomHorizontalFlip()])`.
+        4. `mean`, `std`: per-channel mean and std used to normalize the Images. These should be
+        normalized values.
+        5. `channels`: number of channels of the returned Images, the stored Images are converted
+        if required. Defaults to the number of channels of `images`.
+        """
+        assert images.ndim == 4, "images must be of shape (N, C, H, W)"
+        assert images.dtype == torch.uint8, "images must be uint8"
+        assert len(images) == len(targets), "images & targets must be of same length"
+        channels = channels or images.shape[1]
+        images = _match_image_channels(images, channels).contiguous()
+        targets = torch.as_tensor(targets, dtype=torch.long)
+        store_attr("images, targets, augmentations, channels")
+        self.set_stats(mean, std)
+        self.memory_format = "contiguous"
+
+    def set_stats(self, mean: Sequence[float], std: Sequence[float]):
+        "Sets the `mean` & `std` used to normalize the Images"
+        self.mean = torch.tensor(match_channels(mean, self.channels)).view(1, -1, 1, 1)
+        self.std = torch.tensor(match_channels(std, self.channels)).view(1, -1, 1, 1)
+
+    def set_memory_format(self, memory_format: str):
+        """
+        Sets the memory format of the batches, `contiguous` or `channels_last`. The layout is
+        converted by the copy which converts the uint8 Images to float.
+        """
+        assert memory_format in ("contiguous", "channels_last")
+        self.memory_format = memory_format
+
+    @classmethod
+    def from_dataset(cls, dataset: Dataset, **kwargs):
+        """
+        Materializes a torchvision dataset in memory. Datasets which store their Images in
+        a `data` attribute, like CIFAR & MNIST, are converted without decoding the Images one by
+        one, for other datasets every sample must be a `(PIL Image or array, target)` tuple.
+        """
+        data = getattr(dataset, "data", None)
+        targets = getattr(dataset, "targets", None)
+        if data is not None and targets is not None:
+            images = _to_uint8_nchw(data)
+        else:
+            samples, targets = [], []
+            for image, target in dataset:
+                if isinstance(image, Image.Image) and image.mode not in ("L", "RGB"):
+                    image = image.convert("RGB")
+                samples.append(np.asarray(image))
+                targets.append(target)
+            images = _to_uint8_nchw(np.stack(samples))
+
+        _logger.info(
+            "Loaded {} Images of shape {} in memory ({:.1f} MB)".format(
+                len(images),
+                tuple(images.shape[1:]),
+                images.numel() * images.element_size() / 2**20,
+            )
+        )
+        return cls(images, torch.as_tensor(targets), **kwargs)
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitems__(self, indices: Sequence[int]) -> Tuple[torch.Tensor, torch.Tensor]:
+        "Returns the batch of normalized Images & targets at `indices`"
+        indices = torch.as_tensor(indices, dtype=torch.long)
+        images = self.images[indices]
+        if self.augmentations is not None:
+            images = self.augmentations(images)
+        memory_format = (
+            torch.channels_last
+            if self.memory_format == "channels_last"
+            else torch.contiguous_format
+        )
+        images = images.to(torch.float32, memory_format=memory_format).div_(255)
+        images = (images - self.mean) / self.std
+        return images, self.targets[indices]
+
+    def __getitem__(self, index):
+        if isinstance(index, (list, tuple, torch.Tensor, np.ndarray)):
+            return self.__getitems__(index)
+        images, targets = self.__getitems__([index])
+        return images[0], targets[0]
\ No newline at end of file
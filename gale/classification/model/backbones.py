@@ -19,7 +19,7 @@ from timm.models import ResNet
 from torch import nn
 
 from ...core_classes import BasicModule
-from ...torch_utils import build_discriminative_lrs, set_bn_eval, trainable_params
+from ...torch_utils import build_discriminative_lrs, fuse_conv_bn, set_bn_eval, trainable_params
 from ...utils.activs import ACTIVATION_REGISTRY
 from ...utils.shape_spec import ShapeSpec
 from ...utils.structures import IMAGE_CLASSIFIER_BACKBONES
@@ -321,6 +321,21 @@ class ResNetBackbone(ImageClassificationBackbone):
         if self.freeze_bn:
             set_bn_eval(m)
 
+    def _fuse_modules(self) -> None:
+        stem = self.resnet[0]
+        if isinstance(stem[0], nn.Sequential) and type(stem[1]) == nn.BatchNorm2d:
+            # deep stems end with a conv
+            stem[0][-1], stem[1] = fuse_conv_bn(stem[0][-1], stem[1]), nn.Identity()
+
+        # the convs & bns of the timm blocks are attributes, e.g. `conv1` -> `bn1`
+        for block in self.resnet[1].modules():
+            for idx in range(1, 4):
+                conv = getattr(block, f"conv{idx}", None)
+                bn = getattr(block, f"bn{idx}", None)
+                if isinstance(conv, nn.Conv2d) and type(bn) == nn.BatchNorm2d:
+                    setattr(block, f"conv{idx}", fuse_conv_bn(conv, bn))
+                    setattr(block, f"bn{idx}", nn.Identity())
+
     def output_shape(self) -> ShapeSpec:
         return ShapeSpec(self.num_features, None, None)
 
@@ -0,0 +1,221 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/06d_classification.quantization.ipynb (unless otherwise specified).
+
+__all__ = ['quantize_model', 'evaluate_quantization', 'save_quantized_model', 'load_quantized_model']
+
+# Cell
+import copy
+import inspect
+import io
+import logging
+from typing import *
+
+import torch
+from fastcore.all import Path
+from torch import nn
+
+from ..runtime import benchmark_latency
+from .core import ClassificationMapper
+from .export import export_model
+from .inference import _inference_mode, build_inference_loader, eval_dataset
+from .model.backbones import ResNetBackbone
+from .model.heads import FastaiHead, FullyConnectedHead
+
+_logger = logging.getLogger(__name__)
+
+# Cell
+def _default_engine() -> str:
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized engine is available in this build of torch")
+
+# Cell
+def _quantize_heads(model: nn.Module) -> int:
+    # dynamic quantization of the linear layers of the head, returns the number of heads
+    from torch.quantization import quantize_dynamic
+
+    num_heads = 0
+    for name, module in model.named_children():
+        if isinstance(module, (FastaiHead, FullyConnectedHead)):
+            quantized = quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+            setattr(model, name, quantized)
+            num_heads += 1
+    return num_heads
+
+# Cell
+def _prepare_backbone(
+    backbone: ResNetBackbone, engine: str, example: torch.Tensor
+) -> nn.Module:
+    # returns a `GraphModule` of the backbone with observers, conv, bn & act are fused
+    from torch.quantization.quantize_fx import prepare_fx
+
+    try:
+        from torch.ao.quantization import get_default_qconfig_mapping
+
+        qconfig = get_default_qconfig_mapping(engine)
+    except ImportError:
+        qconfig = {"": torch.quantization.get_default_qconfig(engine)}
+
+    kwargs = {}
+    if "example_inputs" in inspect.signature(prepare_fx).parameters:
+        kwargs["example_inputs"] = (example,)
+    return prepare_fx(backbone, qconfig, **kwargs)
+
+# Cell
+def quantize_model(
+    model: nn.Module,
+    calibration_dataset: Optional[Union[str, Sequence[str], torch.utils.data.Dataset]],
+    mapper: Optional[ClassificationMapper] = None,
+    num_calibration_batches: int = 10,
+    batch_size: int = 32,
+    num_workers: int = 0,
+    engine: Optional[str] = None,
+) -> nn.Module:
+    """
+    Returns an int8 copy of `model` (a `GeneralizedImageClassifier`) for CPU inference:
+    1. The `nn.Linear` layers of a `FastaiHead` or `FullyConnectedHead` are quantized
+       dynamically, the activations are quantized on the fly.
+    2. A `ResNetBackbone` is quantized statically with FX graph mode: conv, bn & act are
+       fused and the scales of the activations are calibrated by running the model on
+       `num_calibration_batches` batches of `calibration_dataset` (the name of a dataset
+       registered in DatasetCatalog, file paths or a dataset) mapped with the deterministic
+       eval `mapper`.
+
+    Other backbones are kept in fp32. `engine` defaults to the first available of `x86`,
+    `fbgemm` & `qnnpack`. The quantized model takes the same inputs as `model`, its
+    quantized backbone is a `GraphModule`.
+    """
+    engine = engine or _default_engine()
+    torch.backends.quantized.engine = engine
+    model = copy.deepcopy(model).cpu().eval()
+
+    backbone = getattr(model, "backbone", None)
+    if isinstance(backbone, ResNetBackbone):
+        assert (
+            calibration_dataset is not None and mapper is not None
+        ), "A calibration dataset & a mapper are required to quantize a ResNetBackbone"
+        dataset = eval_dataset(calibration_dataset, mapper)
+        loader = build_inference_loader(dataset, batch_size, num_workers)
+
+        example = torch.rand(1, *dataset[0][0].shape)
+        model.backbone = _prepare_backbone(backbone, engine, example)
+        num_images = 0
+        with torch.no_grad():
+            for batch_idx, (images, _) in enumerate(loader):
+                if batch_idx >= num_calibration_batches:
+                    break
+                model(images)
+                num_images += len(images)
+        _logger.info("Calibrated the observers on {} Images".format(num_images))
+
+        from torch.quantization.quantize_fx import convert_fx
+
+        model.backbone = convert_fx(model.backbone)
+    else:
+        _logger.warning(
+            "Static quantization is only supported for `ResNetBackbone`, "
+            "the backbone is kept in fp32"
+        )
+
+    if not _quantize_heads(model):
+        _logger.warning("The model has no head which supports dynamic quantization")
+    return model
+
+# Cell
+def _model_size(model: nn.Module) -> int:
+    # size of the serialized weights in bytes
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+# Cell
+def _accuracy(model: nn.Module, loader: Iterable) -> float:
+    correct, total = 0, 0
+    with _inference_mode():
+        for images, targets in loader:
+            preds = model(images).argmax(1)
+            correct += (preds == targets).sum().item()
+            total += len(targets)
+    return correct / max(total, 1)
+
+# Cell
+def evaluate_quantization(
+    model: nn.Module,
+    quantized_model: nn.Module,
+    dataset: Union[str, torch.utils.data.Dataset],
+    mapper: ClassificationMapper,
+    batch_size: int = 32,
+    num_workers: int = 0,
+    latency_batch_sizes: Sequence[int] = (1, 8),
+    num_iters: int = 20,
+) -> Dict:
+    """
+    Compares the fp32 `model` with its `quantized_model` on CPU: the top-1 accuracy on
+    `dataset` (the name of a dataset registered in DatasetCatalog or a dataset) mapped with
+    `mapper`, the latency of `latency_batch_sizes` (see `gale.runtime.benchmark_latency`) and
+    the size of the weights.
+    """
+    model = model.cpu().eval()
+    loader = build_inference_loader(
+        eval_dataset(dataset, mapper), batch_size, num_workers
+    )
+    input_shape = tuple(loader.dataset[0][0].shape)
+
+    report = {}
+    for name, m in (("fp32", model), ("int8", quantized_model)):
+
+        def _forward(x, m=m):
+            with _inference_mode():
+                return m(torch.from_numpy(x))
+
+        report[name] = dict(
+            accuracy=_accuracy(m, loader),
+            latency=benchmark_latency(
+                _forward, input_shape, latency_batch_sizes, num_iters
+            ),
+            size_mb=_model_size(m) / 2**20,
+        )
+
+    report["accuracy_delta"] = report["int8"]["accuracy"] - report["fp32"]["accuracy"]
+    report["size_reduction"] = report["fp32"]["size_mb"] / report["int8"]["size_mb"]
+    report["speedup"] = {
+        bs: report["fp32"]["latency"][bs]["p50_ms"]
+        / report["int8"]["latency"][bs]["p50_ms"]
+        for bs in latency_batch_sizes
+    }
+    _logger.info(
+        "int8: accuracy {:.4f} ({:+.4f}), {:.1f} MB ({:.1f}x smaller), speedup {}".format(
+            report["int8"]["accuracy"],
+            report["accuracy_delta"],
+            report["int8"]["size_mb"],
+            report["size_reduction"],
+            {bs: round(s, 2) for bs, s in report["speedup"].items()},
+        )
+    )
+    return report
+
+# Cell
+def save_quantized_model(
+    model: nn.Module,
+    output_dir: Union[str, Path],
+    mean: Sequence[float],
+    std: Sequence[float],
+) -> Path:
+    """
+    Saves the quantized `model` as a TorchScript graph with the normalization `mean` & `std`
+    folded in (see `export_model`). Returns the path of the graph, which can be reloaded
+    with `load_quantized_model` or served with `gale.runtime.ExportedModel`.
+    """
+    return export_model(model, output_dir, formats=["torchscript"], mean=mean, std=std)[
+        "torchscript"
+    ]
+
+# Cell
+def load_quantized_model(path: Union[str, Path], engine: Optional[str] = None):
+    """
+    Loads a quantized model saved with `save_quantized_model`. The model takes Images with
+    pixel values in [0, 1].
+    """
+    torch.backends.quantized.engine = engine or _default_engine()
+    return torch.jit.load(str(path), map_location="cpu").eval()
\ No newline at end of file
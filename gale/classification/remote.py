@@ -0,0 +1,369 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05c_classification.remote.ipynb (unless otherwise specified).
+
+__all__ = ['HTTPParser', 'RemoteClassificationDataset', 'ReadAheadSampler', 'register_dataset_from_urls']
+
+# Cell
+import collections
+import http.client
+import itertools
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import *
+from urllib.parse import urljoin, urlsplit
+
+import numpy as np
+import pandas as pd
+from fastcore.all import delegates, ifnone, store_attr
+from timm.data.parsers.parser import Parser
+from torch.utils.data import Sampler
+
+from ..utils.structures import DatasetCatalog
+from .core import ClassificationDataset, ClassificationMapper, DatasetDict
+
+_logger = logging.getLogger(__name__)
+
+# HTTP status codes for which a request is retried
+_RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+# HTTP status codes of redirects, which are followed
+_REDIRECT_STATUS = (301, 302, 303, 307, 308)
+
+# Cell
+class _RetryableError(IOError):
+    pass
+
+# Cell
+class _HTTPConnectionPool:
+    """
+    A minimal thread-safe pool of keep-alive `http.client` connections, one
+    queue of connections per `(scheme, host)`.
+    """
+
+    def __init__(self, maxsize: int = 8, timeout: float = 10.0, max_redirects: int = 5):
+        store_attr("maxsize, timeout, max_redirects")
+        self._pools = collections.defaultdict(lambda: queue.LifoQueue(maxsize))
+        self._lock = threading.Lock()
+
+    def _get_conn(self, scheme: str, netloc: str):
+        with self._lock:
+            pool = self._pools[(scheme, netloc)]
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            cls = (
+                http.client.HTTPSConnection
+                if scheme == "https"
+                else http.client.HTTPConnection
+            )
+            return cls(netloc, timeout=self.timeout)
+
+    def _put_conn(self, scheme: str, netloc: str, conn):
+        try:
+            self._pools[(scheme, netloc)].put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def get(self, url: str) -> bytes:
+        """
+        Issue a GET request for `url` and return the body of the response, redirects are
+        followed up to `max_redirects` times.
+        """
+        for _ in range(self.max_redirects + 1):
+            status, body, location = self._request(url)
+            if status not in _REDIRECT_STATUS:
+                break
+            if location is None:
+                raise IOError(f"GET {url} returned {status} without a Location")
+            url = urljoin(url, location)
+        else:
+            raise IOError(f"GET {url} exceeded {self.max_redirects} redirects")
+
+        if status in _RETRY_STATUS:
+            raise _RetryableError(f"GET {url} returned {status}")
+        if not 200 <= status < 300:
+            raise IOError(f"GET {url} returned {status}")
+        return body
+
+    def _request(self, url: str) -> Tuple[int, bytes, Optional[str]]:
+        # returns the status, the body & the redirect location of the response
+        parts = urlsplit(url)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        conn = self._get_conn(parts.scheme, parts.netloc)
+        try:
+            conn.request("GET", path or "/", headers={"Connection": "keep-alive"})
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            raise _RetryableError(f"GET {url} failed: {e}") from e
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._put_conn(parts.scheme, parts.netloc, conn)
+        return response.status, body, response.getheader("Location")
+
+    def close(self):
+        for pool in self._pools.values():
+            while not pool.empty():
+                pool.get_nowait().close()
+
+# Cell
+class HTTPParser(Parser):
+    """
+    A parser which fetches the encoded Images over HTTP using a pool of keep-alive
+    connections. `__getitem__` returns a `DatasetDict` whose `file_name` holds the
+    encoded bytes of the Image, so decoding is done by `ClassificationMapper`.
+
+    Fetches can be scheduled ahead of time with `prefetch`, these run in a thread pool
+    and are consumed by `__getitem__`. Failed requests are retried with exponential
+    backoff. Latencies of the requests are recorded, see `latency_percentiles`.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        targets: Sequence[int],
+        max_connections: int = 8,
+        read_ahead: int = 64,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff: float = 0.1,
+        latency_window: int = 10000,
+    ):
+        """
+        Arguments:
+        1. `urls`: urls of the Images.
+        2. `targets`: integer targets of the Images.
+        3. `max_connections`: size of the connection pool and of the fetching thread pool.
+        4. `read_ahead`: maximum number of prefetched Images held in memory.
+        5. `timeout`: timeout in seconds for a single request.
+        6. `max_retries`: number of times a failed request is retried.
+        7. `backoff`: base delay in seconds between retries, doubled after each retry.
+        8. `latency_window`: number of most recent request latencies kept for the stats.
+        """
+        super().__init__()
+        assert len(urls) == len(targets), "urls and targets must have the same length"
+        self.samples = [(str(u), t) for u, t in zip(urls, targets)]
+        store_attr(
+            "max_connections, read_ahead, timeout, max_retries, backoff, latency_window"
+        )
+        self._latencies = collections.deque(maxlen=latency_window)
+        self._setup_runtime()
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df: pd.DataFrame,
+        url_column: str,
+        label_column: str,
+        base_url: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        Creates the parser from a dataframe. If `base_url` is given the values in
+        `url_column` are treated as keys relative to `base_url`.
+        """
+        urls = df[url_column].astype(str)
+        if base_url is not None:
+            base_url = base_url if base_url.endswith("/") else base_url + "/"
+            urls = [urljoin(base_url, u.lstrip("/")) for u in urls]
+        return cls(list(urls), list(df[label_column]), **kwargs)
+
+    def _setup_runtime(self):
+        # connections, threads & locks can not be pickled or forked, so these are
+        # re-created lazily in every DataLoader worker
+        self._pid = os.getpid()
+        self._pool = None
+        self._executor = None
+        self._pending = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ["_pid", "_pool", "_executor", "_pending", "_lock"]:
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup_runtime()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._setup_runtime()
+
+    @property
+    def pool(self) -> _HTTPConnectionPool:
+        self._check_pid()
+        if self._pool is None:
+            self._pool = _HTTPConnectionPool(self.max_connections, self.timeout)
+        return self._pool
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        self._check_pid()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_connections)
+        return self._executor
+
+    def _fetch(self, index: int) -> bytes:
+        url = self.samples[index][0]
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                body = self.pool.get(url)
+                self._latencies.append(time.perf_counter() - start)
+                return body
+            except _RetryableError as e:
+                self._latencies.append(time.perf_counter() - start)
+                if attempt == self.max_retries:
+                    raise IOError(f"Giving up after {attempt + 1} attempts: {e}") from e
+                delay = self.backoff * (2**attempt)
+                _logger.debug(f"{e}, retrying in {delay:.2f}s")
+                # add some jitter so that the workers do not retry in lock-step
+                time.sleep(delay * (1 + random.random()))
+
+    def prefetch(self, indices: Iterable[int]):
+        """
+        Schedule the Images at `indices` to be fetched in the background. At most `read_ahead`
+        Images are held, the oldest scheduled Images are dropped first.
+        """
+        self._check_pid()
+        with self._lock:
+            for index in indices:
+                if index in self._pending:
+                    continue
+                self._pending[index] = self.executor.submit(self._fetch, index)
+            while len(self._pending) > self.read_ahead:
+                _, future = self._pending.popitem(last=False)
+                future.cancel()
+
+    def get_bytes(self, index: int) -> bytes:
+        """Returns the encoded Image at `index`, uses the prefetched result if available"""
+        self._check_pid()
+        with self._lock:
+            future: Optional[Future] = self._pending.pop(index, None)
+        if future is not None and not future.cancelled():
+            return future.result()
+        return self._fetch(index)
+
+    def __getitem__(self, index):
+        target = self.samples[index][1]
+        return DatasetDict(file_name=self.get_bytes(index), target=target)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def _filename(self, index, basename=False, absolute=False):
+        url = self.samples[index][0]
+        return url.rsplit("/", 1)[-1] if basename else url
+
+    def filename(self, index, basename=False, absolute=False):
+        return self._filename(index, basename=basename)
+
+    def filenames(self, basename=False, absolute=False):
+        return [self._filename(index, basename=basename) for index in range(len(self))]
+
+    def latency_percentiles(
+        self, q: Sequence[float] = (50, 90, 99)
+    ) -> Dict[str, float]:
+        """
+        Returns the percentiles `q` of the recent request latencies in milli-seconds,
+        e.g. `{"p50": 4.2, "p90": 10.3, "p99": 31.0}`
+        """
+        latencies = np.array(self._latencies) * 1000
+        if len(latencies) == 0:
+            return {f"p{p:g}": float("nan") for p in q}
+        values = np.percentile(latencies, q)
+        return {f"p{p:g}": float(v) for p, v in zip(q, values)}
+
+    def log_latency(self, q: Sequence[float] = (50, 90, 99)):
+        """Logs the latency percentiles of the recent requests"""
+        stats = ", ".join(
+            f"{k}: {v:.1f}ms" for k, v in self.latency_percentiles(q).items()
+        )
+        _logger.info(
+            f"{self.__class__.__name__} request latency ({len(self._latencies)} requests) {stats}"
+        )
+
+    def close(self):
+        """Shuts down the fetching threads & closes the open connections"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self._pool is not None:
+            self._pool.close()
+        self._setup_runtime()
+
+# Cell
+class RemoteClassificationDataset(ClassificationDataset):
+    """
+    A `ClassificationDataset` for a `HTTPParser`. When a batch of indices is
+    requested (`__getitems__`) all the Images of the batch are fetched concurrently.
+    """
+
+    def __getitems__(self, indices: List[int]) -> List:
+        self.parser.prefetch(indices)
+        return [self[index] for index in indices]
+
+# Cell
+class ReadAheadSampler(Sampler):
+    """
+    Wraps a `sampler` and schedules the next `depth` indices drawn from the `sampler`
+    to be fetched by `parser`, while the current ones are being consumed.
+
+    Note: read-ahead happens in the process that iterates the sampler, so this should be used
+    with `num_workers=0`. With worker processes, `RemoteClassificationDataset` prefetches
+    each batch instead.
+    """
+
+    def __init__(
+        self, sampler: Sampler, parser: HTTPParser, depth: Optional[int] = None
+    ):
+        self.sampler = sampler
+        self.parser = parser
+        self.depth = ifnone(depth, parser.read_ahead)
+
+    def __iter__(self):
+        indices = iter(self.sampler)
+        window = collections.deque(itertools.islice(indices, self.depth))
+        self.parser.prefetch(window)
+        while window:
+            index = window.popleft()
+            for nxt in itertools.islice(indices, 1):
+                window.append(nxt)
+                self.parser.prefetch([nxt])
+            yield index
+
+    def __len__(self):
+        return len(self.sampler)
+
+# Cell
+@delegates(ClassificationMapper)
+def register_dataset_from_urls(
+    name: str,
+    df: pd.DataFrame,
+    url_column: str,
+    label_column: str,
+    base_url: Optional[str] = None,
+    parser_kwargs: Optional[Dict] = None,
+    mapper: Optional[Union[ClassificationMapper, Callable]] = None,
+    **kwargs,
+):
+    """
+    Register a dataset served over HTTP (see `HTTPParser`) to DatasetCatalog.
+    `name` is a `str` that identifies a dataset, e.g. "coco_2014_train".
+    """
+    parser_kwargs = ifnone(parser_kwargs, {})
+    parser = HTTPParser.from_dataframe(
+        df, url_column, label_column, base_url, **parser_kwargs
+    )
+    mapper = ifnone(mapper, ClassificationMapper(**kwargs))
+    DatasetCatalog.register(
+        name, lambda: RemoteClassificationDataset(mapper=mapper, parser=parser)
+    )
+    _logger.info("Dataset: {} registerd to DatasetCatalog".format(name))
\ No newline at end of file
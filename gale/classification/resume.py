@@ -0,0 +1,189 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05j_classification.resume.ipynb (unless otherwise specified).
+
+__all__ = ['find_resumable_sampler', 'get_rng_state', 'set_rng_state', 'data_pipeline_state', 'restore_data_pipeline',
+           'load_data_pipeline_state', 'start_train_epoch']
+
+# Cell
+import logging
+import random
+from typing import *
+
+import numpy as np
+import pytorch_lightning as pl
+import torch
+from torch.utils.data import DistributedSampler
+
+_logger = logging.getLogger(__name__)
+
+# Cell
+def find_resumable_sampler(loader: Iterable) -> Optional[Any]:
+    """
+    Returns the sampler of `loader` which has a `state_dict`, looking through wrapping samplers
+    like `BatchSampler`, or `None` if there is no such sampler.
+    """
+    # the `batch_sampler` of a loader wraps its `sampler` unless it was passed in
+    sampler = getattr(loader, "batch_sampler", None) or getattr(loader, "sampler", None)
+    while sampler is not None and not hasattr(sampler, "state_dict"):
+        sampler = getattr(sampler, "sampler", None)
+    return sampler
+
+# Cell
+def get_rng_state() -> Dict:
+    "Returns the state of the python, numpy & torch global RNGs"
+    # the keys of the numpy state are stored as a list, so that the checkpoints can be loaded
+    # with `torch.load(..., weights_only=True)`
+    name, keys, *rest = np.random.get_state()
+    return dict(
+        python=random.getstate(),
+        numpy=(name, keys.tolist(), *rest),
+        torch=torch.get_rng_state(),
+    )
+
+# Cell
+def set_rng_state(state: Dict):
+    "Restores the global RNGs from a state returned by `get_rng_state`"
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+
+# Cell
+def _is_distributed(trainer: pl.Trainer, loader: Iterable) -> bool:
+    if getattr(trainer, "world_size", 1) > 1:
+        return True
+    sampler = getattr(loader, "batch_sampler", None) or getattr(loader, "sampler", None)
+    while sampler is not None:
+        if isinstance(sampler, DistributedSampler):
+            return True
+        sampler = getattr(sampler, "sampler", None)
+    return False
+
+# Cell
+def _batch_size(loader) -> int:
+    if getattr(loader, "batch_size", None) is not None:
+        return loader.batch_size
+    batch_sampler = getattr(loader, "batch_sampler", None) or loader.sampler
+    return getattr(batch_sampler, "batch_size", 1)
+
+# Cell
+def data_pipeline_state(loader: Iterable, samples_seen: int, batches_seen: int) -> Dict:
+    """
+    Returns the state of the training `loader` after `batches_seen` batches with `samples_seen`
+    samples of the current epoch have been consumed by the training loop. The `epoch` of the
+    state is the epoch of the sampler or of the streaming dataset.
+    """
+    dataset = getattr(loader, "dataset", None)
+    sampler = find_resumable_sampler(loader)
+    state = dict(
+        samples_seen=samples_seen,
+        batches_seen=batches_seen,
+        rng=get_rng_state(),
+        sampler=sampler.state_dict() if sampler is not None else None,
+        dataset=dataset.state_dict() if hasattr(dataset, "state_dict") else None,
+    )
+    position = state["sampler"] or state["dataset"] or {}
+    state["epoch"] = position.get("epoch")
+    # a checkpoint saved after the last batch of an epoch starts the next epoch from the
+    # beginning, the number of batches accounts for the last partial batch & `drop_last`
+    try:
+        state["complete"] = batches_seen >= len(loader)
+    except TypeError:
+        state["complete"] = False
+    return state
+
+# Cell
+def restore_data_pipeline(loader: Iterable, state: Dict) -> bool:
+    """
+    Restores the RNGs and, if the epoch was interrupted, positions the sampler or the
+    streaming dataset of `loader` at the next sample of the epoch. Only the indices of the
+    consumed samples are skipped, the samples are not loaded.
+
+    For streaming datasets the position of each worker is derived from the round-robin order
+    in which the `DataLoader` consumes the workers, which is exact as long as no worker ran out
+    of samples before the checkpoint was saved. The remaining batches are the same, but the
+    `DataLoader` restarts the round-robin at the first worker.
+
+    Returns `True` if the loader was positioned in the middle of an epoch.
+    """
+    set_rng_state(state["rng"])
+    if state["complete"]:
+        return False
+
+    sampler = find_resumable_sampler(loader)
+    if sampler is not None and state["sampler"] is not None:
+        sampler.load_state_dict(dict(state["sampler"], start=state["samples_seen"]))
+        return True
+
+    dataset = getattr(loader, "dataset", None)
+    if hasattr(dataset, "load_state_dict") and state["dataset"] is not None:
+        num_workers = max(getattr(loader, "num_workers", 0), 1)
+        batch_size, batches = _batch_size(loader), state["batches_seen"]
+        skip = [
+            (batches // num_workers + int(w < batches % num_workers)) * batch_size
+            for w in range(num_workers)
+        ]
+        dataset.load_state_dict(dict(state["dataset"], skip=skip))
+        return True
+
+    _logger.warning(
+        "The loader can not be resumed in the middle of an epoch, the epoch is restarted"
+    )
+    return False
+
+# Cell
+def load_data_pipeline_state(checkpoint: Dict) -> Optional[Dict]:
+    """
+    Returns the state of the training data pipeline saved in `checkpoint` (see
+    `data_pipeline_state`), to be called in the `on_load_checkpoint` hook.
+
+    Lightning saves `current_epoch + 1` as the epoch of every checkpoint, so a run resumed from
+    a checkpoint saved in the middle of epoch `k` would start at epoch `k + 1`. If the state was
+    saved in the middle of an epoch, the epoch of `checkpoint` is set back to the epoch of the
+    sampler, so that the rest of epoch `k` is trained as epoch `k`. Lightning restores its loops
+    after the hook.
+    """
+    state = checkpoint.get("data_state")
+    if state is None or state["complete"]:
+        return state
+    if state.get("epoch") == checkpoint.get("epoch", 0) - 1:
+        checkpoint["epoch"] = state["epoch"]
+    return state
+
+# Cell
+def start_train_epoch(
+    trainer: pl.Trainer, loader: Iterable, state: Optional[Dict]
+) -> bool:
+    """
+    Prepares the training `loader` at the start of an epoch of `trainer`. If `state` (see
+    `load_data_pipeline_state`) was saved in the middle of the current epoch, the epoch is
+    resumed at the next sample, else the sampler & the streaming dataset are set to the epoch of
+    `trainer`. The epoch is not fast-forwarded if the epoch of the sampler in `state` is not the
+    epoch of `trainer`, nor with distributed training, where the epoch is restarted.
+
+    Returns `True` if the loader was positioned in the middle of an epoch.
+    """
+    if state is not None and not state["complete"]:
+        if _is_distributed(trainer, loader):
+            _logger.warning(
+                "Resuming in the middle of an epoch is not supported with distributed training, "
+                "epoch {} is restarted".format(trainer.current_epoch)
+            )
+            state = dict(state, complete=True)
+        elif state.get("epoch") != trainer.current_epoch:
+            _logger.warning(
+                "The data pipeline was saved in epoch {} but training resumes at epoch {}, "
+                "the epoch is restarted".format(
+                    state.get("epoch"), trainer.current_epoch
+                )
+            )
+            state = dict(state, complete=True)
+
+    if state is not None and restore_data_pipeline(loader, state):
+        return True
+
+    # samplers & streaming datasets re-shuffle with the epoch
+    dataset = getattr(loader, "dataset", None)
+    sampler = find_resumable_sampler(loader)
+    for obj in (dataset, sampler):
+        if hasattr(obj, "set_epoch"):
+            obj.set_epoch(trainer.current_epoch)
+    return False
\ No newline at end of file
@@ -0,0 +1,179 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05h_classification.samplers.ipynb (unless otherwise specified).
+
+__all__ = ['ResumableRandomSampler', 'BlockShuffleSampler', 'benchmark_sampler_io']
+
+# Cell
+import itertools
+import logging
+import os
+import time
+from typing import *
+
+import numpy as np
+import torch
+from torch.utils.data import RandomSampler, Sampler
+
+_logger = logging.getLogger(__name__)
+
+# Cell
+class ResumableRandomSampler(RandomSampler):
+    """
+    A `RandomSampler` whose order is derived from `seed + epoch`, so that an epoch can be
+    resumed from its `start`-th sample without loading the samples before it. If `seed` is
+    `None` it is drawn from the torch seed, i.e it is set by `seed_everything`.
+
+    Like `DistributedSampler`, the epoch must be set with `set_epoch` to change the order,
+    Lightning does this at the start of every epoch.
+    """
+
+    def __init__(self, data_source: Sized, seed: Optional[int] = None):
+        super().__init__(data_source)
+        self.seed = seed if seed is not None else torch.initial_seed() % 2**31
+        self.epoch, self.start = 0, 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch, self.start = epoch, 0
+
+    def state_dict(self) -> Dict[str, int]:
+        return dict(seed=self.seed, epoch=self.epoch, start=self.start)
+
+    def load_state_dict(self, state: Dict[str, int]):
+        self.seed = state["seed"]
+        self.epoch = state["epoch"]
+        self.start = state["start"]
+
+    def __len__(self):
+        return len(self.data_source) - self.start
+
+    def __iter__(self):
+        generator = torch.Generator().manual_seed(self.seed + self.epoch)
+        order = torch.randperm(len(self.data_source), generator=generator)
+        start, self.start = self.start, 0
+        yield from order[start:].tolist()
+
+# Cell
+class BlockShuffleSampler(Sampler):
+    """
+    Shuffles the order of blocks of indices and then shuffles the indices within a bounded
+    buffer. Blocks are contiguous runs of `block_size` indices or, if given, the `blocks`
+    (e.g. the indices of each shard).
+
+    The indices of the blocks are streamed through a buffer of `buffer_size` indices, every
+    index read into the buffer replaces a randomly chosen index which is yielded. So the reads
+    are confined to a window of ~`buffer_size` neighbouring samples, while every sample can
+    still move anywhere in the epoch through the shuffled block order.
+
+    The order is seeded with `seed + epoch`, the epoch is set with `set_epoch`. The sampler can
+    be resumed in the middle of an epoch, see `load_state_dict`.
+
+    Can be used with the `sampler` key of the dataloader config:
+    ```
+    sampler:
+      _target_: gale.classification.BlockShuffleSampler
+      block_size: 256
+      buffer_size: 1024
+    ```
+    """
+
+    def __init__(
+        self,
+        data_source: Sized,
+        block_size: int = 256,
+        buffer_size: int = 1024,
+        blocks: Optional[Sequence[Sequence[int]]] = None,
+        seed: int = 0,
+    ):
+        self.data_source = data_source
+        self.buffer_size = max(1, buffer_size)
+        self.seed, self.epoch, self.start = seed, 0, 0
+        if blocks is None:
+            n = len(data_source)
+            blocks = [range(i, min(i + block_size, n)) for i in range(0, n, block_size)]
+        self.blocks = [np.asarray(b, dtype=np.int64) for b in blocks]
+
+    def set_epoch(self, epoch: int):
+        self.epoch, self.start = epoch, 0
+
+    def state_dict(self) -> Dict[str, int]:
+        return dict(seed=self.seed, epoch=self.epoch, start=self.start)
+
+    def load_state_dict(self, state: Dict[str, int]):
+        self.seed = state["seed"]
+        self.epoch = state["epoch"]
+        self.start = state["start"]
+
+    def __len__(self):
+        return sum(len(b) for b in self.blocks) - self.start
+
+    def _order(self, rng) -> Iterator[int]:
+        buffer = []
+        for block_idx in rng.permutation(len(self.blocks)):
+            for index in self.blocks[block_idx].tolist():
+                if len(buffer) < self.buffer_size:
+                    buffer.append(index)
+                    continue
+                slot = rng.integers(len(buffer))
+                buffer[slot], index = index, buffer[slot]
+                yield index
+        # drain the buffer
+        yield from (buffer[i] for i in rng.permutation(len(buffer)))
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        start, self.start = self.start, 0
+        # only the indices are replayed to skip the first `start` samples
+        yield from itertools.islice(self._order(rng), start, None)
+
+# Cell
+def _drop_page_cache(paths: Iterable[str]):
+    # evicts the files from the OS page cache, so that the reads hit the disk
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in set(paths):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+# Cell
+def benchmark_sampler_io(
+    paths: Sequence[str],
+    samplers: Dict[str, Iterable[int]],
+    num_samples: Optional[int] = None,
+    drop_cache: bool = True,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Reads the files `paths` in the order of each of the `samplers` and returns the read
+    throughput (`samples/s`, `MB/s`) of each sampler. The randomness of each order is
+    measured with the rank correlation between the positions and the indices (`rank_corr`,
+    ~0 for a full shuffle and 1 for sequential reads).
+
+    If `drop_cache` is `True`, the files are evicted from the OS page cache before each run.
+    """
+    results = {}
+    for name, sampler in samplers.items():
+        order = np.fromiter(iter(sampler), dtype=np.int64)
+        if num_samples is not None:
+            order = order[:num_samples]
+        if drop_cache:
+            _drop_page_cache(paths[i] for i in order)
+
+        num_bytes, tick = 0, time.perf_counter()
+        for index in order:
+            with open(paths[index], "rb") as f:
+                num_bytes += len(f.read())
+        elapsed = time.perf_counter() - tick
+
+        ranks = np.argsort(np.argsort(order))
+        results[name] = {
+            "samples/s": len(order) / elapsed,
+            "MB/s": num_bytes / elapsed / 2**20,
+            "rank_corr": float(np.corrcoef(np.arange(len(order)), ranks)[0, 1]),
+        }
+        _logger.info(
+            "{}: {:.1f} samples/s, {:.1f} MB/s, rank correlation {:.3f}".format(
+                name, *results[name].values()
+            )
+        )
+    return results
\ No newline at end of file
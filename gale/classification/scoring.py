@@ -0,0 +1,387 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/06b_classification.scoring.ipynb (unless otherwise specified).
+
+__all__ = ['load_model_from_checkpoint', 'score_manifest', 'main']
+
+# Cell
+import argparse
+import inspect
+import io
+import json
+import logging
+import os
+import time
+from typing import *
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.multiprocessing as mp
+from fastcore.all import IN_NOTEBOOK, Path
+from omegaconf import OmegaConf
+from PIL import Image
+from torch import nn
+
+from ..collections.pandas import _read_chunks
+from .augment import (
+    cifar_stats,
+    imagenet_no_augment_transform,
+    imagenet_stats,
+    mnist_stats,
+)
+from .core import ClassificationMapper, DatasetDict
+from .inference import PathsDataset, build_inference_loader, iter_predictions
+from .model import build_model
+
+_logger = logging.getLogger(__name__)
+
+_NAMED_STATS = {"imagenet": imagenet_stats, "cifar": cifar_stats, "mnist": mnist_stats}
+_FORMATS = ("parquet", "npy")
+
+# Cell
+def load_model_from_checkpoint(
+    checkpoint: Union[str, Path], map_location: str = "cpu"
+) -> Tuple[nn.Module, ClassificationMapper]:
+    """
+    Builds the model of a `ClassificationTask` checkpoint from the config stored in the
+    checkpoint and loads its weights, without setting up the data or the optimization of the
+    task. Returns the model in eval mode & a mapper with the eval transforms of the task.
+    """
+    # the checkpoint holds the config, which is not a tensor
+    kwargs = {}
+    if "weights_only" in inspect.signature(torch.load).parameters:
+        kwargs["weights_only"] = False
+    ckpt = torch.load(checkpoint, map_location=map_location, **kwargs)
+    cfg = OmegaConf.create(ckpt["hyper_parameters"])
+    model = build_model(cfg)
+    state_dict = {
+        k[len("_model.") :]: v
+        for k, v in ckpt["state_dict"].items()
+        if k.startswith("_model.")
+    }
+    model.load_state_dict(state_dict)
+
+    if "normalization" in ckpt:
+        mean, std = ckpt["normalization"]["mean"], ckpt["normalization"]["std"]
+    elif cfg.input.mean in _NAMED_STATS:
+        mean, std = _NAMED_STATS[cfg.input.mean]
+    else:
+        mean, std = list(cfg.input.mean), list(cfg.input.std)
+
+    height, width = cfg.input.height, cfg.input.width
+    mapper = ClassificationMapper(
+        augmentations=imagenet_no_augment_transform(
+            height if height == width else (height, width)
+        ),
+        mean=mean,
+        std=std,
+        channels=cfg.input.channels,
+    )
+    return model.eval(), mapper
+
+# Cell
+def _iter_shards(
+    manifest: Path, shard_size: int, column: str
+) -> Iterator[pd.DataFrame]:
+    # re-chunks `column` of the manifest into shards of exactly `shard_size` rows (except the
+    # last one)
+    kwargs = (
+        dict(columns=[column])
+        if manifest.suffix == ".parquet"
+        else dict(usecols=[column])
+    )
+    buffer, num_rows = [], 0
+    for chunk in _read_chunks(manifest, shard_size, **kwargs):
+        buffer.append(chunk)
+        num_rows += len(chunk)
+        while num_rows >= shard_size:
+            df = pd.concat(buffer, ignore_index=True)
+            yield df.iloc[:shard_size]
+            buffer, num_rows = [df.iloc[shard_size:]], num_rows - shard_size
+    if num_rows:
+        yield pd.concat(buffer, ignore_index=True)
+
+# Cell
+def _shard_name(shard_idx: int, format: str, suffix: str = "") -> str:
+    ext = "parquet" if format == "parquet" else "npy"
+    return f"shard-{shard_idx:06d}{suffix}.{ext}"
+
+# Cell
+def _write_atomic(path: Path, write: Callable):
+    # a shard is either complete or absent, so a crashed job never leaves a partial shard
+    tmp = path.parent / (path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+# Cell
+def _write_shard(
+    output_dir: Path,
+    shard_idx: int,
+    rows: np.ndarray,
+    paths: List[str],
+    preds: Tuple[np.ndarray, ...],
+    output: str,
+    format: str,
+):
+    if format == "npy":
+        names = ("-probs", "-classes") if output == "topk" else ("",)
+        for suffix, pred in zip(names, preds):
+            path = output_dir / _shard_name(shard_idx, format, suffix)
+            _write_atomic(path, lambda f: np.save(f, pred))
+        return
+
+    df = pd.DataFrame({"row": rows, "file_name": paths})
+    if output == "topk":
+        df["topk_probs"], df["topk_classes"] = list(preds[0]), list(preds[1])
+    else:
+        df[output] = list(preds[0])
+    path = output_dir / _shard_name(shard_idx, format)
+    _write_atomic(path, lambda f: df.to_parquet(f, index=False))
+
+# Cell
+def _is_complete(output_dir: Path, shard_idx: int, output: str, format: str) -> bool:
+    suffixes = ("-probs", "-classes") if format == "npy" and output == "topk" else ("",)
+    return all(
+        (output_dir / _shard_name(shard_idx, format, s)).exists() for s in suffixes
+    )
+
+# Cell
+class _ScoringDataset(PathsDataset):
+    # an Image which fails to decode is replaced by `placeholder` & flagged as failed, so that
+    # a corrupt file does not stop the job
+    def __init__(self, paths: Sequence[str], mapper: ClassificationMapper):
+        super().__init__(paths, mapper)
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buffer, format="PNG")
+        self.placeholder, _ = mapper.encodes(
+            DatasetDict(file_name=buffer.getvalue(), target=-1)
+        )
+
+    def __getitem__(self, index):
+        try:
+            image, _ = super().__getitem__(index)
+            return image, True
+        except Exception as e:
+            _logger.warning("Failed to load {}: {}".format(self.paths[index], e))
+            return self.placeholder, False
+
+# Cell
+def _predict_shard(
+    model: nn.Module,
+    mapper: ClassificationMapper,
+    paths: List[str],
+    args: Dict,
+    device: str,
+) -> Tuple[Tuple[np.ndarray, ...], np.ndarray]:
+    # returns the outputs of the Images & whether they were decoded, the outputs of the
+    # Images which failed to decode are NaN (-1 for the top-k classes)
+    loader = build_inference_loader(
+        _ScoringDataset(paths, mapper),
+        batch_size=args["batch_size"],
+        num_workers=args["num_workers"],
+    )
+    loaded = []
+
+    def _images():
+        for images, ok in loader:
+            loaded.append(ok.numpy())
+            yield images
+
+    preds = list(
+        iter_predictions(model, _images(), args["output"], args["topk"], device)
+    )
+    if args["output"] == "topk":
+        preds = tuple(np.concatenate(p) for p in zip(*preds))
+    else:
+        preds = (np.concatenate(preds),)
+    loaded = np.concatenate(loaded)
+    for pred in preds:
+        pred[~loaded] = -1 if np.issubdtype(pred.dtype, np.integer) else np.nan
+    return preds, loaded
+
+# Cell
+def _score_worker(rank: int, args: Dict):
+    # every process streams the manifest & scores the shards `i` with
+    # `i % num_processes == rank` which are not complete, so the processes are only sent
+    # the arguments of the job
+    if args["num_processes"] > 1:
+        # spawned processes do not inherit the logging config
+        logging.basicConfig(level=args["log_level"])
+    output_dir = Path(args["output_dir"])
+    if args["threads_per_process"] is not None:
+        torch.set_num_threads(args["threads_per_process"])
+
+    device = args["device"]
+    if device == "cuda":
+        device = f"cuda:{rank % torch.cuda.device_count()}"
+
+    progress_file = output_dir / f"progress-{rank}.json"
+    progress = dict(rank=rank, shards=[], images=0, seconds=0.0, failed=[])
+    if progress_file.exists():
+        with open(progress_file) as f:
+            progress = json.load(f)
+
+    model = None
+    shard_size, column = args["shard_size"], args["path_column"]
+    shards = _iter_shards(Path(args["manifest"]), shard_size, column)
+    for shard_idx, chunk in enumerate(shards):
+        if shard_idx % args["num_processes"] != rank or _is_complete(
+            output_dir, shard_idx, args["output"], args["format"]
+        ):
+            continue
+        if model is None:
+            model, mapper = load_model_from_checkpoint(args["checkpoint"])
+            model.to(device)
+
+        tick = time.perf_counter()
+        paths = chunk[column].astype(str).tolist()
+        preds, loaded = _predict_shard(model, mapper, paths, args, device)
+        rows = np.arange(shard_idx * shard_size, shard_idx * shard_size + len(paths))
+        _write_shard(
+            output_dir, shard_idx, rows, paths, preds, args["output"], args["format"]
+        )
+
+        elapsed = time.perf_counter() - tick
+        progress["shards"].append(shard_idx)
+        progress["images"] += len(paths)
+        progress["seconds"] += elapsed
+        progress["failed"] += [p for p, ok in zip(paths, loaded) if not ok]
+        _write_atomic(progress_file, lambda f: f.write(json.dumps(progress).encode()))
+        _logger.info(
+            "[process {}] shard {}: {} Images, {} failed, {:.1f} Images/s".format(
+                rank, shard_idx, len(paths), int((~loaded).sum()), len(paths) / elapsed
+            )
+        )
+
+# Cell
+def score_manifest(
+    checkpoint: Union[str, Path],
+    manifest: Union[str, Path],
+    output_dir: Union[str, Path],
+    path_column: str = "file_name",
+    output: str = "probs",
+    topk: int = 5,
+    format: str = "parquet",
+    num_processes: int = 1,
+    shard_size: int = 10_000,
+    batch_size: int = 64,
+    num_workers: int = 0,
+    threads_per_process: Optional[int] = None,
+    device: str = "cpu",
+) -> Dict:
+    """
+    Scores the Images in `path_column` of the csv or parquet `manifest` with the model of
+    `checkpoint` (see `load_model_from_checkpoint`) and writes the `output` (see
+    `iter_predictions`) of every shard of `shard_size` rows to `output_dir`:
+    1. `parquet`: a file per shard with the `row` of the manifest, the `file_name` & the outputs.
+    2. `npy`: an array per shard (two for `topk`), the rows of shard `i` start at `i * shard_size`.
+
+    The shards are distributed round-robin across `num_processes` processes, every process
+    streams the manifest itself and decodes the Images of its shards with `num_workers`
+    workers. Completed shards are skipped, so the job resumes where it stopped if it is run
+    again with the same arguments. With `device="cuda"` the processes are spread over the
+    available GPUs. The outputs of the Images which fail to decode are NaN (-1 for the top-k
+    classes).
+
+    Returns a report with the Images/s of every process & in aggregate, and the paths of
+    the Images which failed to decode.
+    """
+    assert format in _FORMATS, f"format must be one of {_FORMATS}"
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if threads_per_process is None:
+        threads_per_process = max(1, (os.cpu_count() or 1) // num_processes)
+    args = dict(
+        checkpoint=str(checkpoint),
+        manifest=str(manifest),
+        output_dir=str(output_dir),
+        path_column=path_column,
+        output=output,
+        topk=topk,
+        format=format,
+        num_processes=num_processes,
+        shard_size=shard_size,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        threads_per_process=threads_per_process,
+        device=device,
+        log_level=logging.getLogger().getEffectiveLevel(),
+    )
+
+    tick = time.perf_counter()
+    if num_processes == 1:
+        _score_worker(0, args)
+    else:
+        ctx = mp.get_context("spawn")
+        processes = [
+            ctx.Process(target=_score_worker, args=(rank, args))
+            for rank in range(num_processes)
+        ]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        failed = [rank for rank, p in enumerate(processes) if p.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"Scoring failed in the processes {failed}")
+    elapsed = time.perf_counter() - tick
+
+    report = dict(processes=[], images=0, seconds=elapsed, failed=[])
+    for rank in range(num_processes):
+        path = output_dir / f"progress-{rank}.json"
+        if not path.exists():
+            continue
+        with open(path) as f:
+            progress = json.load(f)
+        rate = progress["images"] / max(progress["seconds"], 1e-9)
+        report["processes"].append(
+            dict(
+                rank=rank,
+                images=progress["images"],
+                seconds=progress["seconds"],
+                rate=rate,
+            )
+        )
+        report["images"] += progress["images"]
+        report["failed"] += progress.get("failed", [])
+        _logger.info("Process {}: {:.1f} Images/s".format(rank, rate))
+
+    # the processes run in parallel, the aggregate rate covers all the runs of the job
+    busy = max([p["seconds"] for p in report["processes"]] or [0])
+    report["rate"] = report["images"] / max(busy, 1e-9)
+    _logger.info(
+        "Scored {} Images, {:.1f} Images/s in aggregate".format(
+            report["images"], report["rate"]
+        )
+    )
+    return report
+
+# Cell
+def main(args: Optional[Sequence[str]] = None):
+    "Command line interface of `score_manifest`"
+    ap = argparse.ArgumentParser(
+        description="Scores the Images of a manifest, see `score_manifest`"
+    )
+    ap.add_argument("--checkpoint", required=True)
+    ap.add_argument("--manifest", required=True, help="csv or parquet file")
+    ap.add_argument("--output-dir", required=True)
+    ap.add_argument("--path-column", default="file_name")
+    ap.add_argument(
+        "--output", choices=["logits", "probs", "topk", "embeddings"], default="probs"
+    )
+    ap.add_argument("--topk", type=int, default=5)
+    ap.add_argument("--format", choices=list(_FORMATS), default="parquet")
+    ap.add_argument("--num-processes", type=int, default=1)
+    ap.add_argument("--shard-size", type=int, default=10_000)
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--num-workers", type=int, default=0)
+    ap.add_argument("--threads-per-process", type=int, default=None)
+    ap.add_argument("--device", default="cpu")
+    args = ap.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+    score_manifest(**vars(args))
+
+# Cell
+if __name__ == "__main__" and not IN_NOTEBOOK:
+    main()
\ No newline at end of file
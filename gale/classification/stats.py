@@ -0,0 +1,240 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05m_classification.stats.ipynb (unless otherwise specified).
+
+__all__ = ['DatasetStats', 'dataset_fingerprint', 'compute_dataset_stats']
+
+# Cell
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import *
+
+import numpy as np
+from fastcore.all import Path, ifnone
+from PIL import Image
+from torch.utils.data import Dataset
+
+from ..utils.structures import DatasetCatalog
+from .core import DatasetDict, convert_mode, pil_loader
+
+_logger = logging.getLogger(__name__)
+
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gale", "stats")
+_QUANTILES = (0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0)
+
+# Cell
+@dataclass
+class DatasetStats:
+    """
+    Statistics of a dataset, `mean` & `std` are per-channel and computed over the pixels
+    scaled to [0, 1]. `sizes` holds the quantiles (`_QUANTILES`) of the widths & heights of
+    the Images.
+    """
+
+    mean: List[float]
+    std: List[float]
+    num_images: int
+    num_pixels: int
+    class_histogram: Dict[str, int] = field(default_factory=dict)
+    sizes: Dict[str, List[float]] = field(default_factory=dict)
+    fingerprint: Optional[str] = None
+
+    def save(self, path: Union[str, Path]):
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "DatasetStats":
+        with open(path) as f:
+            return cls(**json.load(f))
+
+# Cell
+class _Moments:
+    # count, mean & sum of squared deviations of each channel, merged with Chan et al.'s
+    # parallel update so that the result does not suffer from cancellation
+    def __init__(self, channels: int):
+        self.n = 0
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels)
+
+    def update(self, pixels: np.ndarray):
+        # pixels: (num_pixels, channels)
+        other = _Moments(pixels.shape[1])
+        other.n = len(pixels)
+        other.mean = pixels.mean(0)
+        other.m2 = ((pixels - other.mean) ** 2).sum(0)
+        self.merge(other)
+
+    def merge(self, other: "_Moments"):
+        n = self.n + other.n
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / n
+        self.m2 = self.m2 + other.m2 + delta**2 * self.n * other.n / n
+        self.n = n
+
+# Cell
+class _TensorParser:
+    # exposes the uint8 `images` of an `InMemoryClassificationDataset` like a parser
+    def __init__(self, images, targets):
+        self.images, self.targets = images, targets
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index):
+        return self.images[index].permute(1, 2, 0).numpy(), self.targets[index]
+
+# Cell
+def _get_parser(dataset: Dataset):
+    if hasattr(dataset, "images") and hasattr(dataset, "targets"):
+        return _TensorParser(dataset.images, dataset.targets)
+    parser = getattr(dataset, "parser", None)
+    assert (
+        parser is not None
+    ), "Statistics can only be computed for datasets with a parser"
+    return parser
+
+# Cell
+def dataset_fingerprint(dataset: Dataset, **kwargs) -> str:
+    """
+    Returns a fingerprint of `dataset` which changes if the samples change. For parsers
+    with `samples` (paths & targets) the size & modification time of the local files are
+    included, remote samples (urls, see `HTTPParser`) are only fingerprinted by their url &
+    target, for in-memory datasets the Images are hashed, else the fingerprint is built
+    from the length & type of the dataset.
+    `kwargs` (e.g. the subsampling arguments) are also hashed.
+    """
+    h = hashlib.sha1(json.dumps(kwargs, sort_keys=True, default=str).encode())
+    parser = _get_parser(dataset)
+    samples = getattr(parser, "samples", None)
+    if samples is not None and len(samples) and isinstance(samples[0][0], (str, Path)):
+        for path, target in samples:
+            if "://" in str(path):
+                h.update(f"{path}:{target}\n".encode())
+                continue
+            st = os.stat(path)
+            h.update(f"{path}:{target}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    elif isinstance(parser, _TensorParser):
+        h.update(parser.images.numpy().tobytes())
+        h.update(parser.targets.numpy().tobytes())
+    else:
+        h.update(f"{type(parser).__name__}:{len(parser)}".encode())
+    return h.hexdigest()
+
+# Cell
+_parser = None
+
+# Cell
+def _init_worker(parser):
+    global _parser
+    _parser = parser
+
+# Cell
+def _load(item, channels: int) -> Tuple[np.ndarray, Any]:
+    if isinstance(item, DatasetDict):
+        image, target = pil_loader(item.file_name, channels), item.target
+    else:
+        # torchvision datasets return (Image, target)
+        image, target = item
+        if isinstance(image, Image.Image):
+            image = convert_mode(image, channels)
+    image = np.asarray(image, dtype=np.float64) / 255.0
+    return image.reshape(*image.shape[:2], -1), target
+
+# Cell
+def _stats_chunk(indices: List[int], channels: int):
+    moments, classes, sizes = _Moments(channels), Counter(), []
+    for index in indices:
+        image, target = _load(_parser[index], channels)
+        moments.update(image.reshape(-1, image.shape[-1]))
+        classes[str(int(target))] += 1
+        sizes.append(image.shape[1::-1])
+    return moments, classes, sizes
+
+# Cell
+def compute_dataset_stats(
+    dataset: Union[str, Dataset],
+    channels: int = 3,
+    max_samples: Optional[int] = None,
+    num_workers: Optional[int] = None,
+    chunksize: int = 64,
+    seed: int = 42,
+    cache_dir: Optional[str] = _CACHE_DIR,
+) -> DatasetStats:
+    """
+    Computes the `DatasetStats` of `dataset` (a dataset or the name of a dataset registered
+    in DatasetCatalog) in parallel across `num_workers` processes. The Images are read from
+    the parser of the dataset, so the augmentations of the mapper are not applied.
+
+    If `max_samples` is given, the statistics are computed on a random subset of
+    `max_samples` Images. The result is cached in `cache_dir` by the fingerprint of the
+    dataset (see `dataset_fingerprint`), set `cache_dir=None` to disable caching.
+    """
+    if isinstance(dataset, str):
+        dataset = DatasetCatalog.get(dataset)
+    parser = _get_parser(dataset)
+
+    fingerprint = dataset_fingerprint(
+        dataset, channels=channels, max_samples=max_samples, seed=seed
+    )
+    cache = Path(cache_dir) / f"{fingerprint}.json" if cache_dir else None
+    if cache is not None and cache.exists():
+        _logger.info("Loading dataset statistics from {}".format(cache))
+        return DatasetStats.load(cache)
+
+    indices = np.arange(len(parser))
+    if max_samples is not None and max_samples < len(indices):
+        rng = np.random.default_rng(seed)
+        indices = np.sort(rng.choice(indices, max_samples, replace=False))
+    chunks = [
+        indices[i : i + chunksize].tolist() for i in range(0, len(indices), chunksize)
+    ]
+
+    moments, classes, sizes = _Moments(channels), Counter(), []
+    num_workers = ifnone(num_workers, os.cpu_count())
+    if num_workers > 1 and len(chunks) > 1:
+        pool = ProcessPoolExecutor(
+            num_workers, initializer=_init_worker, initargs=(parser,)
+        )
+        with pool:
+            results = list(pool.map(_stats_chunk, chunks, [channels] * len(chunks)))
+    else:
+        _init_worker(parser)
+        results = [_stats_chunk(chunk, channels) for chunk in chunks]
+
+    for chunk_moments, chunk_classes, chunk_sizes in results:
+        moments.merge(chunk_moments)
+        classes.update(chunk_classes)
+        sizes.extend(chunk_sizes)
+
+    sizes = np.array(sizes, dtype=np.float64).reshape(-1, 2)
+    stats = DatasetStats(
+        mean=moments.mean.tolist(),
+        std=np.sqrt(moments.m2 / max(moments.n - 1, 1)).tolist(),
+        num_images=len(indices),
+        num_pixels=int(moments.n),
+        class_histogram=dict(sorted(classes.items(), key=lambda x: int(x[0]))),
+        sizes=dict(
+            quantiles=list(_QUANTILES),
+            width=np.quantile(sizes[:, 0], _QUANTILES).tolist() if len(sizes) else [],
+            height=np.quantile(sizes[:, 1], _QUANTILES).tolist() if len(sizes) else [],
+        ),
+        fingerprint=fingerprint,
+    )
+    if cache is not None:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        stats.save(cache)
+
+    _logger.info(
+        "Statistics of {} Images: mean {}, std {}".format(
+            stats.num_images,
+            np.round(stats.mean, 4).tolist(),
+            np.round(stats.std, 4).tolist(),
+        )
+    )
+    return stats
\ No newline at end of file
@@ -0,0 +1,335 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/05i_classification.streaming.ipynb (unless otherwise specified).
+
+__all__ = ['expand_shards', 'write_shards', 'StreamingClassificationDataset', 'register_streaming_dataset']
+
+# Cell
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import tarfile
+import urllib.request
+from typing import *
+
+import numpy as np
+import torch.distributed as dist
+from fastcore.all import Path, delegates, ifnone
+from timm.data.parsers.parser import Parser
+from torch.utils.data import IterableDataset, get_worker_info
+
+from ..utils.structures import DatasetCatalog
+from .core import ClassificationMapper, DatasetDict
+
+_logger = logging.getLogger(__name__)
+
+_IMAGE_EXTS = ("jpg", "jpeg", "png", "webp", "bmp")
+
+# name of the index written by `write_shards` with the number of samples in each shard
+_INDEX_FILE = "shards.json"
+
+# Cell
+def expand_shards(shards: Union[str, Sequence[str]]) -> List[str]:
+    """
+    Expands a brace pattern like `data/train-{0000..0099}.tar` into the list of shards.
+    A list of shards is returned as it is.
+    """
+    if not isinstance(shards, str):
+        return [str(s) for s in shards]
+    match = re.search(r"\{(\d+)\.\.(\d+)\}", shards)
+    if match is None:
+        return [shards]
+    lo, hi = match.groups()
+    prefix, suffix = shards[: match.start()], shards[match.end() :]
+    return [
+        f"{prefix}{str(i).zfill(len(lo))}{suffix}" for i in range(int(lo), int(hi) + 1)
+    ]
+
+# Cell
+def write_shards(
+    parser: Parser,
+    output_dir: str,
+    samples_per_shard: int = 1000,
+    prefix: str = "shard",
+) -> List[str]:
+    """
+    Writes the Images & targets of `parser` (a parser whose `samples` are `(path, target)`)
+    into tar shards of `samples_per_shard` samples in `output_dir`. An index with the number of
+    samples of each shard is written alongside, so that the epoch length is known exactly.
+    Returns the paths of the shards.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    num_shards = math.ceil(len(parser.samples) / samples_per_shard)
+    width = max(4, len(str(num_shards)))
+
+    def _add(tar, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+
+    shards, counts = [], {}
+    for shard_idx in range(num_shards):
+        samples = parser.samples[
+            shard_idx * samples_per_shard : (shard_idx + 1) * samples_per_shard
+        ]
+        path = output_dir / f"{prefix}-{str(shard_idx).zfill(width)}.tar"
+        with tarfile.open(path, "w") as tar:
+            for i, (file_name, target) in enumerate(samples):
+                key = f"{shard_idx * samples_per_shard + i:09d}"
+                ext = Path(file_name).suffix.lstrip(".").lower() or "jpg"
+                with open(file_name, "rb") as f:
+                    _add(tar, f"{key}.{ext}", f.read())
+                _add(tar, f"{key}.cls", str(int(target)).encode())
+        shards.append(str(path))
+        counts[path.name] = len(samples)
+
+    with open(output_dir / _INDEX_FILE, "w") as f:
+        json.dump(counts, f, indent=2)
+    _logger.info(
+        "Wrote {} samples in {} shards to {}".format(
+            len(parser.samples), num_shards, output_dir
+        )
+    )
+    return shards
+
+# Cell
+def _open_shard(shard: str) -> IO[bytes]:
+    if shard.startswith(("http://", "https://")):
+        return urllib.request.urlopen(shard)
+    return open(shard, "rb")
+
+# Cell
+def _read_shard_index(shards: List[str]) -> Optional[List[int]]:
+    # number of samples in each shard from the index written by `write_shards`, if present
+    counts = {}
+    for directory in {os.path.dirname(s) for s in shards}:
+        index = os.path.join(directory, _INDEX_FILE)
+        if not os.path.exists(index):
+            return None
+        with open(index) as f:
+            counts.update(
+                {os.path.join(directory, k): v for k, v in json.load(f).items()}
+            )
+    if not all(s in counts for s in shards):
+        return None
+    return [counts[s] for s in shards]
+
+# Cell
+class StreamingClassificationDataset(IterableDataset):
+    """
+    An `IterableDataset` which streams the samples from `shards` (local paths or http urls of
+    tar archives). The shards are assigned disjointly to the `DataLoader` workers of all the
+    distributed ranks, so every sample is seen once per epoch. The order of the shards is
+    shuffled with `seed + epoch` and the samples are shuffled within a buffer of
+    `shuffle_buffer` samples. Use `set_epoch` to change the epoch, `ClassificationTask` does
+    this at the start of every training epoch.
+
+    The shards of an epoch are split between the ranks and then between the workers of each
+    rank. The length of the dataset, used to compute the number of training steps, is the
+    number of samples of a single rank. It is taken from `epoch_length` or computed from
+    `samples_per_shard` or the index written by `write_shards`. As the ranks can get shards
+    with a different number of samples, every rank is capped at the number of samples of the
+    smallest rank of the epoch, so that all the ranks run the same number of steps. With `N`
+    workers, the last batches of the workers can be partial, so the number of batches can be
+    off by up to `N`.
+
+    The dataset can be resumed in the middle of an epoch, see `load_state_dict`.
+
+    Note: the epoch is not propagated to the workers with `persistent_workers=True`.
+    """
+
+    def __init__(
+        self,
+        shards: Union[str, Sequence[str]],
+        mapper: Callable,
+        shuffle_buffer: int = 1000,
+        shuffle_shards: bool = True,
+        seed: int = 0,
+        epoch_length: Optional[int] = None,
+        samples_per_shard: Optional[Union[int, Sequence[int]]] = None,
+    ):
+        """
+        Arguments:
+        1. `shards`: list of shards or a brace pattern, see `expand_shards`.
+        2. `mapper`: maps a `DatasetDict` whose `file_name` holds the encoded Image, typically
+        `ClassificationMapper`.
+        3. `shuffle_buffer`: size of the shuffle buffer, set to 0 to disable shuffling.
+        4. `shuffle_shards`: whether to shuffle the order of the shards every epoch.
+        5. `seed`: seed of the shard order & of the shuffle buffer.
+        6. `epoch_length`: number of samples in an epoch of a single rank.
+        7. `samples_per_shard`: number of samples in every shard, or in each shard.
+        """
+        self.shards = expand_shards(shards)
+        self.mapper = mapper
+        self.shuffle_buffer = shuffle_buffer
+        self.shuffle_shards = shuffle_shards
+        self.seed, self.epoch = seed, 0
+        # number of samples to skip of each worker, to resume an epoch
+        self.skip = None
+
+        if isinstance(samples_per_shard, int):
+            samples_per_shard = [samples_per_shard] * len(self.shards)
+        self.samples_per_shard = ifnone(
+            samples_per_shard, _read_shard_index(self.shards)
+        )
+        self.epoch_length = epoch_length
+
+    def set_epoch(self, epoch: int):
+        self.epoch, self.skip = epoch, None
+
+    def state_dict(self) -> Dict:
+        return dict(seed=self.seed, epoch=self.epoch, skip=self.skip)
+
+    def load_state_dict(self, state: Dict):
+        """
+        Loads the seed & the epoch from `state`. `skip`, if present, is the number of samples
+        each worker skips on the next iteration, to resume the epoch in the middle.
+        """
+        self.seed, self.epoch = state["seed"], state["epoch"]
+        self.skip = state.get("skip")
+
+    @staticmethod
+    def _rank_and_world_size() -> Tuple[int, int]:
+        if dist.is_available() and dist.is_initialized():
+            return dist.get_rank(), dist.get_world_size()
+        return 0, 1
+
+    def _rank_shards(self, rank: int, world_size: int) -> List[int]:
+        # the indices of the shards of `rank` for this epoch
+        order = np.arange(len(self.shards))
+        if self.shuffle_shards:
+            rng = np.random.default_rng(self.seed + self.epoch)
+            order = rng.permutation(len(self.shards))
+        return order[rank::world_size].tolist()
+
+    def rank_lengths(self) -> Optional[List[int]]:
+        "Returns the number of samples in the shards of each rank for this epoch, if known"
+        if self.samples_per_shard is None:
+            return None
+        _, world_size = self._rank_and_world_size()
+        return [
+            sum(self.samples_per_shard[i] for i in self._rank_shards(r, world_size))
+            for r in range(world_size)
+        ]
+
+    def __len__(self):
+        if self.epoch_length is not None:
+            return self.epoch_length
+        if self.samples_per_shard is None:
+            raise TypeError(
+                "Length of the dataset is unknown, pass in `epoch_length` or `samples_per_shard`"
+            )
+        return min(self.rank_lengths())
+
+    def worker_shards(self) -> List[str]:
+        "Returns the shards of the current worker of the current rank for this epoch"
+        rank, world_size = self._rank_and_world_size()
+        info = get_worker_info()
+        worker_id, num_workers = (info.id, info.num_workers) if info else (0, 1)
+
+        shards = self._rank_shards(rank, world_size)
+        if len(shards) < num_workers:
+            _logger.warning(
+                "{} shards for {} workers on rank {}, some workers will be idle".format(
+                    len(shards), num_workers, rank
+                )
+            )
+        return [self.shards[i] for i in shards[worker_id::num_workers]]
+
+    def _worker_limit(self) -> Optional[int]:
+        # number of samples the current worker yields, so that every rank yields as many
+        # samples as the smallest rank, the samples in excess are dropped by the last workers
+        lengths = self.rank_lengths()
+        if lengths is None:
+            return None
+        rank, world_size = self._rank_and_world_size()
+        info = get_worker_info()
+        worker_id, num_workers = (info.id, info.num_workers) if info else (0, 1)
+
+        shards, remaining = self._rank_shards(rank, world_size), min(lengths)
+        for w in range(num_workers):
+            count = sum(self.samples_per_shard[i] for i in shards[w::num_workers])
+            limit = min(count, remaining)
+            if w == worker_id:
+                return limit
+            remaining -= limit
+
+    def _iter_shard(self, shard: str) -> Iterator[DatasetDict]:
+        image, target, current = None, None, None
+        with _open_shard(shard) as f, tarfile.open(fileobj=f, mode="r|*") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                key, _, ext = member.name.rpartition(".")
+                if key != current:
+                    if image is not None and target is not None:
+                        yield DatasetDict(file_name=image, target=target)
+                    image, target, current = None, None, key
+                data = tar.extractfile(member).read()
+                if ext.lower() in _IMAGE_EXTS:
+                    image = data
+                elif ext == "cls":
+                    target = int(data.decode().strip())
+        if image is not None and target is not None:
+            yield DatasetDict(file_name=image, target=target)
+
+    def _shuffle(self, samples: Iterator, rng) -> Iterator:
+        buffer = []
+        for sample in samples:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            slot = rng.integers(len(buffer))
+            buffer[slot], sample = sample, buffer[slot]
+            yield sample
+        yield from (buffer[i] for i in rng.permutation(len(buffer)))
+
+    def __iter__(self):
+        rank, _ = self._rank_and_world_size()
+        info = get_worker_info()
+        worker_id = info.id if info else 0
+        rng = np.random.default_rng([self.seed, self.epoch, rank, worker_id])
+
+        shards = self.worker_shards()
+        samples = itertools.chain.from_iterable(self._iter_shard(s) for s in shards)
+        if self.shuffle_buffer > 0:
+            samples = self._shuffle(samples, rng)
+        skip = self.skip[worker_id] if self.skip is not None else 0
+        # the skipped samples are only read from the shards, not decoded
+        samples = itertools.islice(samples, skip, self._worker_limit())
+        for dataset_dict in samples:
+            yield self.mapper.encodes(dataset_dict)
+
+# Cell
+@delegates(ClassificationMapper)
+def register_streaming_dataset(
+    name: str,
+    shards: Union[str, Sequence[str]],
+    shuffle_buffer: int = 1000,
+    shuffle_shards: bool = True,
+    epoch_length: Optional[int] = None,
+    samples_per_shard: Optional[Union[int, Sequence[int]]] = None,
+    mapper: Optional[Union[ClassificationMapper, Callable]] = None,
+    **kwargs,
+):
+    """
+    Register a dataset streamed from tar `shards` (see `StreamingClassificationDataset`) to
+    DatasetCatalog. For evaluation datasets set `shuffle_buffer=0` & `shuffle_shards=False`.
+    `name` is a `str` that identifies a dataset, e.g. "coco_2014_train".
+    """
+    mapper = ifnone(mapper, ClassificationMapper(**kwargs))
+    DatasetCatalog.register(
+        name,
+        lambda: StreamingClassificationDataset(
+            shards,
+            mapper=mapper,
+            shuffle_buffer=shuffle_buffer,
+            shuffle_shards=shuffle_shards,
+            epoch_length=epoch_length,
+            samples_per_shard=samples_per_shard,
+        ),
+    )
+    _logger.info("Dataset: {} registerd to DatasetCatalog".format(name))
\ No newline at end of file
@@ -3,6 +3,7 @@
 __all__ = ['Mixup', 'predict_context', 'ClassificationTask', 'get_grid', 'show_batch']
 
 # Cell
+import contextlib
 import functools
 import logging
 from typing import *
@@ -19,13 +20,22 @@ from timm.data.mixup import Mixup, mixup_target
 from torch import nn
 
 from .augment import *
+from .cache import CachedParser
+from .compiled import compile_model
 from .core import *
 from .data import *
+from .features import build_feature_store, register_feature_store, split_frozen_model
+from .inference import build_inference_loader, eval_dataset, predict_loader
 from .model import build_model
+from .resume import *
+from .stats import compute_dataset_stats
+from ..collections.callbacks.cache import CacheStatsCallback
 from ..core_classes import BasicModule, DefaultTask
 from ..losses import build_loss
 from ..torch_utils import trainable_params
+from ..utils.cpu import ThreadPlan, apply_thread_plan, thread_plan_from_config
 from ..utils.display import *
+from ..utils.structures import DatasetCatalog
 
 _logger = logging.getLogger(__name__)
 
@@ -71,6 +81,22 @@ def predict_context(func: Callable) -> Callable:
 
     return wrapper
 
+# Cell
+def _loader_datasets(dl) -> List:
+    # datasets served by a dataloader, a list of dataloaders or a `MultiDatasetLoader`
+    if dl is None or dl is noop:
+        return []
+    if isinstance(dl, (list, tuple)):
+        return [d for loader in dl for d in _loader_datasets(loader)]
+    dataset = getattr(dl, "dataset", None)
+    return list(getattr(dataset, "datasets", [dataset]))
+
+
+def _loader_thread_plan(cfg: DictConfig, dls_conf: DictConfig) -> Optional[ThreadPlan]:
+    # the plan for the workers of a dataloader config, built from the `threads` section
+    num_workers = 0 if dls_conf.get("mode") == "thread" else dls_conf.num_workers
+    return thread_plan_from_config(cfg.get("threads"), num_workers)
+
 # Cell
 class ClassificationTask(DefaultTask):
     is_restored = True
@@ -96,6 +122,8 @@ class ClassificationTask(DefaultTask):
         self.train_loss = noop
         # Eval Loss is used for Validation / Test Datasets
         self.eval_loss = noop
+        # the head & the stages trained from cached features, see `setup_feature_cache`
+        self._feature_split, self._feature_stages = None, []
         self.setup()
 
     def setup(self, stage: Optional[str] = None):
@@ -144,19 +172,45 @@ class ClassificationTask(DefaultTask):
                 mean, std = cifar_stats
             elif self._cfg.input.mean == "mnist":
                 mean, std = mnist_stats
+            elif self._cfg.input.mean == "auto":
+                mean, std = self.setup_dataset_stats()
             else:
                 mean, std = np.array(self._cfg.input.mean), np.array(
                     self._cfg.input.std
                 )
 
+            # keep the stats consistent with the number of input channels
+            mean = match_channels(mean, self._cfg.input.channels)
+            std = match_channels(std, self._cfg.input.channels)
+
             self.mean = torch.tensor(np.array(mean)).float()
             self.std = torch.tensor(np.array(std)).float()
 
+    def setup_dataset_stats(self) -> Tuple[List[float], List[float]]:
+        """
+        Computes the mean & std of the training dataset (see `compute_dataset_stats`) with
+        the arguments in `input.stats` and sets them in the mappers of all the datasets.
+        """
+        stats = compute_dataset_stats(
+            self._cfg.datasets.train,
+            channels=self._cfg.input.channels,
+            **self._cfg.input.get("stats", {}),
+        )
+        for dl in L(self._train_dl, self._validation_dl, self._test_dl):
+            for dataset in _loader_datasets(dl):
+                mapper = getattr(dataset, "mapper", dataset)
+                if hasattr(mapper, "set_stats"):
+                    mapper.set_stats(stats.mean, stats.std)
+        return stats.mean, stats.std
+
     def forward(self, x):
         """
         Forward method: we pass in the input through the meta_arch
         to get the predictions for the current image batch
         """
+        compiled = getattr(self, "_compiled_model", None)
+        if compiled is not None:
+            return compiled(x)
         return self._model(x)
 
     def shared_step(self, batch: Any, batch_idx: int, stage: str) -> Dict:
@@ -172,20 +226,34 @@ class ClassificationTask(DefaultTask):
         # Check wether Mixup Threshold is reached and stop mixup
         # makes no sense to check in other stages; so check in
         # the training stage
+        # the batches hold the features of the frozen backbone, see `setup_feature_cache`
+        cached = stage in self._feature_stages
         if stage == "train":
             if self.mixup_off_epoch and self.current_epoch >= self.mixup_off_epoch:
                 self.mixup_fn.mixup_enabled = False
 
         # Unpack Batch
         x, y = batch
+        if x.ndim == 4 and self._model_memory_format == torch.channels_last:
+            # no-op for the batches of `channels_last_collate`
+            x = x.contiguous(memory_format=torch.channels_last)
 
         # Apply mixup in the training stage
-        if stage == "train":
+        if stage == "train" and cached:
+            # mixup & cutmix apply to Images, only the label smoothing is used
+            mixup = self.mixup_fn
+            y_mix = mixup_target(
+                y, mixup.num_classes, 1.0, mixup.label_smoothing, y.device
+            )
+        elif stage == "train":
             # NOTE: This converts the targets into 1 hot vectores
             x, y_mix = self.mixup_fn(x, y)
 
         # calculate the logits
-        y_hat = self(x)
+        with self.autocast():
+            y_hat = self._feature_split.head(x) if cached else self(x)
+        # the losses & the metrics are computed in fp32
+        y_hat = y_hat.float()
 
         # Comput Loss
         if stage == "train":
@@ -209,6 +277,81 @@ class ClassificationTask(DefaultTask):
         output = dict(loss=loss, logs=logs)
         return output
 
+    def on_fit_start(self):
+        # the backbone runs on the device of the model, which is set once the fit starts
+        if self._cfg.get("feature_cache", {}).get("enabled", False):
+            if self._feature_split is None:
+                self.setup_feature_cache()
+
+    def on_train_epoch_start(self):
+        # resume the epoch interrupted by a checkpoint at the next sample
+        state, self._data_state = getattr(self, "_data_state", None), None
+        if start_train_epoch(self.trainer, self._train_dl, state):
+            self._samples_seen = state["samples_seen"]
+            self._batches_seen = state["batches_seen"]
+            _logger.info(
+                f"Resuming epoch {self.current_epoch} after {self._samples_seen} samples"
+            )
+            return
+
+        self._samples_seen, self._batches_seen = 0, 0
+
+    def on_train_batch_start(self, batch, batch_idx, dataloader_idx):
+        # counted before the step, the checkpoints saved by callbacks at the end of the batch
+        # include it
+        self._samples_seen += len(batch[0])
+        self._batches_seen += 1
+
+    def autocast(self):
+        """
+        Returns the autocast context of `training.precision`: with `bf16` the ops run under
+        autocast in bfloat16 on the device of the model (e.g. on CPUs with bf16 support), with
+        `fp32` autocast is disabled. The weights & the optimizer states are kept in fp32.
+        `bf16` requires torch>=1.10, which has `torch.autocast` for all the devices.
+        """
+        precision = self._cfg.training.get("precision", "fp32")
+        assert precision in ("fp32", "bf16"), f"Unknown precision: {precision}"
+        if precision == "fp32":
+            return contextlib.nullcontext()
+        if not hasattr(torch, "autocast"):
+            raise RuntimeError(
+                f"precision: bf16 requires torch>=1.10, found torch=={torch.__version__}"
+            )
+        return torch.autocast(self.device.type, dtype=torch.bfloat16)
+
+    @property
+    def _model_memory_format(self) -> torch.memory_format:
+        memory_format = self._cfg.input.get("memory_format", "contiguous")
+        return getattr(torch, memory_format, torch.contiguous_format)
+
+    def on_save_checkpoint(self, checkpoint: Dict[str, Any]):
+        # the weights are saved in the default layout, so checkpoints do not depend on the
+        # memory format of the model
+        if self._model_memory_format != torch.contiguous_format:
+            checkpoint["state_dict"] = {
+                k: v.contiguous() if isinstance(v, torch.Tensor) else v
+                for k, v in checkpoint["state_dict"].items()
+            }
+        # position of the training data in the current epoch, see `data_pipeline_state`
+        if self._train_dl is not noop:
+            state = data_pipeline_state(
+                self._train_dl,
+                getattr(self, "_samples_seen", 0),
+                getattr(self, "_batches_seen", 0),
+            )
+            state["mixup_enabled"] = self.mixup_fn.mixup_enabled
+            checkpoint["data_state"] = state
+        # the stats are needed to run the model without the task, see `load_model_from_checkpoint`
+        if hasattr(self, "mean"):
+            checkpoint["normalization"] = dict(
+                mean=self.mean.tolist(), std=self.std.tolist()
+            )
+
+    def on_load_checkpoint(self, checkpoint: Dict[str, Any]):
+        self._data_state = load_data_pipeline_state(checkpoint)
+        if self._data_state is not None and hasattr(self, "mixup_fn"):
+            self.mixup_fn.mixup_enabled = self._data_state["mixup_enabled"]
+
     def setup_model(self, args: DictConfig = None):
         """
         Builds up the meta architecture. You can also additionally pass in args to configure
@@ -216,8 +359,17 @@ class ClassificationTask(DefaultTask):
         """
         conf = ifnone(args, self._cfg)
         meta_arch = build_model(conf)
+        if conf.input.get("memory_format", "contiguous") == "channels_last":
+            # NHWC convolutions are faster with oneDNN on CPUs & with cudnn on tensor cores
+            meta_arch = meta_arch.to(memory_format=torch.channels_last)
+            _logger.info("Using the channels_last memory format")
         self._model = meta_arch
 
+        # the compiled model shares the parameters of the eager model
+        self._compiled_model = None
+        if conf.get("compile", {}).get("enabled", False):
+            self._compiled_model = compile_model(meta_arch, conf)
+
     @property
     def param_dicts(self):
         """Returns the paramters for model optimization"""
@@ -234,7 +386,23 @@ class ClassificationTask(DefaultTask):
         """
         name = ifnone(name, self._cfg.datasets.train)
         conf = ifnone(dls_conf, self._cfg.dataloader.train)
-        self._train_dl = build_classification_loader_from_config(name, conf)
+
+        # split the cpu cores between the main process and the dataloader workers
+        self.thread_plan = _loader_thread_plan(self._cfg, conf)
+        if self.thread_plan is not None:
+            apply_thread_plan(self.thread_plan)
+            _logger.info(f"CPU thread plan:\n{self.thread_plan}")
+
+        self._train_dl = build_classification_loader_from_config(
+            name, conf, self.thread_plan
+        )
+
+        mapper = getattr(self._train_dl.dataset, "mapper", None)
+        channels = getattr(mapper, "channels", self._cfg.input.channels)
+        if channels != self._cfg.input.channels:
+            _logger.warning(
+                f"Mapper of {name} loads Images with {channels} channels but input.channels is {self._cfg.input.channels}"
+            )
 
     def setup_validation_data(
         self, name: Union[List, str] = None, dls_conf: DictConfig = None
@@ -247,11 +415,20 @@ class ClassificationTask(DefaultTask):
         if name is None:
             self._validation_dl = None
         else:
+            plan = _loader_thread_plan(self._cfg, conf)
             if isinstance(name, list) or isinstance(name, ListConfig):
                 names = list(name)
-                dls = [build_classification_loader_from_config(n, conf) for n in names]
+                if conf.get("shared_workers", False):
+                    # one pool of workers for all the datasets
+                    loader = build_classification_loader_from_config(names, conf, plan)
+                    dls = loader.dataloaders
+                else:
+                    dls = [
+                        build_classification_loader_from_config(n, conf, plan)
+                        for n in names
+                    ]
             elif isinstance(name, str):
-                dls = build_classification_loader_from_config(name, conf)
+                dls = build_classification_loader_from_config(name, conf, plan)
             else:
                 _logger.warning(
                     "Validation dataset name format not understood. Must either be str or List."
@@ -270,11 +447,20 @@ class ClassificationTask(DefaultTask):
         if name is None:
             self._test_dl = None
         else:
+            plan = _loader_thread_plan(self._cfg, conf)
             if isinstance(name, list) or isinstance(name, ListConfig):
                 names = list(name)
-                dls = [build_classification_loader_from_config(n, conf) for n in names]
+                if conf.get("shared_workers", False):
+                    # one pool of workers for all the datasets
+                    loader = build_classification_loader_from_config(names, conf, plan)
+                    dls = loader.dataloaders
+                else:
+                    dls = [
+                        build_classification_loader_from_config(n, conf, plan)
+                        for n in names
+                    ]
             elif isinstance(name, str):
-                dls = build_classification_loader_from_config(name, conf)
+                dls = build_classification_loader_from_config(name, conf, plan)
             else:
                 _logger.warning(
                     "Test dataset name format not understood. Must either be str or List"
@@ -297,6 +483,7 @@ class ClassificationTask(DefaultTask):
     def model(self, m: BasicModule):
         assert isinstance(m, BasicModule)
         self._model = m
+        self._compiled_model = None
 
     def predict_step(self, batch: Any, batch_idx: int, dataloader_idx: int = 0) -> Any:
         if isinstance(batch, tuple):
@@ -323,6 +510,154 @@ class ClassificationTask(DefaultTask):
         preds = L(p for p in preds.data.cpu().numpy())
         return ims, targs, preds
 
+# Cell
+@patch
+def eval_mapper(self: ClassificationTask) -> ClassificationMapper:
+    """
+    Returns a `ClassificationMapper` with the deterministic eval transforms of the task:
+    resize & center crop to the input size and normalization with the stats of the task.
+    """
+    height, width = self._cfg.input.height, self._cfg.input.width
+    mean, std = getattr(self, "mean", None), getattr(self, "std", None)
+    if mean is None:
+        mean, std = imagenet_stats
+    size = height if height == width else (height, width)
+    return ClassificationMapper(
+        augmentations=imagenet_no_augment_transform(size),
+        mean=np.array(mean).tolist(),
+        std=np.array(std).tolist(),
+        channels=self._cfg.input.channels,
+    )
+
+# Cell
+@patch
+def setup_feature_cache(self: ClassificationTask, conf: DictConfig = None):
+    """
+    Trains only the head of the model from the features of its frozen backbone, see
+    `split_frozen_model`. The backbone is run once over the training dataset (and the
+    validation datasets if `conf.valid`) with the deterministic transforms of `eval_mapper`,
+    the features are cached in a `FeatureStore` and the dataloaders of these datasets are
+    replaced by loaders over the stores. `conf` defaults to `feature_cache` of the config.
+
+    Called in `on_fit_start` if `feature_cache.enabled`, once the model is on its device. In
+    distributed training the stores are built by the first process, the other processes wait
+    for it and load the stores from the cache, so `cache_dir` must be shared by the processes.
+
+    Note: The training Images are not augmented and the frozen backbone runs in eval mode,
+    i.e the statistics of its batchnorm layers are not updated.
+    """
+    conf = ifnone(conf, self._cfg.feature_cache)
+    split = split_frozen_model(self._model, pooled=conf.get("pooled", True))
+    if split is None:
+        _logger.warning(
+            "feature_cache requires a model with a frozen backbone, training on the Images"
+        )
+        return
+
+    mapper = self.eval_mapper()
+
+    def _store(name: str, dls_conf: DictConfig):
+        return build_feature_store(
+            split.extractor,
+            name,
+            mapper,
+            cache_dir=conf.get("cache_dir", None),
+            dtype=conf.get("dtype", "float16"),
+            batch_size=conf.get("batch_size", 64),
+            num_workers=dls_conf.num_workers,
+        )
+
+    datasets = [(self._cfg.datasets.train, self._cfg.dataloader.train)]
+    valid = self._cfg.datasets.valid
+    cache_valid = conf.get("valid", True) and valid is not None
+    if cache_valid:
+        names = valid if isinstance(valid, (list, ListConfig)) else [valid]
+        datasets += [(n, self._cfg.dataloader.valid) for n in names]
+
+    trainer = getattr(self, "trainer", None)
+    stores = {}
+    if trainer is None or trainer.is_global_zero:
+        stores = {name: _store(name, dls_conf) for name, dls_conf in datasets}
+    if trainer is not None:
+        # the other processes load the stores written by the first one from the cache
+        trainer.accelerator.barrier("feature_cache")
+
+    def _loader(name: str, dls_conf: DictConfig):
+        store = stores[name] if name in stores else _store(name, dls_conf)
+        features_name = f"{name}_features"
+        if features_name in DatasetCatalog:
+            DatasetCatalog.remove(features_name)
+        register_feature_store(features_name, store.path)
+        plan = _loader_thread_plan(self._cfg, dls_conf)
+        return build_classification_loader_from_config(features_name, dls_conf, plan)
+
+    self._train_dl = _loader(self._cfg.datasets.train, self._cfg.dataloader.train)
+    stages = ["train"]
+
+    if cache_valid:
+        if isinstance(valid, (list, ListConfig)):
+            self._validation_dl = [
+                _loader(n, self._cfg.dataloader.valid) for n in valid
+            ]
+        else:
+            self._validation_dl = _loader(valid, self._cfg.dataloader.valid)
+        stages.append("validation")
+
+    if self.mixup_fn.mixup_alpha > 0 or self.mixup_fn.cutmix_alpha > 0:
+        _logger.warning("mixup & cutmix are not applied to the cached features")
+    self._feature_split, self._feature_stages = split, stages
+    _logger.info("Training the head from the cached features of the backbone")
+
+# Cell
+@patch
+def configure_callbacks(self: ClassificationTask) -> List[pl.Callback]:
+    """
+    Adds a `CacheStatsCallback` which logs the hit-rates of the cache if the training dataset is
+    served by a `CachedParser`, see `register_cached_dataset`.
+    """
+    parser = getattr(getattr(self._train_dl, "dataset", None), "parser", None)
+    return [CacheStatsCallback()] if isinstance(parser, CachedParser) else []
+
+# Cell
+@patch
+def predict_dataset(
+    self: ClassificationTask,
+    dataset: Union[str, Sequence[str], torch.utils.data.Dataset],
+    output: str = "logits",
+    topk: int = 5,
+    batch_size: int = 64,
+    num_workers: int = 0,
+    mode: str = "process",
+    num_threads: int = 8,
+    mapper: Optional[ClassificationMapper] = None,
+) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Runs batched inference on `dataset` (a dataset registered in DatasetCatalog, a dataset
+    or a list of file paths) and returns NumPy arrays with the `output` for every Image,
+    in the order of the dataset. `output` is one of `logits`, `probs`, `topk` (a tuple of
+    the `topk` probabilities & class indices) or `embeddings`, see `iter_predictions`.
+
+    The Images are decoded in `num_workers` processes (or `num_threads` threads if `mode` is
+    `thread`) with the transforms of `mapper`, by default `eval_mapper`.
+    """
+    dataset = eval_dataset(dataset, ifnone(mapper, self.eval_mapper()))
+    loader = build_inference_loader(
+        dataset,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        mode=mode,
+        num_threads=num_threads,
+        pin_memory=self.device.type == "cuda",
+    )
+    return predict_loader(self, loader, output=output, topk=topk, device=self.device)
+
+# Cell
+@patch
+@delegates(ClassificationTask.predict_dataset, but=["dataset"])
+def predict_paths(self: ClassificationTask, paths: Sequence[str], **kwargs):
+    "Same as `predict_dataset` for the Images at `paths`"
+    return self.predict_dataset(list(paths), **kwargs)
+
 # Cell
 @delegates(subplots)
 def get_grid(
@@ -0,0 +1,42 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/07c_collections.callbacks.cache.ipynb (unless otherwise specified).
+
+__all__ = ['CacheStatsCallback']
+
+# Cell
+import logging
+
+from pytorch_lightning.callbacks import Callback
+
+from ...utils.logger import log_main_process
+
+_logger = logging.getLogger(__name__)
+
+# Cell
+class CacheStatsCallback(Callback):
+    """
+    Logs the hit-rates of the `CachedParser` used by the training dataset at the end
+    of every training epoch, both to the console and to the Lightning loggers.
+    """
+
+    def __init__(self, reset_every_epoch: bool = True):
+        self.reset_every_epoch = reset_every_epoch
+
+    def _find_parser(self, pl_module):
+        loader = getattr(pl_module, "_train_dl", None)
+        parser = getattr(getattr(loader, "dataset", None), "parser", None)
+        return parser if hasattr(parser, "stats") else None
+
+    def on_train_epoch_end(self, trainer, pl_module, *args):
+        parser = self._find_parser(pl_module)
+        if parser is None:
+            return
+
+        stats = parser.stats()
+        pl_module.log_dict({f"cache/{k}": float(v) for k, v in stats.items()})
+        msg = "Cache hit-rate: {:.2%} (ram: {:.2%}, disk: {:.2%})".format(
+            stats["hit_rate"], stats["ram_hit_rate"], stats["disk_hit_rate"]
+        )
+        log_main_process(_logger, logging.INFO, msg)
+
+        if self.reset_every_epoch:
+            parser.reset_stats()
\ No newline at end of file
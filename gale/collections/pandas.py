@@ -1,14 +1,16 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/07_collections.pandas.ipynb (unless otherwise specified).
 
 __all__ = ['folder2df', 'split_dataframe_into_stratified_folds', 'get_dataframe_fold', 'get_dataset_labeling',
-           'dataframe_labels_2_int', 'split_dataframe_train_test']
+           'dataframe_labels_2_int', 'split_dataframe_train_test', 'hash_split', 'split_manifest_train_test']
 
 # Cell
+import hashlib
 import logging
 import os
 import random
-from typing import Union
+from typing import Dict, Iterator, Mapping, Optional, Union
 
+import numpy as np
 import pandas as pd
 from fastcore.all import L, Path, delegates, ifnone
 from sklearn.model_selection import StratifiedKFold, train_test_split
@@ -141,4 +143,118 @@ def split_dataframe_train_test(dataframe: pd.DataFrame, **kwargs):
     """
     data = dataframe.copy()
     df_train, df_test = train_test_split(data, **kwargs)
-    return df_train, df_test
\ No newline at end of file
+    return df_train, df_test
+
+# Cell
+def _stable_hash(key: str, seed: int) -> float:
+    # blake2b is stable across processes & python versions, unlike `hash`
+    digest = hashlib.blake2b(f"{seed}:{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2 ** 64
+
+
+def hash_split(
+    dataframe: pd.DataFrame,
+    key_column: str,
+    test_size: Union[float, Mapping] = 0.2,
+    label_column: Optional[str] = None,
+    seed: int = 42,
+) -> pd.Series:
+    """
+    Assigns every row of `dataframe` to the `train` or `test` split from a stable hash of
+    `key_column`, the assignment of a row never depends on the other rows. `test_size`
+    is the fraction of rows in `test`, or if `label_column` is given a mapping from the
+    labels to the fraction of their rows in `test` (per-class quotas, the missing labels
+    use the value of the key `"default"` or 0.2). Returns a `Series` with the splits.
+    """
+    u = np.array([_stable_hash(str(k), seed) for k in dataframe[key_column]])
+    if isinstance(test_size, Mapping):
+        assert label_column is not None, "per-class quotas require `label_column`"
+        default = test_size.get("default", 0.2)
+        labels = dataframe[label_column].astype(str)
+        quotas = {str(k): v for k, v in test_size.items()}
+        fractions = labels.map(lambda x: quotas.get(x, default)).to_numpy(float)
+    else:
+        fractions = np.full(len(dataframe), test_size)
+    return pd.Series(
+        np.where(u < fractions, "test", "train"), index=dataframe.index, name="split"
+    )
+
+# Cell
+def _read_chunks(path: Path, chunksize: int, **kwargs) -> Iterator[pd.DataFrame]:
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, **kwargs):
+            yield batch.to_pandas()
+    elif path.suffix == ".csv":
+        yield from pd.read_csv(path, chunksize=chunksize, **kwargs)
+    else:
+        raise ValueError(f"Unsupported manifest format: {path.suffix}")
+
+
+class _ChunkWriter:
+    # appends DataFrame chunks to a csv or a parquet file
+    def __init__(self, path: Path):
+        self.path, self.writer, self.num_rows = path, None, 0
+
+    def write(self, chunk: pd.DataFrame):
+        if self.path.suffix == ".parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            # all the chunks are cast to the schema of the first one
+            schema = self.writer.schema if self.writer is not None else None
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            header = self.num_rows == 0
+            chunk.to_csv(self.path, mode="w" if header else "a", header=header, index=False)
+        self.num_rows += len(chunk)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+# Cell
+def split_manifest_train_test(
+    path: Union[str, Path],
+    output_dir: Union[str, Path],
+    key_column: str,
+    test_size: Union[float, Mapping] = 0.2,
+    label_column: Optional[str] = None,
+    seed: int = 42,
+    chunksize: int = 100_000,
+) -> Dict[str, Path]:
+    """
+    Splits the csv or parquet manifest at `path` into `train` & `test` manifests in
+    `output_dir`, with the same format as `path`. The manifest is streamed in chunks of
+    `chunksize` rows, so it is never held in memory as a whole.
+
+    The rows are assigned with `hash_split`, so a row always lands in the same split, also
+    after new rows are added to the manifest. Returns the paths of the splits.
+    """
+    path, output_dir = Path(path), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    writers = {
+        split: _ChunkWriter(output_dir / f"{path.stem}_{split}{path.suffix}")
+        for split in ("train", "test")
+    }
+    try:
+        for chunk in _read_chunks(path, chunksize):
+            splits = hash_split(chunk, key_column, test_size, label_column, seed)
+            for split, writer in writers.items():
+                part = chunk[splits == split]
+                if len(part) or writer.num_rows == 0:
+                    writer.write(part)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    _logger.info(
+        "Split {} into {} train and {} test rows".format(
+            path, writers["train"].num_rows, writers["test"].num_rows
+        )
+    )
+    return {split: writer.path for split, writer in writers.items()}
\ No newline at end of file
@@ -20,7 +20,7 @@ from torch.nn import Module
 
 from .optimizer import OPTIM_REGISTRY
 from .schedules import SCHEDULER_REGISTRY
-from .torch_utils import trainable_params
+from .torch_utils import fuse_inference_layers, trainable_params
 from .utils.logger import log_main_process
 
 _logger = logging.getLogger(__name__)
@@ -143,6 +143,25 @@ class BasicModule(Module, Configurable, metaclass=ABCMeta):
         for o in self.all_params(slice(None, n)):
             self._set_require_grad(False, o)
 
+    def fuse_for_inference(self) -> "BasicModule":
+        """
+        Returns an equivalent copy of the module in eval mode for inference: the batchnorm
+        layers are folded into the adjacent conv or linear layers and the dropout layers are
+        removed. The copy should not be used for training.
+        """
+        module = copy.deepcopy(self).eval()
+        for m in list(module.modules()):
+            if isinstance(m, BasicModule):
+                m._fuse_modules()
+        return fuse_inference_layers(module)
+
+    def _fuse_modules(self) -> None:
+        """
+        Folds the layers which are not in a `nn.Sequential` (those are handled by
+        `fuse_inference_layers`) in place, called by `fuse_for_inference`.
+        """
+        pass
+
     @contextmanager
     def as_frozen(self):
         """
@@ -523,9 +542,11 @@ class DefaultTask(pl.LightningModule):
     ):
         self._metrics = setup_metrics(metrics)
 
-    def num_training_steps(self) -> int:
+    def num_training_steps(self) -> Tuple[int, int]:
         """
-        Total training steps inferred from train dataloader and devices.
+        Total optimizer steps & optimizer steps per epoch inferred from the train dataloader,
+        the devices and the gradient accumulation. With `accumulate_grad_batches` the optimizer
+        steps once every `accumulate_grad_batches` batches and on the last batch of the epoch.
         """
         if (
             isinstance(self._trainer.limit_train_batches, int)
@@ -543,14 +564,20 @@ class DefaultTask(pl.LightningModule):
         if self._trainer.tpu_cores:
             num_devices = max(num_devices, self._trainer.tpu_cores)
 
-        effective_batch_size = self._trainer.accumulate_grad_batches * num_devices
-        max_estimated_steps = (
-            dataset_size // effective_batch_size
-        ) * self._trainer.max_epochs
-
-        if self._trainer.max_steps and self._trainer.max_steps < max_estimated_steps:
-            return self._trainer.max_steps
-        return max_estimated_steps, dataset_size
+        accumulate = self._trainer.accumulate_grad_batches
+        if isinstance(accumulate, Mapping):
+            # accumulation scheduled by epoch, the smallest factor gives an upper bound
+            accumulate = min(accumulate.values())
+        batches_per_device = math.ceil(dataset_size / num_devices)
+        steps_per_epoch = max(1, math.ceil(batches_per_device / max(1, accumulate)))
+
+        max_steps = self._trainer.max_steps
+        if self._trainer.max_epochs is None:
+            return max_steps, steps_per_epoch
+        max_estimated_steps = steps_per_epoch * self._trainer.max_epochs
+        if max_steps and 0 < max_steps < max_estimated_steps:
+            return max_steps, steps_per_epoch
+        return max_estimated_steps, steps_per_epoch
 
     @property
     def param_dicts(self) -> Union[Iterator, List[Dict]]:
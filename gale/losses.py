@@ -49,7 +49,8 @@ class LabelSmoothingCrossEntropy(nn.Module):
         - Output: scalar. If `reduction` is `none`, then $(N, *)$ , same shape as input.
         """
         c = input.size()[1]
-        log_preds = F.log_softmax(input, dim=1)
+        # computed in fp32, reduced precision logits (e.g. under autocast) are upcast
+        log_preds = F.log_softmax(input.float(), dim=1)
         if self.reduction == "sum":
             loss = -log_preds.sum()
         else:
@@ -87,6 +88,8 @@ class BinarySigmoidFocalLoss(nn.Module):
         - Target: : $(N, *)$, same shape as the input.
         - Output: scalar. If `reduction` is 'none', then $(N, *)$ , same shape as input.
         """
+        # computed in fp32, reduced precision logits (e.g. under autocast) are upcast
+        input, target = input.float(), target.float()
         loss = sigmoid_focal_loss(input, target, self.gamma, self.alpha, self.reduction)
         return loss
 
@@ -133,8 +136,9 @@ class FocalLoss(nn.Module):
 
         n = input.size(0)
 
-        # compute softmax over the classes axis
-        softmax_inputs: Tensor = F.softmax(input, dim=1) + self.eps
+        # compute softmax over the classes axis, in fp32 as `eps` & `log` of small
+        # probabilities are not representable in reduced precision
+        softmax_inputs: Tensor = F.softmax(input.float(), dim=1) + self.eps
 
         # create the labels one hot tensor
         one_hot_targs: Tensor = maybe_convert_to_onehot(target, softmax_inputs)
@@ -0,0 +1,132 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/08_runtime.ipynb (unless otherwise specified).
+
+__all__ = ['METADATA_FILE', 'ExportedModel', 'benchmark_latency']
+
+# Cell
+import json
+import os
+import time
+from typing import *
+
+import numpy as np
+from PIL import Image
+
+# name of the metadata written next to the exported graphs
+METADATA_FILE = "metadata.json"
+
+# Cell
+class ExportedModel:
+    """
+    Runs an exported graph (`.onnx` with onnxruntime or `.pt` TorchScript with torch) on CPU.
+    The graph takes float32 Images of shape `(N, C, H, W)` with pixel values in [0, 1], the
+    normalization is folded into the graph, and returns the logits.
+
+    The preprocessing (resize & center crop) is read from the metadata written by the exporter
+    in the same directory, see `preprocess`.
+    """
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        self.path = str(path)
+        metadata = os.path.join(os.path.dirname(self.path), METADATA_FILE)
+        self.metadata = {}
+        if os.path.exists(metadata):
+            with open(metadata) as f:
+                self.metadata = json.load(f)
+
+        if self.path.endswith(".onnx"):
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            if num_threads is not None:
+                options.intra_op_num_threads = num_threads
+            self.session = ort.InferenceSession(
+                self.path, options, providers=["CPUExecutionProvider"]
+            )
+            self.input_name = self.session.get_inputs()[0].name
+            self.backend = "onnxruntime"
+        else:
+            import torch
+
+            if num_threads is not None:
+                torch.set_num_threads(num_threads)
+            self.module = torch.jit.load(self.path, map_location="cpu").eval()
+            self.backend = "torchscript"
+
+    def __call__(self, images: np.ndarray) -> np.ndarray:
+        "Returns the logits for a float32 batch of Images of shape `(N, C, H, W)`"
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        if self.backend == "onnxruntime":
+            return self.session.run(None, {self.input_name: images})[0]
+
+        import torch
+
+        with torch.no_grad():
+            return self.module(torch.from_numpy(images)).numpy()
+
+    def preprocess(self, paths: Sequence[str]) -> np.ndarray:
+        """
+        Loads the Images at `paths` and applies the eval transforms of gale: for square
+        inputs the shorter side is resized to the input size and the center is cropped,
+        else the Images are resized to the input size. Returns a float32 batch of shape
+        `(N, C, H, W)` in [0, 1].
+        """
+        channels, height, width = self.metadata["input_shape"]
+        mode = "L" if channels == 1 else "RGB"
+        batch = []
+        for path in paths:
+            with Image.open(path) as im:
+                im = im.convert(mode)
+                if height == width:
+                    # same rounding as `torchvision.transforms.Resize` & `CenterCrop`
+                    w, h = im.size
+                    if w <= h:
+                        size = (width, int(width * h / w))
+                    else:
+                        size = (int(height * w / h), height)
+                else:
+                    size = (width, height)
+                im = im.resize(size, Image.BILINEAR)
+                left = int(round((size[0] - width) / 2.0))
+                top = int(round((size[1] - height) / 2.0))
+                im = im.crop((left, top, left + width, top + height))
+                image = np.asarray(im, dtype=np.float32) / 255.0
+            batch.append(image.reshape(height, width, -1).transpose(2, 0, 1))
+        return np.stack(batch)
+
+    def predict_paths(self, paths: Sequence[str]) -> np.ndarray:
+        "Returns the logits for the Images at `paths`"
+        return self(self.preprocess(paths))
+
+    def __repr__(self):
+        return f"ExportedModel(path={self.path}, backend={self.backend})"
+
+# Cell
+def benchmark_latency(
+    fn: Callable[[np.ndarray], Any],
+    input_shape: Sequence[int],
+    batch_sizes: Sequence[int] = (1, 8, 32),
+    num_iters: int = 20,
+    warmup: int = 3,
+) -> Dict[int, Dict[str, float]]:
+    """
+    Measures the latency of `fn` on random float32 batches of Images of shape `input_shape`
+    (`C, H, W`) for every batch size. Returns the median & 90th percentile latency in
+    milliseconds and the Images/s of each batch size.
+    """
+    results = {}
+    for batch_size in batch_sizes:
+        x = np.random.rand(batch_size, *input_shape).astype(np.float32)
+        for _ in range(warmup):
+            fn(x)
+        times = []
+        for _ in range(num_iters):
+            tick = time.perf_counter()
+            fn(x)
+            times.append(time.perf_counter() - tick)
+        p50, p90 = np.percentile(times, [50, 90]) * 1000
+        results[batch_size] = {
+            "p50_ms": float(p50),
+            "p90_ms": float(p90),
+            "images/s": batch_size / float(np.median(times)),
+        }
+    return results
\ No newline at end of file
@@ -1,9 +1,11 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/01_torch_utils.ipynb (unless otherwise specified).
 
 __all__ = ['norm_types', 'bn_types', 'init_default', 'cond_init', 'apply_leaf', 'apply_init', 'set_bn_eval',
-           'trainable_params', 'params', 'maybe_convert_to_onehot', 'worker_init_fn', 'build_discriminative_lrs']
+           'trainable_params', 'params', 'maybe_convert_to_onehot', 'worker_init_fn', 'build_discriminative_lrs',
+           'conv_types', 'dropout_types', 'fuse_conv_bn', 'fuse_bn_linear', 'fuse_inference_layers']
 
 # Cell
+import copy
 from functools import partial
 from typing import *
 
@@ -142,4 +144,82 @@ def build_discriminative_lrs(
 
     for v_, p in zip(lrs, param_list):
         p["lr"] = v_
-    return param_list, list(lrs)
\ No newline at end of file
+    return param_list, list(lrs)
+
+# Cell
+conv_types = (nn.Conv1d, nn.Conv2d, nn.Conv3d)
+dropout_types = (nn.Dropout, nn.Dropout2d, nn.Dropout3d, nn.AlphaDropout)
+
+
+def _bn_scale_shift(bn: nn.Module) -> Tuple[torch.Tensor, torch.Tensor]:
+    # eval mode batchnorm is an affine op: `x * scale + shift`
+    assert bn.running_var is not None, "Only batchnorm with running stats can be folded"
+    weight = bn.weight if bn.affine else torch.ones_like(bn.running_var)
+    bias = bn.bias if bn.affine else torch.zeros_like(bn.running_mean)
+    scale = weight / torch.sqrt(bn.running_var + bn.eps)
+    return scale, bias - bn.running_mean * scale
+
+# Cell
+@torch.no_grad()
+def fuse_conv_bn(conv: nn.Module, bn: nn.Module) -> nn.Module:
+    """
+    Returns a copy of the conv or linear layer `conv` with the batchnorm `bn` which follows it
+    folded into its weight & bias, i.e. `bn(conv(x)) == fused(x)` in eval mode.
+    """
+    scale, shift = _bn_scale_shift(bn)
+    fused = copy.deepcopy(conv)
+    shape = (-1,) + (1,) * (conv.weight.dim() - 1)
+    fused.weight.copy_(conv.weight * scale.view(shape))
+    bias = conv.bias if conv.bias is not None else torch.zeros_like(shift)
+    fused.bias = nn.Parameter(bias * scale + shift)
+    return fused
+
+
+@torch.no_grad()
+def fuse_bn_linear(bn: nn.BatchNorm1d, linear: nn.Linear) -> nn.Linear:
+    """
+    Returns a copy of `linear` with the batchnorm `bn` which precedes it folded into its
+    weight & bias, i.e. `linear(bn(x)) == fused(x)` in eval mode for inputs of shape `(N, C)`.
+    """
+    scale, shift = _bn_scale_shift(bn)
+    fused = copy.deepcopy(linear)
+    fused.weight.copy_(linear.weight * scale.view(1, -1))
+    bias = linear.bias if linear.bias is not None else 0.0
+    fused.bias = nn.Parameter(bias + linear.weight @ shift)
+    return fused
+
+# Cell
+def fuse_inference_layers(m: nn.Module) -> nn.Module:
+    """
+    Folds the batchnorm layers in the `nn.Sequential`s of `m` into the preceding conv or linear
+    layers, or into the following linear layer, and replaces the dropout layers with
+    `nn.Identity`. Modifies `m` in place, which should be in eval mode.
+    """
+    for name, child in m.named_children():
+        if isinstance(child, dropout_types):
+            setattr(m, name, nn.Identity())
+        else:
+            fuse_inference_layers(child)
+
+    if not isinstance(m, nn.Sequential):
+        return m
+
+    layers = []
+    for layer in m:
+        prev = layers[-1] if layers else None
+        if isinstance(layer, nn.Identity):
+            continue
+        elif type(layer) in bn_types and isinstance(prev, conv_types):
+            layers[-1] = fuse_conv_bn(prev, layer)
+        elif type(layer) == nn.BatchNorm1d and isinstance(prev, nn.Linear):
+            layers[-1] = fuse_conv_bn(prev, layer)
+        elif isinstance(layer, nn.Linear) and type(prev) == nn.BatchNorm1d:
+            layers[-1] = fuse_bn_linear(prev, layer)
+        else:
+            layers.append(layer)
+
+    for name in list(m._modules):
+        del m._modules[name]
+    for idx, layer in enumerate(layers):
+        m.add_module(str(idx), layer)
+    return m
\ No newline at end of file
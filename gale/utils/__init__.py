@@ -3,5 +3,6 @@ from .activs import *
 from .logger import *
 from .shape_spec import ShapeSpec
 from .display import *
+from .cpu import *
 
 __all__ = [k for k in globals().keys() if not k.startswith("_")]
\ No newline at end of file
@@ -0,0 +1,206 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/00c_utils.cpu.ipynb (unless otherwise specified).
+
+__all__ = ['available_cpus', 'numa_nodes', 'ThreadPlan', 'build_thread_plan', 'apply_thread_plan',
+           'thread_plan_worker_init_fn', 'thread_plan_from_config']
+
+# Cell
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import *
+
+import torch
+from fastcore.all import ifnone
+from omegaconf import DictConfig
+
+from ..torch_utils import worker_init_fn
+
+_logger = logging.getLogger(__name__)
+
+# environment variables read by OpenMP & the BLAS libraries when their thread pools are created
+_THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+# Cell
+def available_cpus() -> List[int]:
+    "Returns the ids of the CPU cores the current process is allowed to run on"
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+# Cell
+def _parse_cpulist(cpulist: str) -> List[int]:
+    # parses the kernel cpulist format, e.g. "0-3,8-11"
+    cpus = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+# Cell
+def numa_nodes() -> List[List[int]]:
+    """
+    Returns the CPU cores of each NUMA node, read from sysfs. On systems without NUMA
+    information all the available cores are returned as a single node.
+    """
+    root = "/sys/devices/system/node"
+    nodes = []
+    if os.path.isdir(root):
+        names = [
+            n for n in os.listdir(root) if n.startswith("node") and n[4:].isdigit()
+        ]
+        for name in sorted(names, key=lambda n: int(n[4:])):
+            with open(os.path.join(root, name, "cpulist")) as f:
+                nodes.append(_parse_cpulist(f.read()))
+    return nodes or [available_cpus()]
+
+# Cell
+def _format_cpulist(cpus: List[int]) -> str:
+    # inverse of `_parse_cpulist`, e.g. [0, 1, 2, 3, 8] -> "0-3,8"
+    ranges, start = [], None
+    for i, cpu in enumerate(cpus):
+        if start is None:
+            start = cpu
+        if i + 1 == len(cpus) or cpus[i + 1] != cpu + 1:
+            ranges.append(str(start) if start == cpu else f"{start}-{cpu}")
+            start = None
+    return ",".join(ranges)
+
+# Cell
+@dataclass
+class ThreadPlan:
+    """
+    Number of intra-op threads & the CPU cores of the main process and of each `DataLoader`
+    worker. Empty `cpus` mean that the processes are not pinned to cores.
+    """
+
+    main_threads: int
+    worker_threads: int
+    num_workers: int
+    main_cpus: List[int] = field(default_factory=list)
+    worker_cpus: List[List[int]] = field(default_factory=list)
+
+    def __str__(self):
+        def _fmt(cpus):
+            return f" on cores {_format_cpulist(cpus)}" if cpus else ""
+
+        lines = [f"main process: {self.main_threads} threads{_fmt(self.main_cpus)}"]
+        for i in range(self.num_workers):
+            cpus = self.worker_cpus[i] if self.worker_cpus else []
+            lines.append(f"worker {i}: {self.worker_threads} threads{_fmt(cpus)}")
+        return "\n".join(lines)
+
+# Cell
+def build_thread_plan(
+    num_workers: int,
+    main_threads: Optional[int] = None,
+    worker_threads: int = 1,
+    pin: bool = False,
+    numa_node: Optional[int] = None,
+    cpus: Optional[Sequence[int]] = None,
+) -> ThreadPlan:
+    """
+    Splits the cores in `cpus` (all the available cores if `None`, or the cores of NUMA node
+    `numa_node`) between the main process and `num_workers` `DataLoader` workers. Each worker
+    gets `worker_threads` threads and the main process gets `main_threads` threads, by default
+    all the cores not used by the workers.
+
+    If `pin` is `True`, the main process & each worker are pinned to their own cores, workers
+    share cores if there are not enough of them.
+    """
+    if cpus is None:
+        cpus = numa_nodes()[numa_node] if numa_node is not None else available_cpus()
+    cpus = list(cpus)
+    num_workers_cpus = num_workers * worker_threads
+    main_threads = ifnone(main_threads, max(1, len(cpus) - num_workers_cpus))
+
+    if main_threads + num_workers_cpus > len(cpus):
+        _logger.warning(
+            "Thread plan uses {} threads on {} cores, the cores are oversubscribed".format(
+                main_threads + num_workers_cpus, len(cpus)
+            )
+        )
+
+    plan = ThreadPlan(main_threads, worker_threads, num_workers)
+    if pin:
+        plan.main_cpus = cpus[:main_threads]
+        # the workers get the remaining cores, or all the cores if there are none left
+        rest = cpus[main_threads:] or cpus
+        for i in range(num_workers):
+            start = i * worker_threads
+            plan.worker_cpus.append(
+                [rest[(start + j) % len(rest)] for j in range(worker_threads)]
+            )
+    elif numa_node is not None:
+        # restrict all the processes to the cores of the NUMA node
+        plan.main_cpus = cpus
+        plan.worker_cpus = [cpus] * num_workers
+    return plan
+
+# Cell
+def _set_num_threads(num_threads: int, cpus: List[int]):
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(num_threads)
+    torch.set_num_threads(num_threads)
+
+    try:
+        import cv2
+
+        cv2.setNumThreads(num_threads)
+    except ImportError:
+        pass
+
+    try:
+        # resizes the already created OpenMP & BLAS thread pools, if available
+        from threadpoolctl import threadpool_limits
+
+        threadpool_limits(num_threads)
+    except ImportError:
+        pass
+
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+# Cell
+def apply_thread_plan(plan: ThreadPlan, worker_id: Optional[int] = None):
+    """
+    Applies `plan` to the current process, to the main process if `worker_id` is `None` or
+    else to the `DataLoader` worker `worker_id`.
+    """
+    if worker_id is None:
+        _set_num_threads(plan.main_threads, plan.main_cpus)
+    else:
+        cpus = plan.worker_cpus[worker_id] if plan.worker_cpus else []
+        _set_num_threads(plan.worker_threads, cpus)
+
+# Cell
+def thread_plan_worker_init_fn(worker_id: int, plan: Optional[ThreadPlan] = None):
+    """
+    Same as `worker_init_fn` but also applies `plan` to the worker, use with
+    `functools.partial(thread_plan_worker_init_fn, plan=plan)`.
+    """
+    worker_init_fn(worker_id)
+    if plan is not None:
+        apply_thread_plan(plan, worker_id % max(plan.num_workers, 1))
+
+# Cell
+def thread_plan_from_config(config: Optional[DictConfig], num_workers: int):
+    """
+    Builds a `ThreadPlan` for `num_workers` workers from the `threads` section of the gale
+    config, returns `None` if `config` is `None` or not enabled.
+    """
+    if config is None or not config.get("enabled", False):
+        return None
+    return build_thread_plan(
+        num_workers,
+        main_threads=config.get("main_threads"),
+        worker_threads=config.get("worker_threads", 1),
+        pin=config.get("pin", False),
+        numa_node=config.get("numa_node"),
+    )
\ No newline at end of file